@@ -0,0 +1,63 @@
+"""
+benchmarks/ocr_engines.py
+--------------------------------
+Compares OCR throughput (pages/sec) of the available OCR engines in
+src/extraction/ocr.py on the sample documents in data/test:
+
+- pytesseract: spawns the tesseract CLI for every page
+- tesserocr:   long-lived in-process engine (models loaded once)
+
+The OCR cache is bypassed so every page is really recognised.
+
+Usage:
+    python -m benchmarks.ocr_engines [--rounds 5] [--dpi 200]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from src.config import DATA_DIR
+from src.extraction.ocr import PytesseractEngine, TesserocrEngine, ocr_image
+from benchmarks.ocr_preprocessing import load_samples
+
+
+def available_engines():
+    engines = [PytesseractEngine()]
+    try:
+        engines.append(TesserocrEngine())
+    except Exception as e:
+        print(f"tesserocr engine unavailable ({e}); benchmarking pytesseract only")
+    return engines
+
+
+def run(sample_dir, dpi, max_pages, rounds):
+    pages = [(img, render_dpi) for _, img, render_dpi, _ in load_samples(sample_dir, dpi, max_pages)]
+    if not pages:
+        print(f"No image/PDF samples found in {sample_dir}")
+        return
+
+    print(f"OCR-ing {len(pages)} pages x {rounds} rounds from {sample_dir}\n")
+    for engine in available_engines():
+        ocr_image(pages[0][0], use_cache=False, dpi=pages[0][1], engine=engine)  # warm-up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for img, render_dpi in pages:
+                ocr_image(img, use_cache=False, dpi=render_dpi, engine=engine)
+        elapsed = time.perf_counter() - start
+        total = len(pages) * rounds
+        print(f"{engine.name:<12} {total / elapsed:6.2f} pages/sec ({1000 * elapsed / total:.0f} ms/page)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR engines (pages/sec)")
+    parser.add_argument("--samples", default=str(DATA_DIR / "test"), help="Folder of sample documents")
+    parser.add_argument("--dpi", type=int, default=200, help="PDF render DPI")
+    parser.add_argument("--pages", type=int, default=2, help="Max pages per PDF")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the sample pages")
+    args = parser.parse_args()
+    run(Path(args.samples), args.dpi, args.pages, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
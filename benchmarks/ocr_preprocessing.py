@@ -0,0 +1,100 @@
+"""
+benchmarks/ocr_preprocessing.py
+--------------------------------
+Benchmarks the OCR preprocessing pipeline (src/extraction/ocr.py) on the
+sample documents in data/test.
+
+For every pipeline variant it reports:
+- per-stage preprocessing time (gray, rescale, deskew, denoise, binarize)
+- tesseract time
+- OCR accuracy: word-level similarity against the PDF text layer (for PDFs that
+  have one) or against a reference .txt with the same stem, when present
+
+Usage:
+    python -m benchmarks.ocr_preprocessing [--dpi 200] [--pages 2]
+"""
+
+import argparse
+import difflib
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pdfplumber
+import pytesseract
+from pdf2image import convert_from_path
+from PIL import Image
+
+from src.config import DATA_DIR
+from src.extraction.ocr import preprocess_image
+
+VARIANTS = {
+    "baseline (gray+otsu)": ["binarize"],
+    "rescale": ["rescale", "binarize"],
+    "deskew": ["deskew", "binarize"],
+    "denoise": ["denoise", "binarize"],
+    "full": ["rescale", "deskew", "denoise", "binarize"],
+}
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def accuracy(ocr_text, reference):
+    """Word-sequence similarity in [0, 1] (1.0 = identical word stream)."""
+    return difflib.SequenceMatcher(None, _words(ocr_text), _words(reference), autojunk=False).ratio()
+
+
+def load_samples(sample_dir, dpi, max_pages):
+    """Yield (name, PIL image, render dpi, reference text or None) per page."""
+    for path in sorted(sample_dir.iterdir()):
+        suffix = path.suffix.lower()
+        if suffix == ".pdf":
+            with pdfplumber.open(path) as pdf:
+                references = [page.extract_text() or "" for page in pdf.pages[:max_pages]]
+            images = convert_from_path(str(path), dpi=dpi, first_page=1, last_page=len(references))
+            for i, (img, ref) in enumerate(zip(images, references), start=1):
+                yield f"{path.name} p{i}", img, dpi, ref or None
+        elif suffix in (".png", ".jpg", ".jpeg", ".tif", ".tiff"):
+            ref_path = path.with_suffix(".txt")
+            ref = ref_path.read_text(encoding="utf-8") if ref_path.exists() else None
+            yield path.name, Image.open(path), None, ref
+
+
+def run(sample_dir, dpi, max_pages):
+    samples = list(load_samples(sample_dir, dpi, max_pages))
+    if not samples:
+        print(f"No image/PDF samples found in {sample_dir}")
+        return
+
+    print(f"Benchmarking {len(samples)} pages from {sample_dir} (render DPI {dpi})\n")
+    for variant, steps in VARIANTS.items():
+        timings = defaultdict(float)
+        scores = []
+        for name, img, render_dpi, reference in samples:
+            prepared = preprocess_image(img, steps=steps, dpi=render_dpi, timings=timings)
+            start = time.perf_counter()
+            text = pytesseract.image_to_string(Image.fromarray(prepared))
+            timings["tesseract"] += time.perf_counter() - start
+            if reference:
+                scores.append(accuracy(text, reference))
+
+        n = len(samples)
+        stage_report = ", ".join(f"{stage}={1000 * t / n:.1f}ms" for stage, t in timings.items())
+        acc = f"{sum(scores) / len(scores):.3f}" if scores else "n/a"
+        print(f"{variant:<22} accuracy={acc:<6} per page: {stage_report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing stages")
+    parser.add_argument("--samples", default=str(DATA_DIR / "test"), help="Folder of sample documents")
+    parser.add_argument("--dpi", type=int, default=200, help="PDF render DPI")
+    parser.add_argument("--pages", type=int, default=2, help="Max pages per PDF")
+    args = parser.parse_args()
+    run(Path(args.samples), args.dpi, args.pages)
+
+
+if __name__ == "__main__":
+    main()
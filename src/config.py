@@ -7,7 +7,7 @@ This module:
 - Loads environment variables from a .env file (if present)
 - Determines project directories (BASE_DIR, CONFIG_DIR, DATA_DIR)
 - Loads schema.json into CLAIM_SCHEMA (safe fallback to empty dict)
-- Loads prompts.yaml and rules.yaml into PROMPTS and RULES (safe fallbacks)
+- Loads prompts.yaml, rules.yaml and templates.yaml into PROMPTS, RULES and TEMPLATES (safe fallbacks)
 - Exposes runtime constants (OPENAI_API_KEY, DATABASE_URL, LOG_LEVEL, etc.)
 
 Design choices:
@@ -20,7 +20,7 @@ from __future__ import annotations
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 # Try to import yaml (pyyaml). If unavailable, we'll fallback gracefully.
 try:
@@ -125,6 +125,23 @@ else:
     RULES = {}
     print(f"ℹ️ [CONFIG] No rules.yaml found at: {_rules_path}. Using empty RULES.")
 
+# -------------------------
+# Load templates.yaml (known fixed-layout claim forms) — optional
+# -------------------------
+TEMPLATES: List[Dict[str, Any]] = []
+_templates_path = CONFIG_DIR / "templates.yaml"
+if _templates_path.exists():
+    try:
+        if yaml:
+            with _templates_path.open("r", encoding="utf-8") as f:
+                TEMPLATES = (yaml.safe_load(f) or {}).get("templates") or []
+            print(f"✅ [CONFIG] Loaded {len(TEMPLATES)} form templates from: {_templates_path}")
+        else:
+            print("ℹ️ [CONFIG] pyyaml not installed — form templates disabled.")
+    except Exception as e:
+        print(f"⚠️ [CONFIG] Failed to load templates.yaml: {_templates_path} — {e}")
+        TEMPLATES = []
+
 # -------------------------
 # Environment-driven values & defaults
 # -------------------------
@@ -133,6 +150,15 @@ if not OPENAI_API_KEY:
     print("⚠️ [CONFIG] OPENAI_API_KEY not set. Add it to your .env or environment variables if using GenAI features.")
 
 DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///{str(BASE_DIR / 'db' / 'claims.db')}")
+
+# HITL inserts are group-committed: one transaction per batch or interval
+try:
+    HITL_COMMIT_BATCH: int = int(os.getenv("HITL_COMMIT_BATCH", "50"))
+    HITL_COMMIT_INTERVAL: float = float(os.getenv("HITL_COMMIT_INTERVAL", "1.0"))
+except ValueError:
+    print("⚠️ [CONFIG] HITL_COMMIT_BATCH/HITL_COMMIT_INTERVAL invalid in environment; using defaults")
+    HITL_COMMIT_BATCH, HITL_COMMIT_INTERVAL = 50, 1.0
+
 LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 try:
     CONFIDENCE_THRESHOLD: float = float(os.getenv("CONFIDENCE_THRESHOLD", "0.8"))
@@ -152,6 +178,172 @@ try:
 except ValueError:
     MIN_CLAIM_AMOUNT = 0.0
 
+# Batch processing (number of extraction processes for folder inputs)
+try:
+    BATCH_WORKERS: int = int(os.getenv("BATCH_WORKERS", "1"))
+except ValueError:
+    print("⚠️ [CONFIG] BATCH_WORKERS invalid in environment; defaulting to 1")
+    BATCH_WORKERS = 1
+
+# Parallel OCR of the pages of a single scanned document (capped at available cores)
+try:
+    OCR_PAGE_WORKERS: int = int(os.getenv("OCR_PAGE_WORKERS", "1"))
+except ValueError:
+    print("⚠️ [CONFIG] OCR_PAGE_WORKERS invalid in environment; defaulting to 1")
+    OCR_PAGE_WORKERS = 1
+
+# Threads tesseract may use per page (OpenMP). Pages are parallelised by the
+# OCR pool instead, so one each; set once here, before any tesseract starts
+OCR_OMP_THREAD_LIMIT: str = os.getenv("OCR_OMP_THREAD_LIMIT", "1")
+os.environ.setdefault("OMP_THREAD_LIMIT", OCR_OMP_THREAD_LIMIT)
+
+# GenAI concurrency, rate budgets and retry/backoff (async GenAI stage)
+try:
+    GENAI_CONCURRENCY: int = int(os.getenv("GENAI_CONCURRENCY", "1"))
+    GENAI_RPM: int = int(os.getenv("GENAI_RPM", "500"))
+    GENAI_TPM: int = int(os.getenv("GENAI_TPM", "200000"))
+    GENAI_MAX_RETRIES: int = int(os.getenv("GENAI_MAX_RETRIES", "5"))
+    GENAI_BACKOFF_BASE: float = float(os.getenv("GENAI_BACKOFF_BASE", "1.0"))
+    GENAI_BACKOFF_MAX: float = float(os.getenv("GENAI_BACKOFF_MAX", "30.0"))
+except ValueError:
+    print("⚠️ [CONFIG] GENAI_* rate/retry settings invalid in environment; using defaults")
+    GENAI_CONCURRENCY, GENAI_RPM, GENAI_TPM = 1, 500, 200000
+    GENAI_MAX_RETRIES, GENAI_BACKOFF_BASE, GENAI_BACKOFF_MAX = 5, 1.0, 30.0
+
+# GenAI prompt size: content tokens per request (longer claims are chunked and
+# summarised map-reduce) and total content tokens sent per claim
+try:
+    GENAI_MAX_PROMPT_TOKENS: int = int(os.getenv("GENAI_MAX_PROMPT_TOKENS", "8000"))
+    GENAI_CLAIM_TOKEN_BUDGET: int = int(os.getenv("GENAI_CLAIM_TOKEN_BUDGET", "60000"))
+except ValueError:
+    print("⚠️ [CONFIG] GENAI_MAX_PROMPT_TOKENS/GENAI_CLAIM_TOKEN_BUDGET invalid in environment; using defaults")
+    GENAI_MAX_PROMPT_TOKENS, GENAI_CLAIM_TOKEN_BUDGET = 8000, 60000
+
+# GenAI response cache (content-addressed on prompt + model + extracted text)
+GENAI_CACHE_ENABLED: bool = os.getenv("GENAI_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+GENAI_CACHE_PATH: Path = Path(os.getenv("GENAI_CACHE_PATH", str(DATA_DIR / "cache" / "genai_cache.db")))
+try:
+    GENAI_CACHE_TTL_DAYS: float = float(os.getenv("GENAI_CACHE_TTL_DAYS", "30"))
+    GENAI_CACHE_MAX_ENTRIES: int = int(os.getenv("GENAI_CACHE_MAX_ENTRIES", "50000"))
+except ValueError:
+    print("⚠️ [CONFIG] GENAI_CACHE_* settings invalid in environment; using defaults")
+    GENAI_CACHE_TTL_DAYS, GENAI_CACHE_MAX_ENTRIES = 30.0, 50000
+
+# GenAI provider: "openai" or "stub" (local deterministic responder for load
+# tests), model, per-request timeout and the stub's latency/error injection
+GENAI_PROVIDER: str = os.getenv("GENAI_PROVIDER", "openai").lower()
+GENAI_MODEL: str = os.getenv("GENAI_MODEL", "gpt-4o-mini")
+try:
+    GENAI_TIMEOUT: float = float(os.getenv("GENAI_TIMEOUT", "60"))
+    GENAI_STUB_LATENCY_MS: float = float(os.getenv("GENAI_STUB_LATENCY_MS", "200"))
+    GENAI_STUB_ERROR_RATE: float = float(os.getenv("GENAI_STUB_ERROR_RATE", "0"))
+except ValueError:
+    print("⚠️ [CONFIG] GENAI_TIMEOUT/GENAI_STUB_* invalid in environment; using defaults")
+    GENAI_TIMEOUT, GENAI_STUB_LATENCY_MS, GENAI_STUB_ERROR_RATE = 60.0, 200.0, 0.0
+
+# Constrain GenAI replies to the claim JSON Schema (turn off for providers
+# without structured-output support; the schema is still described in the prompt)
+GENAI_STRUCTURED_OUTPUT: bool = os.getenv("GENAI_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+
+# Offline GenAI batches (backfills): backend "openai" (Batch API) or "local"
+# (file-based stand-in), run directories and result polling interval
+GENAI_BATCH_BACKEND: str = os.getenv("GENAI_BATCH_BACKEND", "openai").lower()
+GENAI_BATCH_DIR: Path = Path(os.getenv("GENAI_BATCH_DIR", str(DATA_DIR / "batches")))
+try:
+    GENAI_BATCH_POLL_SECONDS: float = float(os.getenv("GENAI_BATCH_POLL_SECONDS", "60"))
+except ValueError:
+    print("⚠️ [CONFIG] GENAI_BATCH_POLL_SECONDS invalid in environment; defaulting to 60")
+    GENAI_BATCH_POLL_SECONDS = 60.0
+
+# Raw store for ingested documents, content-addressed by SHA-256. Mode "auto"
+# reflinks (copy-on-write) when the source is on the same filesystem and copies
+# otherwise; it hard-links only inputs deleted after ingestion (the --watch
+# spool), since a hard link follows in-place edits of the source. "reflink",
+# "hardlink" or "copy" force one
+RAW_STORE_DIR: Path = Path(os.getenv("RAW_STORE_DIR", str(DATA_DIR / "raw")))
+RAW_STORE_MODE: str = os.getenv("RAW_STORE_MODE", "auto").lower()
+if RAW_STORE_MODE not in ("auto", "reflink", "hardlink", "copy"):
+    print(f"⚠️ [CONFIG] RAW_STORE_MODE '{RAW_STORE_MODE}' invalid in environment; defaulting to auto")
+    RAW_STORE_MODE = "auto"
+
+# Service mode (--watch INBOX): spool directory (processing/ + quarantine/), poll
+# interval when watchdog is not installed, how long a file must be unchanged
+# before it is claimed, retries (exponential backoff) and files per batch
+WATCH_SPOOL_DIR: Path = Path(os.getenv("WATCH_SPOOL_DIR", str(DATA_DIR / "spool")))
+try:
+    WATCH_POLL_SECONDS: float = float(os.getenv("WATCH_POLL_SECONDS", "2"))
+    WATCH_SETTLE_SECONDS: float = float(os.getenv("WATCH_SETTLE_SECONDS", "1"))
+except ValueError:
+    print("⚠️ [CONFIG] WATCH_POLL_SECONDS/WATCH_SETTLE_SECONDS invalid in environment; defaulting to 2/1")
+    WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS = 2.0, 1.0
+try:
+    WATCH_MAX_RETRIES: int = int(os.getenv("WATCH_MAX_RETRIES", "3"))
+    WATCH_RETRY_DELAY_SECONDS: float = float(os.getenv("WATCH_RETRY_DELAY_SECONDS", "60"))
+    WATCH_BATCH_SIZE: int = int(os.getenv("WATCH_BATCH_SIZE", "16"))
+except ValueError:
+    print("⚠️ [CONFIG] WATCH_MAX_RETRIES/WATCH_RETRY_DELAY_SECONDS/WATCH_BATCH_SIZE invalid in environment; defaulting to 3/60/16")
+    WATCH_MAX_RETRIES, WATCH_RETRY_DELAY_SECONDS, WATCH_BATCH_SIZE = 3, 60.0, 16
+
+# Durable job queue: per-claim stage checkpoints so interrupted runs resume
+# where they stopped; a worker's lease on a job lapses after JOBS_LEASE_SECONDS
+# without a heartbeat
+JOBS_ENABLED: bool = os.getenv("JOBS_ENABLED", "1").lower() not in ("0", "false", "no")
+JOBS_DB_PATH: Path = Path(os.getenv("JOBS_DB_PATH", str(DATA_DIR / "state" / "jobs.db")))
+try:
+    JOBS_LEASE_SECONDS: float = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+except ValueError:
+    print("⚠️ [CONFIG] JOBS_LEASE_SECONDS invalid in environment; defaulting to 60")
+    JOBS_LEASE_SECONDS = 60.0
+
+# Claim-level dedup index: exact (SHA-256) and near-duplicate (simhash within
+# DEDUP_NEAR_DISTANCE bits; 0 disables) documents are linked to earlier results
+DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "1").lower() not in ("0", "false", "no")
+DEDUP_INDEX_PATH: Path = Path(os.getenv("DEDUP_INDEX_PATH", str(DATA_DIR / "cache" / "dedup_index.db")))
+try:
+    DEDUP_NEAR_DISTANCE: int = int(os.getenv("DEDUP_NEAR_DISTANCE", "3"))
+except ValueError:
+    print("⚠️ [CONFIG] DEDUP_NEAR_DISTANCE invalid in environment; defaulting to 3")
+    DEDUP_NEAR_DISTANCE = 3
+
+# OCR engine: "auto" (tesserocr if installed, else pytesseract), "tesserocr" or "pytesseract"
+OCR_ENGINE: str = os.getenv("OCR_ENGINE", "auto").lower()
+OCR_LANG: str = os.getenv("OCR_LANG", "eng")
+
+# OCR preprocessing pipeline: comma-separated stages applied after grayscale
+# conversion, in order. Available: rescale, deskew, denoise, binarize
+OCR_PREPROCESS_STEPS: list = [
+    step.strip() for step in os.getenv("OCR_PREPROCESS_STEPS", "binarize").split(",") if step.strip()
+]
+try:
+    OCR_TARGET_DPI: int = int(os.getenv("OCR_TARGET_DPI", "300"))
+except ValueError:
+    print("⚠️ [CONFIG] OCR_TARGET_DPI invalid in environment; defaulting to 300")
+    OCR_TARGET_DPI = 300
+
+# Hybrid PDF extraction: pages with fewer text-layer characters than this are
+# OCR'd, rendered at the embedded scan's native DPI clamped to [OCR_MIN_DPI, OCR_TARGET_DPI]
+try:
+    PDF_MIN_TEXT_CHARS: int = int(os.getenv("PDF_MIN_TEXT_CHARS", "20"))
+    OCR_MIN_DPI: int = int(os.getenv("OCR_MIN_DPI", "150"))
+except ValueError:
+    print("⚠️ [CONFIG] PDF_MIN_TEXT_CHARS/OCR_MIN_DPI invalid in environment; using defaults")
+    PDF_MIN_TEXT_CHARS, OCR_MIN_DPI = 20, 150
+
+# OCR page cache (keyed on rendered page bitmap + OCR settings; LRU bounded)
+OCR_CACHE_ENABLED: bool = os.getenv("OCR_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+OCR_CACHE_PATH: Path = Path(os.getenv("OCR_CACHE_PATH", str(DATA_DIR / "cache" / "ocr_cache.db")))
+try:
+    OCR_CACHE_MAX_ENTRIES: int = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "100000"))
+except ValueError:
+    print("⚠️ [CONFIG] OCR_CACHE_MAX_ENTRIES invalid in environment; defaulting to 100000")
+    OCR_CACHE_MAX_ENTRIES = 100000
+
+# spaCy NER (model loaded lazily, NER component only)
+NLP_MODEL: str = os.getenv("NLP_MODEL", "en_core_web_sm")
+
+# Template fingerprinting for known claim forms (zone reads instead of full extraction + GenAI)
+TEMPLATES_ENABLED: bool = os.getenv("TEMPLATES_ENABLED", "1").lower() not in ("0", "false", "no")
+
 # -------------------------
 # Helper utilities
 # -------------------------
@@ -179,10 +371,31 @@ if __name__ == "__main__":
     print("CLAIM_SCHEMA keys:", list(CLAIM_SCHEMA.keys())[:20])
     print("PROMPTS present:", bool(PROMPTS))
     print("RULES present:", bool(RULES))
+    print("NLP_MODEL:", NLP_MODEL)
+    print("TEMPLATES:", [t.get("name") for t in TEMPLATES], "(enabled)" if TEMPLATES_ENABLED else "(disabled)")
     print("OPENAI_API_KEY present:", bool(OPENAI_API_KEY))
     print("DATABASE_URL:", DATABASE_URL)
+    print("HITL_COMMIT_BATCH / HITL_COMMIT_INTERVAL:", HITL_COMMIT_BATCH, "/", HITL_COMMIT_INTERVAL)
     print("LOG_LEVEL:", LOG_LEVEL)
     print("CONFIDENCE_THRESHOLD:", CONFIDENCE_THRESHOLD)
     print("MAX_CLAIM_AMOUNT:", MAX_CLAIM_AMOUNT)
     print("MIN_CLAIM_AMOUNT:", MIN_CLAIM_AMOUNT)
+    print("BATCH_WORKERS:", BATCH_WORKERS)
+    print("OCR_PAGE_WORKERS:", OCR_PAGE_WORKERS, f"(OMP_THREAD_LIMIT={os.environ.get('OMP_THREAD_LIMIT')})")
+    print("GENAI_PROVIDER / GENAI_MODEL:", GENAI_PROVIDER, "/", GENAI_MODEL, f"(timeout {GENAI_TIMEOUT}s)")
+    print("GENAI_STRUCTURED_OUTPUT:", GENAI_STRUCTURED_OUTPUT)
+    print("GENAI_CONCURRENCY:", GENAI_CONCURRENCY)
+    print("GENAI_RPM / GENAI_TPM:", GENAI_RPM, "/", GENAI_TPM)
+    print("GENAI_MAX_PROMPT_TOKENS / GENAI_CLAIM_TOKEN_BUDGET:", GENAI_MAX_PROMPT_TOKENS, "/", GENAI_CLAIM_TOKEN_BUDGET)
+    print("GENAI_CACHE_ENABLED:", GENAI_CACHE_ENABLED, "→", GENAI_CACHE_PATH)
+    print("GENAI_BATCH_BACKEND:", GENAI_BATCH_BACKEND, "→", GENAI_BATCH_DIR)
+    print("RAW_STORE_DIR:", RAW_STORE_DIR, f"({RAW_STORE_MODE})")
+    print("WATCH_SPOOL_DIR:", WATCH_SPOOL_DIR, f"(poll {WATCH_POLL_SECONDS}s, settle {WATCH_SETTLE_SECONDS}s, "
+          f"{WATCH_MAX_RETRIES} retries, batch {WATCH_BATCH_SIZE})")
+    print("JOBS_ENABLED:", JOBS_ENABLED, "→", JOBS_DB_PATH, f"(lease {JOBS_LEASE_SECONDS}s)")
+    print("DEDUP_ENABLED:", DEDUP_ENABLED, "→", DEDUP_INDEX_PATH, f"(near ≤ {DEDUP_NEAR_DISTANCE} bits)")
+    print("OCR_ENGINE / OCR_LANG:", OCR_ENGINE, "/", OCR_LANG)
+    print("OCR_PREPROCESS_STEPS:", OCR_PREPROCESS_STEPS, "@", OCR_TARGET_DPI, "DPI")
+    print("PDF_MIN_TEXT_CHARS / OCR_MIN_DPI:", PDF_MIN_TEXT_CHARS, "/", OCR_MIN_DPI)
+    print("OCR_CACHE_ENABLED:", OCR_CACHE_ENABLED, "→", OCR_CACHE_PATH)
     print("---------------------------")
@@ -1,23 +1,429 @@
+import atexit
+import hashlib
+import os
+import threading
+import time
+import weakref
 import cv2
 import numpy as np
 from PIL import Image
 import pytesseract
+from ..config import (
+    OCR_CACHE_ENABLED,
+    OCR_CACHE_MAX_ENTRIES,
+    OCR_CACHE_PATH,
+    OCR_ENGINE,
+    OCR_LANG,
+    OCR_PREPROCESS_STEPS,
+    OCR_TARGET_DPI,
+)
+from ..storage.cache import ResultCache, make_cache_key
 from ..utils.logging import logger
 
-def ocr_image(img):
+# Long edge of a US Letter page in inches; used to guess the DPI of images
+# (e.g. phone photos) that carry no resolution metadata.
+_ASSUMED_PAGE_INCHES = 11.0
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+# ----------------------------------------------------------------------
+# Preprocessing stages (uint8 grayscale NumPy arrays in → out)
+# ----------------------------------------------------------------------
+def to_gray(img):
+    """Convert a PIL image straight to a grayscale uint8 array (no BGR hop)."""
+    if img.mode == "L":
+        return np.asarray(img)
+    if img.mode == "RGB":
+        return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2GRAY)
+    if img.mode == "RGBA":
+        return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGBA2GRAY)
+    return np.asarray(img.convert("L"))
+
+
+def source_dpi(img, gray):
+    """DPI from image metadata, or estimated assuming the image spans a letter page."""
+    dpi = img.info.get("dpi") if hasattr(img, "info") else None
+    if dpi and dpi[0]:
+        return float(dpi[0])
+    return max(gray.shape) / _ASSUMED_PAGE_INCHES
+
+
+def rescale(gray, dpi, target_dpi=OCR_TARGET_DPI):
+    """Resample to tesseract's preferred resolution (skipped when within 10%)."""
+    factor = target_dpi / dpi
+    if 0.9 <= factor <= 1.1:
+        return gray
+    interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=factor, fy=factor, interpolation=interpolation)
+
+
+def estimate_skew(gray):
+    """Estimate page skew in degrees from the minimum-area box around dark pixels."""
+    # Work on a downsampled copy; angle estimation does not need full resolution
+    scale = min(1.0, 1000.0 / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    coords = cv2.findNonZero(ink)
+    if coords is None or len(coords) < 50:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    # The box angle convention differs between OpenCV versions ((0, 90] vs
+    # [-90, 0)); fold it into [-45, 45) so it is a small signed correction.
+    return float((angle + 45) % 90 - 45)
+
+
+def deskew(gray, max_angle=15.0):
+    """Rotate the page upright if it is skewed by more than half a degree."""
+    angle = estimate_skew(gray)
+    if abs(angle) < 0.5 or abs(angle) > max_angle:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def denoise(gray):
+    """Remove salt-and-pepper / sensor noise with a 3x3 median filter."""
+    if not gray.flags.writeable:
+        gray = gray.copy()
+    return cv2.medianBlur(gray, 3, dst=gray)
+
+
+def binarize(gray):
+    """Otsu threshold to black text on white."""
+    if not gray.flags.writeable:
+        gray = gray.copy()
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=gray)
+    return gray
+
+
+PREPROCESS_STAGES = {
+    "rescale": rescale,
+    "deskew": deskew,
+    "denoise": denoise,
+    "binarize": binarize,
+}
+
+
+def preprocess_image(img, steps=None, dpi=None, timings=None):
     """
-    Perform OCR on a PIL Image (handles preprocessing for handwriting/images).
+    Run the configured preprocessing pipeline on a PIL image and return a
+    uint8 grayscale array ready for tesseract.
+
+    Args:
+        img: PIL image.
+        steps: stage names from PREPROCESS_STAGES (defaults to OCR_PREPROCESS_STEPS).
+        dpi: resolution the image was rendered at, if known (used by "rescale").
+        timings: optional dict; per-stage wall time (seconds) is accumulated into it.
+    """
+    steps = OCR_PREPROCESS_STEPS if steps is None else steps
+    start = time.perf_counter()
+    gray = to_gray(img)
+    if timings is not None:
+        timings["gray"] = timings.get("gray", 0.0) + time.perf_counter() - start
+
+    for step in steps:
+        stage = PREPROCESS_STAGES.get(step)
+        if stage is None:
+            logger.warning(f"⚠️ Unknown OCR preprocessing step '{step}' — skipping.")
+            continue
+        start = time.perf_counter()
+        if step == "rescale":
+            gray = stage(gray, dpi or source_dpi(img, gray))
+        else:
+            gray = stage(gray)
+        if timings is not None:
+            timings[step] = timings.get(step, 0.0) + time.perf_counter() - start
+    return gray
+
+
+# ----------------------------------------------------------------------
+# OCR engines
+# ----------------------------------------------------------------------
+def _assemble_result(words):
+    """
+    Build the OCR result dict from recognised words, each carrying
+    {"text", "conf" (0-100), "bbox": [x, y, w, h], "line": int, "block": int}.
+    Text is reassembled line by line; blocks are separated by a blank line.
+    """
+    lines = []
+    for word in words:
+        if lines and lines[-1]["line"] == word["line"]:
+            line = lines[-1]
+            line["words"].append(word)
+        else:
+            lines.append({"line": word["line"], "block": word["block"], "words": [word]})
+
+    line_results = []
+    text_parts = []
+    previous_block = None
+    for line in lines:
+        line_words = line["words"]
+        line_text = " ".join(w["text"] for w in line_words)
+        x0 = min(w["bbox"][0] for w in line_words)
+        y0 = min(w["bbox"][1] for w in line_words)
+        x1 = max(w["bbox"][0] + w["bbox"][2] for w in line_words)
+        y1 = max(w["bbox"][1] + w["bbox"][3] for w in line_words)
+        line_results.append(
+            {"text": line_text, "conf": weighted_confidence(line_words) * 100, "bbox": [x0, y0, x1 - x0, y1 - y0]}
+        )
+        if previous_block is not None and line["block"] != previous_block:
+            text_parts.append("")
+        text_parts.append(line_text)
+        previous_block = line["block"]
+
+    return {
+        "text": "\n".join(text_parts).strip(),
+        "confidence": weighted_confidence(words),
+        "words": words,
+        "lines": line_results,
+    }
+
+
+def weighted_confidence(words):
+    """Character-weighted mean word confidence scaled to 0-1 (0.0 when no words)."""
+    total_chars = sum(len(w["text"]) for w in words)
+    if not total_chars:
+        return 0.0
+    return sum(w["conf"] * len(w["text"]) for w in words) / total_chars / 100.0
+
+
+class PytesseractEngine:
+    """Runs the tesseract CLI once per image (model load + temp files each call)."""
+
+    name = "pytesseract"
+
+    def image_to_data(self, gray, dpi=None):
+        config = f"--dpi {int(dpi)}" if dpi else ""
+        data = pytesseract.image_to_data(
+            Image.fromarray(gray), lang=OCR_LANG, config=config, output_type=pytesseract.Output.DICT
+        )
+        words = []
+        line_ids = {}
+        for i, text in enumerate(data["text"]):
+            conf = float(data["conf"][i])
+            text = text.strip()
+            if not text or conf < 0:  # structural rows (page/block/line) carry conf -1
+                continue
+            words.append(
+                {
+                    "text": text,
+                    "conf": conf,
+                    "bbox": [data["left"][i], data["top"][i], data["width"][i], data["height"][i]],
+                    "line": line_ids.setdefault(
+                        (data["block_num"][i], data["par_num"][i], data["line_num"][i]), len(line_ids)
+                    ),
+                    "block": data["block_num"][i],
+                }
+            )
+        return _assemble_result(words)
+
+
+class _ApiSlot:
+    """Per-thread owner of a tesserocr API; the API is ended when its thread goes away."""
+
+    def __init__(self, api):
+        self.api = api
+        self._finalizer = weakref.finalize(self, api.End)
+
+    def close(self):
+        self._finalizer()
+
+
+class TesserocrEngine:
+    """
+    Long-lived in-process tesseract (tesserocr). Language models are loaded once
+    per thread and reused for every page, avoiding a process spawn per image.
+    tesserocr API objects are not thread-safe, hence one per thread; an API is
+    ended when its thread exits, and at most `max_apis` are kept alive (beyond
+    that a thread gets a throwaway API per page).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, max_apis=None):
+        import tesserocr  # optional dependency; ImportError triggers fallback
+
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+        self._slots = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.max_apis = max_apis or (os.cpu_count() or 1) + 1
+        atexit.register(self.close)
+
+    def _api(self):
+        """(api, cached): this thread's API, or a one-off one when the cap is reached."""
+        slot = getattr(self._local, "slot", None)
+        if slot is not None:
+            return slot.api, True
+        api = self._tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+        with self._lock:
+            if len(self._slots) >= self.max_apis:
+                return api, False
+            slot = _ApiSlot(api)
+            self._slots.add(slot)
+        self._local.slot = slot  # dropped (and the API ended) when the thread exits
+        return api, True
+
+    def image_to_data(self, gray, dpi=None):
+        api, cached = self._api()
+        try:
+            return self._recognize(api, gray, dpi)
+        finally:
+            if not cached:
+                api.End()
+
+    def _recognize(self, api, gray, dpi):
+        RIL = self._tesserocr.RIL
+        height, width = gray.shape
+        api.SetImageBytes(np.ascontiguousarray(gray).tobytes(), width, height, 1, width)
+        if dpi:
+            api.SetSourceResolution(int(dpi))
+        api.Recognize()
+
+        words = []
+        line_no = block_no = 0
+        iterator = api.GetIterator()
+        if iterator is not None:
+            while True:
+                if iterator.IsAtBeginningOf(RIL.BLOCK):
+                    block_no += 1
+                if iterator.IsAtBeginningOf(RIL.TEXTLINE):
+                    line_no += 1
+                text = (iterator.GetUTF8Text(RIL.WORD) or "").strip()
+                box = iterator.BoundingBox(RIL.WORD)
+                if text and box:
+                    x0, y0, x1, y1 = box
+                    words.append(
+                        {
+                            "text": text,
+                            "conf": float(iterator.Confidence(RIL.WORD)),
+                            "bbox": [x0, y0, x1 - x0, y1 - y0],
+                            "line": line_no,
+                            "block": block_no,
+                        }
+                    )
+                if not iterator.Next(RIL.WORD):
+                    break
+        return _assemble_result(words)
+
+    def live_apis(self):
+        return len(self._slots)
+
+    def close(self):
+        with self._lock:
+            for slot in list(self._slots):
+                slot.close()
+
+
+def get_ocr_engine(name=None):
+    """
+    Return the OCR engine for this process. "auto" prefers the in-process
+    tesserocr engine and falls back to pytesseract when it is unavailable.
+    Engines are created once per process (re-created after fork).
+    """
+    global _engine, _engine_pid
+    name = (name or OCR_ENGINE).lower()
+    if name == "pytesseract":
+        return PytesseractEngine()
+
+    if _engine is None or _engine_pid != os.getpid():
+        with _engine_lock:
+            if _engine is None or _engine_pid != os.getpid():
+                try:
+                    _engine = TesserocrEngine()
+                    logger.info("✅ Using in-process tesserocr OCR engine.")
+                except Exception as e:
+                    if name == "tesserocr":
+                        logger.warning(f"⚠️ tesserocr engine unavailable ({e}); falling back to pytesseract.")
+                    _engine = PytesseractEngine()
+                _engine_pid = os.getpid()
+    return _engine
+
+
+def ocr_settings(steps=None, engine=None):
     """
+    Identifies everything (besides the pixels) that changes OCR output; part of
+    the OCR cache key so changing preprocessing invalidates old entries.
+    """
+    steps = OCR_PREPROCESS_STEPS if steps is None else steps
+    engine = engine or get_ocr_engine()
+    return f"preprocess=gray+{'+'.join(steps)};dpi={OCR_TARGET_DPI};engine={engine.name};lang={OCR_LANG};output=data"
+
+
+# ----------------------------------------------------------------------
+# OCR cache
+# ----------------------------------------------------------------------
+def get_ocr_cache():
+    """Return the shared page-level OCR cache, or None if disabled."""
+    global _ocr_cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = ResultCache(OCR_CACHE_PATH, max_entries=OCR_CACHE_MAX_ENTRIES)
+    return _ocr_cache
+
+
+def image_cache_key(img, steps=None, engine=None, dpi=None):
+    """
+    SHA-256 over the rendered bitmap (mode, size, pixels) plus OCR settings and
+    the DPI it was rendered at (which decides rescaling and tesseract's resolution).
+    """
+    digest = hashlib.sha256(f"{img.mode}:{img.size}:dpi={dpi}".encode())
+    digest.update(img.tobytes())
+    return make_cache_key(digest.hexdigest(), ocr_settings(steps, engine))
+
+
+# ----------------------------------------------------------------------
+# OCR entry point
+# ----------------------------------------------------------------------
+def ocr_image_data(img, use_cache=True, dpi=None, steps=None, engine=None):
+    """
+    OCR a PIL Image in a single engine pass and return text with confidences:
+        {"text": str, "confidence": float (0-1, character-weighted),
+         "words": [{"text", "conf", "bbox": [x, y, w, h], "line", "block"}],
+         "lines": [{"text", "conf", "bbox"}]}
+    Pages already seen with the same settings are answered from the OCR cache.
+    `engine` overrides the configured OCR engine (see get_ocr_engine()).
+    """
+    engine = engine or get_ocr_engine()
+    steps = OCR_PREPROCESS_STEPS if steps is None else steps
+    cache = get_ocr_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = image_cache_key(img, steps, engine, dpi)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.debug("♻️ OCR cache hit — skipping tesseract.")
+            return cached
+
     try:
-        # Preprocess: Convert to OpenCV, grayscale, threshold
-        img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-        thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        
-        # OCR
-        text = pytesseract.image_to_string(Image.fromarray(thresh))
-        logger.debug(f"OCR extracted: {text[:100]}...")  # Truncate for log
-        return text.strip()
+        # Preprocess: grayscale + configured stages (rescale/deskew/denoise/binarize)
+        prepared = preprocess_image(img, steps=steps, dpi=dpi)
+
+        # OCR (after "rescale" the image is at OCR_TARGET_DPI)
+        effective_dpi = OCR_TARGET_DPI if "rescale" in steps else dpi
+        result = engine.image_to_data(prepared, dpi=effective_dpi)
+        logger.debug(f"OCR extracted ({result['confidence']:.2f}): {result['text'][:100]}...")  # Truncate for log
     except Exception as e:
         logger.error(f"OCR failed: {e}")
-        return ""
\ No newline at end of file
+        return {"text": "", "confidence": 0.0, "words": [], "lines": []}
+
+    if key is not None:
+        cache.put(key, result)
+    return result
+
+
+def ocr_image(img, use_cache=True, dpi=None, steps=None, engine=None):
+    """
+    Perform OCR on a PIL Image (handles preprocessing for handwriting/images).
+    Returns only the text; see ocr_image_data() for confidences and boxes.
+    """
+    return ocr_image_data(img, use_cache=use_cache, dpi=dpi, steps=steps, engine=engine)["text"]
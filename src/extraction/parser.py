@@ -1,56 +1,417 @@
+import mmap
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pdfplumber
-from pdf2image import convert_from_path  # pip install pdf2image
-from .ocr import ocr_image
-from ..config import DATA_DIR
+from pdf2image import convert_from_path, pdfinfo_from_path  # pip install pdf2image
+from pdfplumber.utils import objects_to_bbox
+from pdfplumber.utils.text import WordExtractor
+from PIL import Image, ImageSequence
+from .ocr import ocr_image_data
+from .templates import _ZoneReader, match_template, read_template
+from ..config import DATA_DIR, OCR_MIN_DPI, OCR_PAGE_WORKERS, OCR_TARGET_DPI, PDF_MIN_TEXT_CHARS, TEMPLATES_ENABLED
 from ..utils.logging import logger
 
-def extract_text(file_path):
+# Confidence assigned to text read from a PDF text layer (no recognition involved)
+TEXT_LAYER_CONFIDENCE = 0.95
+# Confidence assigned to native plain-text inputs (read verbatim)
+NATIVE_TEXT_CONFIDENCE = 1.0
+
+def available_cores():
+    """Number of CPU cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on Windows/macOS
+        return os.cpu_count() or 1
+
+
+_ocr_pool = None
+_ocr_pool_pid = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool():
+    """
+    Process-wide thread pool for page OCR (one per core, re-created after fork).
+    Its threads live as long as the process, so per-thread OCR state (tesserocr
+    APIs) is loaded once instead of once per document.
+    """
+    global _ocr_pool, _ocr_pool_pid
+    if _ocr_pool is None or _ocr_pool_pid != os.getpid():
+        with _ocr_pool_lock:
+            if _ocr_pool is None or _ocr_pool_pid != os.getpid():
+                _ocr_pool = ThreadPoolExecutor(max_workers=available_cores(), thread_name_prefix="ocr")
+                _ocr_pool_pid = os.getpid()
+    return _ocr_pool
+
+
+def cap_ocr_workers(requested, page_count=None):
+    """Clamp a per-document OCR pool size to the available cores (and page count)."""
+    workers = max(1, min(requested or 1, available_cores()))
+    if page_count:
+        workers = min(workers, page_count)
+    return workers
+
+
+def _ocr_page_result(page_no, result):
+    """Per-page entry for extracted["pages"] from an ocr_image_data() result."""
+    return {
+        "page": page_no,
+        "text": result["text"],
+        "source": "ocr",
+        "confidence": result["confidence"],
+        "lines": result["lines"],
+    }
+
+
+def _render_and_ocr(file_path, page_no, dpi=None):
+    """Rasterise a single page (at `dpi`, or pdf2image's default) and OCR it."""
+    render_kwargs = {"dpi": dpi} if dpi else {}
+    img = convert_from_path(str(file_path), first_page=page_no, last_page=page_no, **render_kwargs)[0]
+    try:
+        return _ocr_page_result(page_no, ocr_image_data(img, dpi=dpi))
+    finally:
+        img.close()
+
+
+def iter_ocr_pages(file_path, first_page=1, last_page=None, workers=1, page_dpis=None):
+    """
+    Render and OCR a scanned PDF one page at a time.
+
+    `page_dpis` ({page_no: dpi}) restricts OCR to those pages, each rendered at
+    its own resolution; otherwise every page in [first_page, last_page] is OCR'd.
+
+    Each page is rasterised through a single-page first_page/last_page window,
+    OCR'd and released before the next one is rendered, so peak memory stays at
+    one page bitmap regardless of document length.
+
+    With `workers` > 1 pages are OCR'd on the process-wide OCR thread pool
+    (tesseract and pdftoppm release the GIL, so threads scale). At most
+    `workers` pages are in flight and results are still yielded in page order.
+    Yields dicts: {"page": int, "text": str, "source": "ocr", "confidence": float, "lines": [...]}
+    """
+    if page_dpis is None:
+        if last_page is None:
+            last_page = pdfinfo_from_path(str(file_path))["Pages"]
+        page_dpis = {page_no: None for page_no in range(first_page, last_page + 1)}
+
+    page_numbers = sorted(page_dpis)
+    if not page_numbers:
+        return
+    workers = cap_ocr_workers(workers, len(page_numbers))
+
+    if workers == 1:
+        for page_no in page_numbers:
+            yield _render_and_ocr(file_path, page_no, page_dpis[page_no])
+        return
+
+    # tesseract itself is kept single-threaded (OCR_OMP_THREAD_LIMIT, set in config)
+    logger.info(f"🧵 OCR-ing {len(page_numbers)} pages across {workers} workers")
+    pool = _get_ocr_pool()
+    pending = deque()
+    for page_no in page_numbers:
+        pending.append(pool.submit(_render_and_ocr, file_path, page_no, page_dpis[page_no]))
+        if len(pending) >= workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _join_pages(pages):
+    """Join page texts once (one trailing newline per non-empty page)."""
+    return "".join(p["text"] + "\n" for p in pages if p["text"])
+
+
+def document_confidence(pages):
+    """Character-weighted mean of page confidences (0.0 when no text was found)."""
+    total_chars = sum(len(p["text"]) for p in pages)
+    if not total_chars:
+        return 0.0
+    return sum(p["confidence"] * len(p["text"]) for p in pages) / total_chars
+
+
+# ----------------------------------------------------------------------
+# Format handlers
+# ----------------------------------------------------------------------
+# Each handler takes (file_path, extracted, ocr_workers) and fills in
+# extracted["pages"] / extracted["structured"]; extract_text() joins the text
+# and computes the document confidence afterwards.
+_HANDLERS = {}
+
+
+def register_handler(*extensions):
+    """Decorator registering an extraction handler for the given file extensions."""
+    def decorator(fn):
+        for ext in extensions:
+            _HANDLERS[ext.lower()] = fn
+        return fn
+    return decorator
+
+
+def supported_extensions():
+    """File extensions with a registered extraction handler."""
+    return sorted(_HANDLERS)
+
+
+@register_handler(".txt")
+def _extract_txt(file_path, extracted, ocr_workers):
+    """
+    Native text: memory-map the file and decode it in one pass (no OCR, no
+    intermediate bytes copy). Form feeds split pages, as emitted by EDI/print feeds.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            text = ""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8-sig", "replace")
+
+    extracted["pages"] = [
+        {"page": page_no, "text": page_text.strip("\n"), "source": "text", "confidence": NATIVE_TEXT_CONFIDENCE}
+        for page_no, page_text in enumerate(text.split("\f"), start=1)
+    ]
+
+
+def needs_ocr(page, page_text):
+    """A page needs OCR when its text layer is missing or too thin to be real content."""
+    return len((page_text or "").strip()) < PDF_MIN_TEXT_CHARS and bool(
+        page.images or page.chars or page.rects or page.curves or page.lines
+    )
+
+
+def ocr_dpi_for_page(page):
+    """
+    Lowest DPI that preserves the page's detail: the native resolution of the
+    largest embedded scan, clamped to [OCR_MIN_DPI, OCR_TARGET_DPI]. Rendering a
+    200-DPI fax at 300 DPI adds pixels for tesseract to chew on but no information.
+    Pages without embedded images (vector content) render at OCR_TARGET_DPI.
+    """
+    native = []
+    for image in page.images:
+        width_pts = float(image.get("width") or 0)
+        src_width = (image.get("srcsize") or (0, 0))[0]
+        if width_pts > 0 and src_width:
+            # weight by displayed area so small logos don't decide the DPI
+            area = width_pts * float(image.get("height") or 0)
+            native.append((area, src_width / (width_pts / 72.0)))
+    if not native:
+        return OCR_TARGET_DPI
+    dpi = max(native)[1]
+    return int(min(OCR_TARGET_DPI, max(OCR_MIN_DPI, round(dpi))))
+
+
+# "Key: Value" form lines (labels up to ~40 chars, value on the same line)
+_KEY_VALUE_LINE = re.compile(r"^\s*([A-Za-z][A-Za-z0-9 #/().'&-]{0,40}?)\s*:\s*(\S.*?)\s*$")
+
+
+def _field_key(label):
+    return str(label).strip().lower().replace(" ", "_")
+
+
+def analyze_page(page):
     """
-    Extract text from PDF or Image. Handles structured (forms/tables) and unstructured.
-    Returns dict: {"structured": {}, "unstructured": str, "confidence": float}
+    Single pass over a pdfplumber page. Characters are clustered into words once
+    and the same word map yields the page text (equivalent to page.extract_text());
+    tables come from one find_tables() call over the same cached chars/edges.
+
+    Returns {"text": str, "words": [...], "tables": [rows...], "fields": [(key, value)]}
+    where "fields" are "Key: Value" form lines found in the text.
     """
-    extracted = {"structured": {}, "unstructured": "", "confidence": 0.9}
-    
+    chars = page.chars
+    words, text = [], ""
+    if chars:
+        wordmap = WordExtractor().extract_wordmap(chars)
+        words = [word for word, _ in wordmap.tuples]
+        text = wordmap.to_textmap(presorted=True, layout_bbox=objects_to_bbox(chars)).as_string
+
+    tables = [table.extract() for table in page.find_tables()]
+
+    fields = []
+    for line in text.splitlines():
+        match = _KEY_VALUE_LINE.match(line)
+        if match:
+            fields.append((_field_key(match.group(1)), match.group(2)))
+
+    return {"text": text, "words": words, "tables": tables, "fields": fields}
+
+
+def _table_fields(rows):
+    """
+    Map table rows to (key, value) pairs: the first cell is the key; the value is
+    the single non-empty remaining cell, or the list of them for multi-column rows.
+    (Complete rows, empty cells included, are kept in extracted["tables"].)
+    """
+    for row in rows or []:
+        if not row or len(row) < 2 or row[0] is None or not str(row[0]).strip():
+            continue
+        cells = [str(cell).strip() for cell in row[1:] if cell is not None and str(cell).strip()]
+        if len(cells) <= 1:
+            yield _field_key(row[0]), cells[0] if cells else ""
+        else:
+            yield _field_key(row[0]), cells
+
+
+@register_handler(".pdf")
+def _extract_pdf(file_path, extracted, ocr_workers):
+    """
+    Hybrid PDF extraction: pages with a text layer are read with pdfplumber;
+    only pages without one (scans, attachments) are rasterised and OCR'd,
+    each at its minimum useful DPI.
+
+    Each page is analysed once (text, tables and form fields together) and its
+    cached layout objects are released before moving on. Full tables are kept in
+    extracted["tables"]; structured fields keep every column and repeated key.
+
+    Documents matching a known form template (configs/templates.yaml) are read
+    zone by zone instead (their text layer is kept), and extracted["template"]
+    records the match.
+    """
+    if TEMPLATES_ENABLED and _extract_pdf_template(file_path, extracted, ocr_workers):
+        return
+
+    text_pages = []
+    page_dpis = {}
+    tables = []
+    structured = {}
+    repeated = set()
+
+    def put(key, value):
+        # first occurrence stored as-is; repeats collect every value in order
+        if key not in structured:
+            structured[key] = value
+        elif key in repeated:
+            structured[key].append(value)
+        else:
+            structured[key] = [structured[key], value]
+            repeated.add(key)
+
+    with pdfplumber.open(file_path) as pdf:
+        for page_no, page in enumerate(pdf.pages, start=1):
+            analysis = analyze_page(page)
+            page_text = analysis["text"]
+            if needs_ocr(page, page_text):
+                page_dpis[page_no] = ocr_dpi_for_page(page)
+            elif page_text:
+                text_pages.append(
+                    {"page": page_no, "text": page_text, "source": "text", "confidence": TEXT_LAYER_CONFIDENCE}
+                )
+
+            # Structured: tables and "Key: Value" form lines (basic; enhance with Textract in prod)
+            for rows in analysis["tables"]:
+                tables.append({"page": page_no, "rows": rows})
+                for key, value in _table_fields(rows):
+                    put(key, value)
+            for key, value in analysis["fields"]:
+                put(key, value)
+
+            page.flush_cache()
+
+    extracted["structured"].update(structured)
+    extracted["tables"] = tables
+
+    # Pages without a text layer are OCR'd — streamed page by page
+    ocr_pages = []
+    if page_dpis:
+        logger.info(f"OCR-ing {len(page_dpis)} page(s) without a text layer: {sorted(page_dpis)}")
+        ocr_pages = list(iter_ocr_pages(file_path, workers=ocr_workers, page_dpis=page_dpis))
+
+    extracted["pages"] = sorted(text_pages + ocr_pages, key=lambda p: p["page"])
+
+
+def _extract_pdf_template(file_path, extracted, ocr_workers=1):
+    """
+    Fingerprint the PDF against the template registry. On a match the zones are
+    read (only the zone crops of scanned form pages are OCR'd), the text layer of
+    every page is kept, and scanned pages without zones (attachments) are OCR'd.
+    A match whose zones fail the router's template gate (too few fields, low
+    confidence, e.g. a poor scan) is dropped in favour of full extraction.
+    """
+    try:
+        reader = _ZoneReader(file_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Template fingerprinting unavailable for {file_path.name} ({e}); using full extraction.")
+        return False
+    try:
+        template = match_template(reader)
+        if template is None:
+            return False
+        result = read_template(reader, template, TEXT_LAYER_CONFIDENCE)
+    finally:
+        reader.close()
+
+    info = {
+        "name": template["name"],
+        "normalized": result["normalized"],
+        "fields": list(template.get("normalized") or {}),  # schema fields the template can fill
+    }
+    from src.processing.router import get_router  # late: routing config is only needed on a match
+
+    rejected = get_router().template_gate(info, document_confidence(result["pages"]))
+    if rejected:
+        logger.info(f"🧾 Template '{template['name']}' not usable ({rejected}); using full extraction.")
+        return False
+
+    extracted["structured"].update(result["structured"])
+    ocr_pages = []
+    if result["unread_pages"]:
+        logger.info(f"OCR-ing {len(result['unread_pages'])} page(s) outside the form zones: {result['unread_pages']}")
+        page_dpis = dict.fromkeys(result["unread_pages"], OCR_TARGET_DPI)
+        ocr_pages = list(iter_ocr_pages(file_path, workers=ocr_workers, page_dpis=page_dpis))
+    extracted["pages"] = sorted(result["pages"] + ocr_pages, key=lambda p: p["page"])
+    extracted["template"] = info
+    return True
+
+
+@register_handler(".png", ".jpg", ".jpeg")
+def _extract_image(file_path, extracted, ocr_workers):
+    with Image.open(file_path) as img:
+        extracted["pages"] = [_ocr_page_result(1, ocr_image_data(img))]
+
+
+@register_handler(".tif", ".tiff")
+def _extract_tiff(file_path, extracted, ocr_workers):
+    """Multi-page TIFF (common for fax/scanner output): OCR every frame in order."""
+    pages = []
+    with Image.open(file_path) as img:
+        for page_no, frame in enumerate(ImageSequence.Iterator(img), start=1):
+            pages.append(_ocr_page_result(page_no, ocr_image_data(frame.copy())))
+    extracted["pages"] = pages
+
+
+def extract_text(file_path, ocr_workers=None):
+    """
+    Extract text from PDF, image or plain-text files, dispatching on the file
+    extension to the cheapest handler. Handles structured (forms/tables) and unstructured.
+    Returns dict: {"structured": {}, "unstructured": str, "confidence": float, "pages": [...]}
+    where "pages" holds the per-page results ({"page", "text", "source", "confidence"};
+    OCR'd pages also carry per-line "lines" with confidences and bounding boxes).
+    "confidence" is the character-weighted document confidence: tesseract's word
+    confidences for OCR'd pages, TEXT_LAYER_CONFIDENCE for text-layer pages and
+    NATIVE_TEXT_CONFIDENCE for plain-text files.
+
+    `ocr_workers` sets how many pages of one scanned PDF are OCR'd in parallel
+    (defaults to OCR_PAGE_WORKERS; capped at the available cores).
+    """
+    if ocr_workers is None:
+        ocr_workers = OCR_PAGE_WORKERS
+    extracted = {"structured": {}, "unstructured": "", "confidence": 0.9, "pages": []}
+
     try:
-        if file_path.suffix.lower() == '.pdf':
-            with pdfplumber.open(file_path) as pdf:
-                text_found = False
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        extracted["unstructured"] += page_text + "\n"
-                        text_found = True
-                    
-                    # Structured: Extract tables/forms (basic; enhance with Textract in prod)
-                    tables = page.extract_tables()
-                    if tables:
-                        for table in tables:
-                            for row in table or []:
-                                if len(row) >= 2:
-                                    key = str(row[0]).strip().lower().replace(" ", "_")
-                                    value = str(row[1]).strip()
-                                    extracted["structured"][key] = value
-                
-                # If no text (scanned PDF), OCR as images
-                if not text_found:
-                    logger.info("No text in PDF; treating as scanned and OCR-ing")
-                    images = convert_from_path(str(file_path))
-                    for img in images:
-                        extracted["unstructured"] += ocr_image(img) + "\n"
-                
-                # Mock confidence (use real OCR scores in prod)
-                extracted["confidence"] = 0.85 if "handwritten" in extracted["unstructured"].lower() else 0.95
-                
-        else:  # Image file (PNG/JPG)
-            from PIL import Image as PILImage
-            img = PILImage.open(file_path)
-            extracted["unstructured"] = ocr_image(img)
-            extracted["confidence"] = 0.9
-        
+        handler = _HANDLERS.get(file_path.suffix.lower())
+        if handler is None:
+            logger.warning(f"⚠️ No extractor registered for '{file_path.suffix}'; trying image OCR.")
+            handler = _extract_image
+
+        handler(file_path, extracted, ocr_workers)
+        extracted["unstructured"] = _join_pages(extracted["pages"])
+        extracted["confidence"] = document_confidence(extracted["pages"])
+
         logger.info(f"Extraction complete. Unstructured len: {len(extracted['unstructured'])}")
         return extracted
-        
+
     except Exception as e:
         logger.error(f"Extraction failed: {e}")
         extracted["confidence"] = 0.0
-        return extracted
\ No newline at end of file
+        return extracted
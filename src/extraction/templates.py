@@ -0,0 +1,231 @@
+"""
+src/extraction/templates.py
+--------------------------------
+Template registry for known fixed-layout claim forms (UB-04, property claim
+forms, ...), loaded from configs/templates.yaml.
+
+A document is fingerprinted against the registry before full extraction:
+- page size (cheap pre-filter, most documents are ruled out here)
+- anchor texts read from their zones (text layer, or OCR of the zone crop)
+
+A matched document is read zone by zone straight into `structured`: text-layer
+pages are read from pdfium's character boxes, scanned pages are rendered once
+and only the configured zones are OCR'd. The pages' whole text layer is kept as
+the document text, so nothing outside the zones is lost if the claim still goes
+to the LLM. Schema fields are mapped through the template's `normalized` section
+so the GenAI step can be skipped.
+"""
+
+import re
+import pypdfium2 as pdfium  # ships with pdfplumber
+from .ocr import ocr_image_data
+from ..config import OCR_TARGET_DPI, PDF_MIN_TEXT_CHARS, TEMPLATES
+from ..utils.logging import logger
+from ..utils.normalization import normalize_date
+
+# "$1,234.50", "1234"
+_AMOUNT = re.compile(r"^\$?\s*([\d,]+)(?:\.(\d{2}))?$")
+
+
+def _clean(text):
+    """Collapse whitespace and drop fill-in underscores."""
+    return " ".join((text or "").replace("_", " ").split())
+
+
+def _coerce(value, field_type):
+    """
+    Field types: "amount" ($1,234.50), "amount_cents" (implied decimal, as in
+    the UB-04 dollars|cents columns: "7703000" → 77030.0) and "date" (ISO, via
+    normalize_date: "101024" → "2024-10-10"). Anything else, or a value that
+    does not parse, is kept as text.
+    """
+    if field_type == "date":
+        return normalize_date(value) or value
+    digits = value.replace(" ", "")
+    if field_type == "amount_cents" and digits.isdigit():
+        return int(digits) / 100.0
+    if field_type == "amount":
+        match = _AMOUNT.match(digits)
+        if match:
+            return float(match.group(1).replace(",", "") + "." + (match.group(2) or "00"))
+    return value
+
+
+class _ZoneReader:
+    """
+    Reads text from page zones of one PDF, opened with pdfium: it exposes the
+    text layer with per-character boxes without pdfminer's full layout pass, so
+    reading a dozen zones takes milliseconds. Text-layer pages are read from the
+    characters fully inside each zone; scanned pages are rendered once (at
+    `dpi`) and only the zone crops are OCR'd.
+    """
+
+    def __init__(self, file_path, dpi=None):
+        self.file_path = file_path
+        self.dpi = dpi or OCR_TARGET_DPI
+        self.pdf = pdfium.PdfDocument(str(file_path))
+        self._chars = {}
+        self._images = {}
+
+    def __len__(self):
+        return len(self.pdf)
+
+    def page_size(self, page_no):
+        return self.pdf.get_page_size(page_no - 1)
+
+    def _page_chars(self, page_no):
+        """[(char, (left, bottom, right, top))] in pdfium's reading order, cached per page."""
+        chars = self._chars.get(page_no)
+        if chars is None:
+            textpage = self.pdf[page_no - 1].get_textpage()
+            count = textpage.count_chars()
+            text = textpage.get_text_range()
+            if len(text) != count:
+                text = [textpage.get_text_range(i, 1) for i in range(count)]
+            chars = [(text[i], textpage.get_charbox(i, loose=True)) for i in range(count)]
+            self._chars[page_no] = chars
+        return chars
+
+    def is_scanned(self, page_no):
+        return sum(1 for char, _ in self._page_chars(page_no) if not char.isspace()) < PDF_MIN_TEXT_CHARS
+
+    def _text_in(self, page_no, bbox):
+        """Join the characters centred inside `bbox`, splitting words on gaps and lines on baselines."""
+        _, height = self.page_size(page_no)
+        x0, top, x1, bottom = bbox
+        y0, y1 = height - bottom, height - top  # pdfium boxes are bottom-up
+        out, prev, spaced = [], None, False
+        for char, (left, low, right, high) in self._page_chars(page_no):
+            if char.isspace():
+                spaced = True
+                continue
+            mid_x, mid_y = (left + right) / 2, (low + high) / 2
+            if not (x0 <= mid_x <= x1 and y0 <= mid_y <= y1):
+                continue
+            if prev is not None:
+                p_left, p_low, p_right, p_high = prev
+                if not p_low <= mid_y <= p_high:
+                    out.append("\n")
+                elif spaced or left - p_right > 0.15 * max(high - low, 1.0):
+                    out.append(" ")
+            out.append(char)
+            prev, spaced = (left, low, right, high), False
+        return "".join(out)
+
+    def page_text(self, page_no):
+        """Whole text layer of a page with its line breaks ("" for scanned pages)."""
+        if not 1 <= page_no <= len(self.pdf) or self.is_scanned(page_no):
+            return ""
+        text = "".join(char for char, _ in self._page_chars(page_no)).replace("\r\n", "\n").replace("\r", "\n")
+        return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+    def read(self, page_no, bbox=None):
+        """Return (text, confidence) for a zone; confidence is None for text-layer reads."""
+        if not 1 <= page_no <= len(self.pdf):
+            return "", None
+        if not self.is_scanned(page_no):
+            if not bbox:
+                return _clean("".join(char for char, _ in self._page_chars(page_no))), None
+            return _clean(self._text_in(page_no, bbox)), None
+        if not bbox:
+            return "", None
+
+        img = self._images.get(page_no)
+        if img is None:
+            img = self.pdf[page_no - 1].render(scale=self.dpi / 72.0).to_pil()
+            self._images[page_no] = img
+        scale = self.dpi / 72.0
+        crop = img.crop(tuple(int(round(v * scale)) for v in bbox))
+        try:
+            result = ocr_image_data(crop, dpi=self.dpi)
+        finally:
+            crop.close()
+        return _clean(result["text"]), result["confidence"]
+
+    def close(self):
+        for img in self._images.values():
+            img.close()
+        self._images.clear()
+        self._chars.clear()
+        self.pdf.close()
+
+
+def _size_matches(reader, template):
+    width, height = reader.page_size(1)
+    t_width, t_height = template.get("page_size") or (width, height)
+    tolerance = float(template.get("size_tolerance", 6))
+    return abs(width - t_width) <= tolerance and abs(height - t_height) <= tolerance
+
+
+def match_template(reader, templates=None):
+    """
+    Return the first template whose fingerprint matches the document, or None.
+    Page count and size are checked before any anchor zone is read.
+    """
+    templates = TEMPLATES if templates is None else templates
+    if not len(reader):
+        return None
+
+    for template in templates:
+        if len(reader) < int(template.get("min_pages", 1)) or not _size_matches(reader, template):
+            continue
+        anchors = template.get("anchors") or []
+        if anchors and all(
+            _clean(anchor["text"]).casefold() in reader.read(anchor.get("page", 1), anchor.get("bbox"))[0].casefold()
+            for anchor in anchors
+        ):
+            logger.info(f"🧾 Matched form template '{template['name']}'")
+            return template
+    return None
+
+
+def read_template(reader, template, text_layer_confidence):
+    """
+    Read every configured zone of a matched template.
+
+    Returns {"structured": {field: value}, "normalized": {schema_field: value},
+    "pages": [{"page", "text", "source": "template", "confidence"}],
+    "unread_pages": [page_no]}. Each page's text holds its "field: value" lines
+    followed by the page's whole text layer, so text outside the zones (and on
+    pages without zones) is kept. Scanned pages only carry their OCR'd zones;
+    scanned pages without any zone are listed in "unread_pages". Empty zones are
+    left out.
+    """
+    structured = {}
+    page_lines = {}
+
+    for field, zone in (template.get("fields") or {}).items():
+        page_no = zone.get("page", 1)
+        text, confidence = reader.read(page_no, zone.get("bbox"))
+        if not text:
+            continue
+        structured[field] = _coerce(text, zone.get("type"))
+        line = f"{field}: {text}"
+        page_lines.setdefault(page_no, []).append((line, text_layer_confidence if confidence is None else confidence))
+
+    pages, unread = [], []
+    for page_no in range(1, len(reader) + 1):
+        lines = list(page_lines.get(page_no, []))
+        full_text = reader.page_text(page_no)
+        if full_text:
+            lines.append((full_text, text_layer_confidence))
+        if not lines:
+            if reader.is_scanned(page_no):
+                unread.append(page_no)
+            continue
+        total = sum(len(line) for line, _ in lines)
+        pages.append(
+            {
+                "page": page_no,
+                "text": "\n".join(line for line, _ in lines),
+                "source": "template",
+                "confidence": sum(conf * len(line) for line, conf in lines) / total,
+            }
+        )
+
+    normalized = {
+        schema_field: structured[field]
+        for schema_field, field in (template.get("normalized") or {}).items()
+        if field in structured
+    }
+    return {"structured": structured, "normalized": normalized, "pages": pages, "unread_pages": unread}
@@ -1,20 +1,159 @@
+"""
+src/ingestion/ingest.py
+--------------------------------
+Content-addressed raw store for ingested documents.
+
+Every document is stored once under RAW_STORE_DIR/<sha[:2]>/<sha[2:4]>/<sha><ext>,
+so re-ingesting the same bytes returns the same path and costs no extra disk.
+
+Key features:
+- SHA-256 computed while streaming (or reused when the caller already has it)
+- Zero-copy when source and store share a filesystem: copy-on-write reflink
+  (Linux FICLONE); a hard link only with RAW_STORE_MODE=hardlink or when the
+  source is consumed (deleted after ingestion, as in the spool), since an
+  in-place edit of a hard-linked source would change the stored bytes
+- Chunked copy otherwise, hashed in the same pass
+- Written to a temp file in the store and os.replace()d into place, so
+  concurrent ingestion of the same document is safe
+"""
+
+import errno
+import hashlib
 import os
-import shutil
-from datetime import datetime
+import tempfile
 from pathlib import Path
+from typing import Optional, Tuple
+from src.config import RAW_STORE_DIR, RAW_STORE_MODE
 from src.utils.logging import logger
 
+ALLOWED_EXTS = [".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".txt"]
+
+_CHUNK_SIZE = 1 << 20
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+# Errors meaning "this filesystem/pair can't do that", not a real failure
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOSYS}
+
+
+def raw_store_path(sha256: str, suffix: str, root: Path = None) -> Path:
+    """Stable location of a document in the raw store."""
+    root = Path(root or RAW_STORE_DIR)
+    return root / sha256[:2] / sha256[2:4] / f"{sha256}{suffix.lower()}"
+
+
+# ----------------------------------------------------------------------
+# Transfer strategies (each writes `tmp`, which the caller moves into place)
+# ----------------------------------------------------------------------
+def _hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _reflink(source: Path, tmp: Path):
+    import fcntl  # POSIX only; ImportError is treated like an unsupported filesystem
+
+    with open(source, "rb") as src, open(tmp, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def _hardlink(source: Path, tmp: Path):
+    os.unlink(tmp)  # os.link will not overwrite the placeholder
+    os.link(source, tmp)
+
+
+def _copy_hashing(source: Path, tmp: Path) -> str:
+    """Chunked copy; returns the SHA-256 of the bytes written."""
+    h = hashlib.sha256()
+    with open(source, "rb") as src, open(tmp, "wb") as dst:
+        for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+            dst.write(chunk)
+    return h.hexdigest()
 
-def ingest_document(file_path: Path) -> Path:
+
+def _link_strategies(source: Path, root: Path, mode: str, consume: bool = False):
+    if mode == "copy":
+        return []
+    try:
+        same_fs = os.stat(source).st_dev == os.stat(root).st_dev
+    except OSError:
+        same_fs = False
+    if not same_fs:
+        return []
+    if mode == "auto":
+        return [("reflink", _reflink)] + ([("hardlink", _hardlink)] if consume else [])
+    return {"reflink": [("reflink", _reflink)], "hardlink": [("hardlink", _hardlink)]}.get(mode, [])
+
+
+def store_raw(
+    file_path: Path, sha256: Optional[str] = None, root: Path = None, mode: str = None, consume: bool = False
+) -> Tuple[Path, str, str]:
     """
-    Ingest a document (PDF, PNG, JPG) and copy it to the raw data directory.
-    Adds a timestamp to prevent duplicate overwrites.
+    Put `file_path` in the raw store. Returns (path, sha256, how) where `how`
+    is "existing", "reflink", "hardlink" or "copy". `consume` means the caller
+    deletes `file_path` afterwards, which lets "auto" fall back to a hard link.
+    """
+    root = Path(root or RAW_STORE_DIR)
+    mode = (mode or RAW_STORE_MODE).lower()
+    root.mkdir(parents=True, exist_ok=True)
+    strategies = _link_strategies(file_path, root, mode, consume)
+
+    # Links need the digest up front (one read); a copy hashes as it goes
+    if sha256 is None and strategies:
+        sha256 = _hash_file(file_path)
+    if sha256 is not None:
+        target = raw_store_path(sha256, file_path.suffix, root)
+        if target.exists():
+            return target, sha256, "existing"
+
+    fd, tmp_name = tempfile.mkstemp(dir=root, prefix=".ingest-")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        how = None
+        for name, strategy in strategies:
+            try:
+                strategy(file_path, tmp)
+                how = name
+                break
+            except (OSError, ImportError) as e:
+                if isinstance(e, OSError) and e.errno not in _UNSUPPORTED:
+                    raise
+                logger.debug(f"📎 {name} not possible for {file_path.name}: {e}")
+                if not tmp.exists():
+                    tmp.touch()
+        if how is None:
+            digest = _copy_hashing(file_path, tmp)
+            if sha256 is not None and digest != sha256:
+                raise RuntimeError(f"File changed during ingestion: {file_path}")
+            sha256, how = digest, "copy"
+
+        target = raw_store_path(sha256, file_path.suffix, root)
+        if target.exists():
+            return target, sha256, "existing"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, target)
+        return target, sha256, how
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def ingest_document(file_path: Path, sha256: Optional[str] = None, consume: bool = False) -> Path:
+    """
+    Ingest a document (PDF, PNG, JPG, TIFF, TXT) into the content-addressed raw store.
 
     Args:
         file_path (Path): Path to the input document.
+        sha256 (str, optional): Its SHA-256, if the caller already computed it.
+        consume (bool): The file is deleted after processing (spool mode), so it
+            may be hard-linked into the store.
 
     Returns:
-        Path: Path to the ingested (copied) file inside data/raw/
+        Path: Path of the document inside the raw store (the same on every rerun).
     """
 
     # Validate input path
@@ -23,31 +162,23 @@ def ingest_document(file_path: Path) -> Path:
         raise FileNotFoundError(f"File not found: {file_path}")
 
     # Check allowed formats
-    allowed_ext = [".pdf", ".png", ".jpg", ".jpeg", ".tiff"]
-    if file_path.suffix.lower() not in allowed_ext:
+    if file_path.suffix.lower() not in ALLOWED_EXTS:
         logger.warning(f"⚠️ Unsupported file type: {file_path.suffix}. Proceeding anyway.")
 
-    # Define target directory (data/raw/)
-    base_dir = Path(__file__).resolve().parents[2]  # project root
-    target_dir = base_dir / "data" / "raw"
-    target_dir.mkdir(parents=True, exist_ok=True)
-
-    # Create timestamped filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    target_filename = f"{file_path.stem}_{timestamp}{file_path.suffix}"
-    target_path = target_dir / target_filename
-
-    # Copy the file to raw data directory
     try:
-        shutil.copy(file_path, target_path)
-        logger.info(f"📥 Ingested file copied to: {target_path}")
+        target_path, digest, how = store_raw(file_path, sha256, consume=consume)
     except Exception as e:
         logger.error(f"❌ Error during ingestion of {file_path}: {e}")
         raise RuntimeError(f"Failed to ingest file: {file_path}") from e
 
+    if how == "existing":
+        logger.info(f"📥 Already in raw store: {file_path.name} → {target_path}")
+    else:
+        logger.info(f"📥 Ingested file ({how}) to: {target_path}")
+
     # Log metadata
     file_size_kb = os.path.getsize(target_path) / 1024
-    logger.debug(f"📄 File details: name={target_filename}, size={file_size_kb:.2f} KB")
+    logger.debug(f"📄 File details: name={file_path.name}, sha256={digest}, size={file_size_kb:.2f} KB")
 
     return target_path
 
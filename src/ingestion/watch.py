@@ -0,0 +1,305 @@
+"""
+src/ingestion/watch.py
+--------------------------------
+Inbox watcher and spool queue for the long-running service mode
+(`python -m src.main --watch INBOX`).
+
+Files dropped into the inbox are claimed by an atomic rename into
+WATCH_SPOOL_DIR/processing, handed to the pipeline in batches, and removed
+once stored (the raw store keeps the content). Failures go to
+WATCH_SPOOL_DIR/quarantine with a `<name>.retry.json` sidecar and are retried
+with exponential backoff until WATCH_MAX_RETRIES attempts have been made. A
+failing file never replaces another quarantined file of the same name; a
+retried file keeps its attempt count through the sidecar's "requeued_as" name.
+
+Key features:
+- inotify/FSEvents wake-ups through `watchdog` when installed, polling every
+  WATCH_POLL_SECONDS otherwise (the directory scan is always the source of truth)
+- Files are only claimed once unchanged for WATCH_SETTLE_SECONDS, and hidden or
+  partial (.part/.tmp/.crdownload) names are ignored — writers should still
+  write elsewhere and rename into the inbox
+- Files left in processing/ by a crashed daemon go back to the inbox at start
+- One daemon per spool directory
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.config import (
+    WATCH_BATCH_SIZE,
+    WATCH_MAX_RETRIES,
+    WATCH_POLL_SECONDS,
+    WATCH_RETRY_DELAY_SECONDS,
+    WATCH_SETTLE_SECONDS,
+    WATCH_SPOOL_DIR,
+)
+from src.utils.logging import logger
+
+try:  # optional: native filesystem events instead of polling
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+_PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+_SIDECAR_SUFFIX = ".retry.json"
+
+# process(files) -> one result dict per file ({"file": str(path), "status": ...})
+ProcessFn = Callable[[List[Path]], List[Dict[str, Any]]]
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """Any inbox event wakes the watch loop; the scan decides what to claim."""
+
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self.wake = wake
+
+    def on_any_event(self, event):
+        self.wake.set()
+
+
+class SpoolWatcher:
+    """Claims inbox files into a spool, processes them and quarantines failures."""
+
+    def __init__(
+        self,
+        inbox: Path,
+        process: ProcessFn,
+        spool_dir: Path = None,
+        extensions: Optional[Iterable[str]] = None,
+        poll_interval: float = None,
+        settle_seconds: float = None,
+        max_retries: int = None,
+        retry_delay: float = None,
+        batch_size: int = None,
+    ):
+        self.inbox = Path(inbox)
+        self.process = process
+        spool_dir = Path(spool_dir or WATCH_SPOOL_DIR)
+        self.processing = spool_dir / "processing"
+        self.quarantine = spool_dir / "quarantine"
+        self.extensions = {e.lower() for e in extensions} if extensions else None
+        self.poll_interval = WATCH_POLL_SECONDS if poll_interval is None else poll_interval
+        self.settle_seconds = WATCH_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.max_retries = WATCH_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_delay = WATCH_RETRY_DELAY_SECONDS if retry_delay is None else retry_delay
+        self.batch_size = max(1, batch_size or WATCH_BATCH_SIZE)
+        self.stats = {"processed": 0, "failed": 0, "quarantined": 0, "retried": 0, "skipped": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._unsettled = False
+        for directory in (self.inbox, self.processing, self.quarantine):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Spool moves
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _free_name(directory: Path, name: str) -> Path:
+        target = directory / name
+        n = 1
+        while target.exists():
+            target = directory / f"{Path(name).stem}.{n}{Path(name).suffix}"
+            n += 1
+        return target
+
+    def _sidecar(self, name: str) -> Path:
+        return self.quarantine / f"{name}{_SIDECAR_SUFFIX}"
+
+    def _read_sidecar(self, name: str) -> Dict[str, Any]:
+        try:
+            return json.loads(self._sidecar(name).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"file": name, "attempts": 0, "errors": []}
+
+    def _retry_state(self, name: str):
+        """(quarantine name, sidecar state) of the requeued file now called `name`, or (None, fresh state)."""
+        for sidecar in self.quarantine.glob(f"*{_SIDECAR_SUFFIX}"):
+            key = sidecar.name[: -len(_SIDECAR_SUFFIX)]
+            state = self._read_sidecar(key)
+            if state.get("requeued_as") == name:
+                return key, state
+        return None, {"file": name, "attempts": 0, "errors": []}
+
+    def recover(self) -> int:
+        """Return files a previous (crashed) daemon left in processing/ to the inbox."""
+        recovered = 0
+        for path in sorted(self.processing.iterdir()):
+            if path.is_file():
+                os.replace(path, self._free_name(self.inbox, path.name))
+                recovered += 1
+        if recovered:
+            logger.warning(f"♻️ Returned {recovered} interrupted file(s) from {self.processing} to the inbox.")
+        return recovered
+
+    def _wanted(self, path: Path) -> bool:
+        name = path.name
+        if name.startswith(".") or name.lower().endswith(_PARTIAL_SUFFIXES) or not path.is_file():
+            return False
+        return True
+
+    def claim(self) -> List[Path]:
+        """Atomically move settled inbox files (oldest first) into processing/."""
+        now = time.time()
+        candidates = []
+        self._unsettled = False
+        for path in self.inbox.iterdir():
+            if not self._wanted(path):
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - mtime < self.settle_seconds:
+                self._unsettled = True
+                continue
+            candidates.append((mtime, path))
+
+        claimed = []
+        for _, path in sorted(candidates):
+            if len(claimed) >= self.batch_size:
+                self._wake.set()  # more waiting; go again without sleeping
+                break
+            if self.extensions is not None and path.suffix.lower() not in self.extensions:
+                self._quarantine(path, f"Unsupported file type: {path.suffix}", retry=False)
+                continue
+            target = self._free_name(self.processing, path.name)
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # taken by someone else in the meantime
+            claimed.append(target)
+        return claimed
+
+    def _quarantine(self, path: Path, error: str, retry: bool = True):
+        """Move a failed file to quarantine/ (under a free name) and record the attempt in its sidecar."""
+        key, state = self._retry_state(path.name)
+        state.pop("requeued_as", None)
+        if key is not None and not (self.quarantine / key).exists():
+            target = self.quarantine / key  # a retry goes back to its own slot
+        else:
+            target = self._free_name(self.quarantine, path.name)
+            if key is not None:
+                self._sidecar(key).unlink(missing_ok=True)
+        state["file"] = target.name
+        state["attempts"] = state.get("attempts", 0) + 1
+        state["errors"] = (state.get("errors") or [])[-4:] + [{"at": time.time(), "error": error}]
+        if retry and state["attempts"] < self.max_retries:
+            state["next_attempt"] = time.time() + self.retry_delay * 2 ** (state["attempts"] - 1)
+        else:
+            state["next_attempt"] = None
+        os.replace(path, target)
+        self._sidecar(target.name).write_text(json.dumps(state, indent=2), encoding="utf-8")
+        self.stats["quarantined"] += 1
+        if state["next_attempt"] is None:
+            logger.error(f"🚫 {target.name} quarantined after {state['attempts']} attempt(s): {error}")
+        else:
+            wait = state["next_attempt"] - time.time()
+            logger.warning(f"⏳ {target.name} failed (attempt {state['attempts']}/{self.max_retries}); retrying in {wait:.0f}s: {error}")
+
+    def requeue_due(self) -> int:
+        """Move quarantined files whose retry time has come back to the inbox."""
+        now, requeued = time.time(), 0
+        for sidecar in self.quarantine.glob(f"*{_SIDECAR_SUFFIX}"):
+            name = sidecar.name[: -len(_SIDECAR_SUFFIX)]
+            state = self._read_sidecar(name)
+            due = state.get("next_attempt")
+            path = self.quarantine / name
+            if due is None or due > now or not path.exists():
+                continue
+            target = self._free_name(self.inbox, name)
+            state["requeued_as"] = target.name
+            self._sidecar(name).write_text(json.dumps(state, indent=2), encoding="utf-8")
+            os.replace(path, target)
+            requeued += 1
+        self.stats["retried"] += requeued
+        return requeued
+
+    def _next_retry_in(self) -> Optional[float]:
+        due = [self._read_sidecar(s.name[: -len(_SIDECAR_SUFFIX)]).get("next_attempt") for s in self.quarantine.glob(f"*{_SIDECAR_SUFFIX}")]
+        due = [d for d in due if d is not None]
+        return max(0.0, min(due) - time.time()) if due else None
+
+    # ------------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------------
+    def run_once(self) -> List[Dict[str, Any]]:
+        """One cycle: requeue due retries, claim settled files, process them."""
+        self.requeue_due()
+        claimed = self.claim()
+        if not claimed:
+            return []
+        logger.info(f"📬 Claimed {len(claimed)} file(s) from {self.inbox}")
+        try:
+            results = self.process(claimed)
+        except Exception as e:
+            logger.exception(f"❌ Batch of {len(claimed)} spooled file(s) failed: {e}")
+            results = [{"file": str(p), "status": "failed", "error": str(e)} for p in claimed]
+
+        by_file = {r.get("file"): r for r in results}
+        for path in claimed:
+            result = by_file.get(str(path)) or {"status": "failed", "error": "no result returned"}
+            if result["status"] == "skipped":
+                # Another worker holds the job lease: not a failed attempt, try again later
+                self.stats["skipped"] += 1
+                if path.exists():
+                    os.replace(path, self._free_name(self.inbox, path.name))
+                logger.info(f"⏭️ {path.name} is being processed elsewhere ({result.get('error')}); returned to the inbox.")
+                continue
+            if result["status"] not in ("success", "duplicate"):
+                self.stats["failed"] += 1
+                if path.exists():
+                    self._quarantine(path, result.get("error") or "unknown error")
+                continue
+            self.stats["processed"] += 1
+            path.unlink(missing_ok=True)
+            key, _ = self._retry_state(path.name)
+            if key is not None:
+                self._sidecar(key).unlink(missing_ok=True)
+        return results
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self, max_cycles: int = None):
+        """Watch the inbox until stop() (or `max_cycles` cycles, for tests)."""
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(_WakeHandler(self._wake), str(self.inbox), recursive=False)
+            observer.start()
+        logger.info(
+            f"👀 Watching {self.inbox} ({'filesystem events' if observer else f'polling every {self.poll_interval}s'}); "
+            f"spool {self.processing.parent}"
+        )
+        self.recover()
+        cycles = 0
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                self.run_once()
+                cycles += 1
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
+                timeout = self.poll_interval
+                if self._unsettled:
+                    timeout = min(timeout, max(self.settle_seconds, 0.05))
+                retry_in = self._next_retry_in()
+                if retry_in is not None:
+                    timeout = min(timeout, retry_in)
+                self._wake.wait(timeout)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            logger.info(
+                f"🛑 Watcher stopped: {self.stats['processed']} processed, {self.stats['failed']} failed, "
+                f"{self.stats['retried']} retried"
+            )
@@ -1,63 +1,609 @@
 import argparse
-import json
 import os
+from collections import deque
+from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from src.config import DATA_DIR
+from src.config import BATCH_WORKERS, DATA_DIR, GENAI_BATCH_POLL_SECONDS, GENAI_CONCURRENCY, OCR_PAGE_WORKERS
 from src.ingestion.ingest import ingest_document
-from src.extraction.parser import extract_text
-from src.processing.genai import process_with_genai
+from src.ingestion.watch import SpoolWatcher
+from src.extraction.parser import available_cores, extract_text, supported_extensions
+from src.processing.batch import BatchRun, get_batch_backend
+from src.processing.genai import AsyncGenAIRunner, get_genai_cache, process_with_genai, set_genai_cache_enabled
+from src.processing.providers import OpenAIProvider, get_provider
+from src.processing.router import get_router, route_claim
+from src.processing.rules import extract_fields
+from src.storage.dedup import file_sha256, get_dedup_index, simhash
+from src.storage.jobs import get_job_queue
 from src.validation.validator import validate_and_review
-from src.storage.output import store_output
+from src.storage.output import SummaryWriter, store_output, write_summary
 from src.utils.logging import logger
 
-# Supported input file extensions
-SUPPORTED_EXTS = [".pdf", ".png", ".jpg", ".jpeg", ".txt"]
+# Supported input file extensions (those with a registered extraction handler)
+SUPPORTED_EXTS = supported_extensions()
 
 
-def process_single_file(input_path: Path):
+def _ingest_and_extract(input_path: Path, ocr_workers: int = None, consume: bool = False):
     """
-    Process a single claim document end-to-end:
-    ingestion → extraction → GenAI → validation → storage
+    Run the CPU-bound stages for one document: ingestion → extraction.
+    Kept at module level so it can be shipped to a process pool worker.
+
+    With the dedup index on, a document already processed byte-for-byte is not
+    ingested at all (returns (None, {"duplicate": ...})), and one whose text is
+    a near duplicate of an earlier claim comes back with extracted["duplicate"].
+    `consume`: the input is deleted once processed (spool mode; see ingest_document).
     """
-    try:
-        logger.info(f"🚀 Starting processing for: {input_path}")
+    index = get_dedup_index()
+    fingerprint = None
+    if index is not None and input_path.exists():
+        fingerprint = {"sha256": file_sha256(input_path), "size": input_path.stat().st_size}
+        duplicate = index.find_exact(fingerprint["sha256"])
+        if duplicate:
+            return None, {"duplicate": {**duplicate, "size": fingerprint["size"], "stage": "ingest"}}
+
+    # Step 1: Ingest
+    raw_path = ingest_document(input_path, sha256=fingerprint["sha256"] if fingerprint else None, consume=consume)
+
+    # Step 2: Extract text
+    extracted = extract_text(input_path, ocr_workers=ocr_workers)
+
+    if fingerprint is not None:
+        text = extracted.get("unstructured") or extracted.get("text", "")
+        template_fields = (extracted.get("template") or {}).get("normalized") or {}
+        fingerprint["claim_key"] = template_fields.get("claim_id") or extract_fields(text)["fields"].get("claim_id")
+        fingerprint["simhash"] = simhash(text)
+        extracted["fingerprint"] = fingerprint
+        duplicate = index.find_near(fingerprint["simhash"], fingerprint["claim_key"], exclude=fingerprint["sha256"])
+        if duplicate:
+            extracted["duplicate"] = {**duplicate, "stage": "extraction"}
+
+    return raw_path, extracted
+
+
+def _extraction_summary(extracted: dict) -> dict:
+    """Document- and page-level extraction confidence carried into validation."""
+    summary = {
+        "confidence": extracted.get("confidence"),
+        "template": (extracted.get("template") or {}).get("name"),
+        "pages": [
+            {"page": p["page"], "source": p.get("source"), "confidence": p.get("confidence")}
+            for p in extracted.get("pages", [])
+        ],
+    }
+    if extracted.get("fingerprint"):
+        summary["fingerprint"] = extracted["fingerprint"]
+    return summary
+
+
+# ----------------------------------------------------------------------
+# Job checkpoints (no-ops when the job queue is off)
+# ----------------------------------------------------------------------
+def _claim_job(input_path: Path):
+    """
+    Lease the claim's job. Returns (job, None), or (None, result) when there is
+    nothing to do: already processed, or in progress on another worker.
+    """
+    queue = get_job_queue()
+    if queue is None or not input_path.exists():
+        return None, None
+    claimed = queue.claim(input_path)
+    if not isinstance(claimed, dict):
+        return claimed, None
+    if claimed["status"] == "skipped":
+        logger.warning(f"⏭️ Skipping {input_path.name}: {claimed['error']}")
+    else:
+        logger.info(f"⏭️ {input_path.name} already processed: {claimed.get('output')}")
+    return None, claimed
 
-        # Step 1: Ingest
-        raw_path = ingest_document(input_path)
 
-        # Step 2: Extract text
-        extracted = extract_text(input_path)
+def _job_done(job, result: dict) -> dict:
+    """Record the claim's final result on its job (if any) and return it."""
+    if job is not None:
+        job.finish(result)
+    return result
 
-        # Step 3: Process with Generative AI (summarization/normalization)
-        processed = process_with_genai(extracted)
 
+def _restore_extraction(job):
+    """(raw_path, extracted) from the job's extract checkpoint, or None."""
+    saved = job.load("extract") if job is not None else None
+    if saved is None:
+        return None
+    return (Path(saved["raw_path"]) if saved["raw_path"] else None), saved["extracted"]
+
+
+def _checkpoint_extraction(job, raw_path, extracted: dict):
+    if job is not None:
+        job.save("extract", {"raw_path": str(raw_path) if raw_path else None, "extracted": extracted})
+
+
+def _duplicate_result(input_path: Path, duplicate: dict, job=None) -> dict:
+    """Link a known document to its earlier output instead of processing it again."""
+    index = get_dedup_index()
+    if index is not None:
+        index.note_duplicate(duplicate)
+    kind = "exact" if duplicate["match"] == "exact" else f"near ({duplicate['distance']} bits)"
+    logger.info(f"♻️ {input_path.name} is an {kind} duplicate of {duplicate['source']} — linked to {duplicate['output']}")
+    return _job_done(job, {
+        "file": str(input_path),
+        "status": "duplicate",
+        "output": duplicate["output"],
+        "duplicate_of": duplicate["source"],
+        "match": duplicate["match"],
+    })
+
+
+def _finish_processing(input_path: Path, raw_path: Path, processed: dict, extraction: dict = None, job=None):
+    """
+    Run the remaining stages for one document: validation → storage.
+
+    A claim whose GenAI step failed is still validated and stored (so it reaches
+    review), but it is reported "failed", neither checkpointed past extraction
+    nor added to the dedup index: its job stays open and the next run retries GenAI.
+    A job interrupted after storage finishes with the output already written.
+    """
+    genai_error = processed.get("error")
+    if job is not None and job.stage in (None, "extract") and not genai_error:
+        job.save("normalize", {"processed": processed, "route": (extraction or {}).get("route")})
+    stored = job.load("store") if job is not None and job.stage == "store" else None
+
+    fingerprint = (extraction or {}).get("fingerprint")
+    index = get_dedup_index() if fingerprint else None
+    if index is not None and stored is None:
+        # Copies within one run are only caught here, once the first copy is stored
+        duplicate = index.find_exact(fingerprint["sha256"])
+        if duplicate:
+            return _duplicate_result(input_path, {**duplicate, "stage": "storage"}, job)
+
+    if extraction is not None:
+        processed = {**processed, "extraction": extraction}
+
+    if stored is not None:
+        output_path = stored["output"]
+        logger.info(f"⏯️ {input_path.name} was already stored as {output_path}; finishing its job.")
+    else:
         # Step 4: Validate extracted/processed data
-        validated = validate_and_review(processed)
+        validated = job.load("validate") if job is not None and job.stage == "validate" else None
+        if validated is None:
+            validated = validate_and_review(processed)
+            if job is not None and validated.get("validation_errors"):
+                # Commit the buffered HITL record before the job can count as past validation
+                from src.storage.hitl import flush_hitl_records
+
+                flush_hitl_records()
+            if job is not None and not genai_error:
+                job.save("validate", validated)
 
-        # Step 5: Store output JSON
+        # Step 5: Store output JSON (checkpointed, so a crash before the job finishes does not store it twice)
         output_path = store_output(validated, raw_path)
+        if job is not None and not genai_error:
+            job.save("store", {"output": str(output_path)})
+    if index is not None and not genai_error:
+        index.record(fingerprint, str(input_path), str(raw_path), str(output_path))
+
+    if genai_error:
+        # Stored for review, but reported failed: the job, the summary and the
+        # watch spool (quarantine → retry) all treat it as not done
+        logger.warning(f"⚠️ {input_path.name} stored without GenAI output ({genai_error}); will be retried. Output: {output_path}")
+        return _job_done(job, {"file": str(input_path), "status": "failed", "error": f"GenAI: {genai_error}", "output": str(output_path)})
+
+    logger.info(f"✅ Processing complete for {input_path.name}. Output: {output_path}")
+    return _job_done(job, {"file": str(input_path), "status": "success", "output": str(output_path)})
 
-        logger.info(f"✅ Processing complete for {input_path.name}. Output: {output_path}")
-        return {"file": str(input_path), "status": "success", "output": str(output_path)}
+
+def _process_claimed(input_path: Path, job, ocr_workers: int = None, consume: bool = False):
+    try:
+        logger.info(f"🚀 Starting processing for: {input_path}")
+        restored = _restore_extraction(job)
+        if restored is None:
+            raw_path, extracted = _ingest_and_extract(input_path, ocr_workers, consume)
+            _checkpoint_extraction(job, raw_path, extracted)
+        else:
+            raw_path, extracted = restored
+        if extracted.get("duplicate"):
+            return _duplicate_result(input_path, extracted["duplicate"], job)
+
+        # Step 3: Route — normalize locally, or process with Generative AI
+        extraction = _extraction_summary(extracted)
+        processed = _normalize(extracted, extraction, job=job).result()
+
+        return _finish_processing(input_path, raw_path, processed, extraction, job)
 
     except Exception as e:
         logger.exception(f"❌ Error processing {input_path}: {e}")
-        return {"file": str(input_path), "status": "failed", "error": str(e)}
+        return _job_done(job, {"file": str(input_path), "status": "failed", "error": str(e)})
+
+
+def process_single_file(input_path: Path, ocr_workers: int = None):
+    """
+    Process a single claim document end-to-end:
+    ingestion → extraction → GenAI → validation → storage
+    (resuming after the last checkpointed stage of an interrupted run)
+    """
+    job, known = _claim_job(input_path)
+    if known is not None:
+        return known
+    return _process_claimed(input_path, job, ocr_workers)
+
+
+def _run_inline(fn, *args) -> Future:
+    """Run `fn` immediately and wrap its outcome in a completed Future."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _normalize(extracted: dict, extraction: dict, runner=None, job=None) -> Future:
+    """
+    Route one extracted claim: locally normalized claims (form template or schema
+    rules) resolve immediately; the rest go to GenAI, on `runner` when given.
+    The chosen route is recorded in `extraction`. A checkpointed result of an
+    earlier attempt is reused as is.
+    """
+    saved = job.load("normalize") if job is not None else None
+    if saved is not None:
+        extraction["route"] = saved["route"]
+        future = Future()
+        future.set_result(saved["processed"])
+        return future
+    decision = route_claim(extracted)
+    extraction["route"] = decision["route"]
+    if decision["result"] is not None:
+        future = Future()
+        future.set_result(decision["result"])
+        return future
+    if runner:
+        return runner.submit(extracted)
+    return _run_inline(process_with_genai, extracted)
+
+
+def process_batch(
+    claim_files, workers: int, genai_concurrency: int = 1, ocr_workers: int = None, on_result=None, consume: bool = False
+):
+    """
+    Process a batch of claim documents as a pipeline:
+
+    - ingestion + extraction fan out across a process pool (`workers`)
+    - claims the router can normalize locally skip GenAI; the rest overlap on
+      an async runner (`genai_concurrency` in flight)
+    - validation and storage run in the parent, one file at a time, in input
+      order, so results line up with `claim_files`
+
+    Each stage keeps a bounded number of items in flight so finished-but-unconsumed
+    results do not pile up in memory while a slower stage catches up.
+
+    Per-document page OCR (`ocr_workers`) is scaled down so that
+    workers × ocr_workers does not exceed the available cores.
+
+    With the job queue on, claims finished by an earlier run are not processed
+    again and interrupted ones resume after their last checkpointed stage.
+    `on_result(result)` is called as each claim finishes. `consume` says the
+    inputs are deleted afterwards (the watcher's spool).
+    """
+    from src.storage.hitl import flush_hitl_records
+
+    try:
+        return _run_batch(claim_files, workers, genai_concurrency, ocr_workers, on_result, consume)
+    finally:
+        # Review records buffered for group commit are written even if the batch dies
+        flush_hitl_records()
+
+
+def _run_batch(claim_files, workers: int, genai_concurrency: int, ocr_workers: int, on_result, consume: bool):
+    results = [None] * len(claim_files)
+    jobs = []
+
+    def emit(i, result):
+        results[i] = result
+        if on_result is not None:
+            on_result(result)
+
+    for i, f in enumerate(claim_files):
+        job, known = _claim_job(f)
+        jobs.append(job)
+        if known is not None:
+            emit(i, known)
+    todo = [i for i, r in enumerate(results) if r is None]
+
+    workers = max(1, min(workers, os.cpu_count() or 1, len(todo)))
+    genai_concurrency = max(1, genai_concurrency)
+    ocr_workers = max(1, min(ocr_workers or OCR_PAGE_WORKERS, available_cores() // workers))
+    if workers == 1 and genai_concurrency == 1:
+        for i in todo:
+            emit(i, _process_claimed(claim_files[i], jobs[i], ocr_workers, consume))
+        return results
+
+    logger.info(f"⚙️ Running batch with {workers} extraction workers and {genai_concurrency} concurrent GenAI calls.")
+    extracting = deque()
+    generating = deque()
+    pending = iter(todo)
+
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers)) if workers > 1 else None
+        runner = stack.enter_context(AsyncGenAIRunner(genai_concurrency)) if genai_concurrency > 1 else None
+
+        def submit_extraction(i):
+            f, restored = claim_files[i], _restore_extraction(jobs[i])
+            if restored is not None:
+                future = Future()
+                future.set_result(restored)
+            elif pool:
+                future = pool.submit(_ingest_and_extract, f, ocr_workers, consume)
+            else:
+                future = _run_inline(_ingest_and_extract, f, ocr_workers, consume)
+            extracting.append((i, future, restored is None))
+
+        for i in pending:
+            submit_extraction(i)
+            if len(extracting) >= 2 * workers:
+                break
+
+        while extracting or generating:
+            # Move extracted documents (in order) into the GenAI stage while it has room
+            while extracting and len(generating) < genai_concurrency:
+                i, future, fresh = extracting.popleft()
+                f, job = claim_files[i], jobs[i]
+                next_index = next(pending, None)
+                if next_index is not None:
+                    submit_extraction(next_index)
+
+                logger.info(f"🚀 Starting processing for: {f}")
+                try:
+                    raw_path, extracted = future.result()
+                    if fresh:
+                        _checkpoint_extraction(job, raw_path, extracted)
+                except Exception as e:
+                    failed = Future()
+                    failed.set_exception(e)
+                    generating.append((i, None, None, failed, None))
+                    continue
+                if extracted.get("duplicate"):
+                    generating.append((i, raw_path, None, None, extracted["duplicate"]))
+                    continue
+                extraction = _extraction_summary(extracted)
+                generating.append((i, raw_path, extraction, _normalize(extracted, extraction, runner, job), None))
+
+            i, raw_path, extraction, genai_future, duplicate = generating.popleft()
+            f, job = claim_files[i], jobs[i]
+            try:
+                if duplicate:
+                    emit(i, _duplicate_result(f, duplicate, job))
+                    continue
+                emit(i, _finish_processing(f, raw_path, genai_future.result(), extraction, job))
+            except Exception as e:
+                logger.exception(f"❌ Error processing {f}: {e}")
+                emit(i, _job_done(job, {"file": str(f), "status": "failed", "error": str(e)}))
+
+    return results
+
+
+def _iter_extractions(claim_files, workers: int, ocr_workers: int = None):
+    """Yield (file, future of (raw_path, extracted)) in input order, extracting up to 2 × workers ahead."""
+    workers = max(1, min(workers, os.cpu_count() or 1, len(claim_files)))
+    ocr_workers = max(1, min(ocr_workers or OCR_PAGE_WORKERS, available_cores() // workers))
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers)) if workers > 1 else None
+        pending = deque()
+        for f in claim_files:
+            if pool:
+                pending.append((f, pool.submit(_ingest_and_extract, f, ocr_workers)))
+            else:
+                pending.append((f, _run_inline(_ingest_and_extract, f, ocr_workers)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+
+def submit_batch_run(claim_files, backend, workers: int = 1, ocr_workers: int = None):
+    """
+    Offline mode: extract and route every claim, finish the locally normalized
+    ones (and GenAI cache hits) right away, and submit the rest as one batch
+    job instead of live calls. Claims too long for a single request take the
+    live path. Returns (run, results so far); resume_batch_run() completes the rest.
+    """
+    run = BatchRun.create()
+    results = []
+    for index, (f, future) in enumerate(_iter_extractions(claim_files, workers, ocr_workers)):
+        try:
+            raw_path, extracted = future.result()
+            if extracted.get("duplicate"):
+                results.append(_duplicate_result(f, extracted["duplicate"]))
+                continue
+            extraction = _extraction_summary(extracted)
+            decision = route_claim(extracted)
+            extraction["route"] = decision["route"]
+            processed = decision["result"]
+            if processed is None:
+                custom_id = f"claim-{index:06d}"
+                context = {"file": str(f), "raw_path": str(raw_path), "extraction": extraction}
+                processed = run.add_claim(custom_id, extracted, context)
+                if processed is not None and processed.get("live"):
+                    processed = process_with_genai(extracted)
+            if processed is not None:
+                results.append(_finish_processing(f, raw_path, processed, extraction))
+        except Exception as e:
+            logger.exception(f"❌ Error processing {f}: {e}")
+            results.append({"file": str(f), "status": "failed", "error": str(e)})
+
+    run.submit(backend)
+    logger.info(f"📦 Batch run saved to {run.dir}; resume with --batch-resume {run.dir}")
+    return run, results
+
+
+def resume_batch_run(run_dir, backend=None, wait: bool = False, poll_interval: float = None):
+    """
+    Collect a submitted batch: check (or wait for) completion, then validate and
+    store every claim in it. Returns [] while the batch is still running. A batch
+    that ended failed, expired or cancelled is collected too: its claims are
+    stored for review and reported failed, and the manifest records the state.
+    """
+    run = BatchRun(Path(run_dir))
+    if not run.manifest.get("batch_id"):
+        logger.warning(f"⚠️ No submitted batch in {run.dir}")
+        return []
+    if run.manifest.get("finished_at"):
+        logger.warning(f"⚠️ Batch {run.manifest['batch_id']} was already collected at {run.manifest['finished_at']}")
+        return []
+    backend = backend or get_batch_backend(run.manifest.get("backend"))
+
+    if wait:
+        status = run.wait(backend, poll_interval or GENAI_BATCH_POLL_SECONDS)
+    else:
+        status = backend.status(run.manifest["batch_id"])
+    if status in ("failed", "expired", "cancelled"):
+        logger.error(
+            f"❌ Batch {run.manifest['batch_id']} ended {status}; its {len(run.manifest['claims'])} claim(s) "
+            "are reported failed (process them again to retry)."
+        )
+        entries = run.failed_results(status)
+    elif status != "completed":
+        logger.info(f"⏳ Batch {run.manifest['batch_id']} is {status}; nothing collected yet.")
+        return []
+    else:
+        entries = run.results(backend)
+
+    results = []
+    for custom_id, context, processed in entries:
+        f = Path(context["file"])
+        try:
+            results.append(_finish_processing(f, Path(context["raw_path"]), processed, context["extraction"]))
+        except Exception as e:
+            logger.exception(f"❌ Error processing {f}: {e}")
+            results.append({"file": str(f), "status": "failed", "error": str(e)})
+
+    run.manifest["status"] = status
+    run.manifest["finished_at"] = datetime.now().isoformat()
+    run.save()
+    return results
+
+
+def _warm_up():
+    """Load the models and open the clients/databases once, before the first claim arrives."""
+    from src.processing.nlp import get_nlp
+    from src.storage.hitl import get_hitl_store
+
+    get_router()
+    get_genai_cache()
+    get_dedup_index()
+    get_hitl_store()
+    provider = get_provider()
+    if provider.available and isinstance(provider, OpenAIProvider):
+        provider.client  # builds the HTTP client and its connection pool now
+    try:
+        get_nlp()
+    except RuntimeError as e:
+        logger.warning(f"⚠️ spaCy model not preloaded: {e}")
+
+
+def watch_inbox(inbox: Path, workers: int = 1, genai_concurrency: int = 1, ocr_workers: int = None, max_cycles: int = None):
+    """
+    Service mode: process documents as they land in `inbox` until interrupted.
+    Models and clients are loaded once and reused for every batch.
+    """
+    from src.storage.hitl import flush_hitl_records
+
+    _warm_up()
+
+    def process(files):
+        # Spooled files are deleted once stored, so they may be hard-linked into the raw store
+        results = process_batch(files, workers, genai_concurrency, ocr_workers, consume=True)
+        flush_hitl_records()
+        for r in results:
+            status_icon = {"success": "✅", "duplicate": "♻️"}.get(r["status"], "❌")
+            logger.info(f"{status_icon} {Path(r['file']).name}: {r.get('output') or r.get('error')}")
+        return results
+
+    watcher = SpoolWatcher(inbox, process, extensions=SUPPORTED_EXTS)
+    try:
+        watcher.run(max_cycles=max_cycles)
+    except KeyboardInterrupt:
+        logger.info("🛑 Interrupted; files still in the spool are picked up again on restart.")
+    return watcher
 
 
 def main():
     parser = argparse.ArgumentParser(description="Intelligent Insurance Claim Processing System")
-    parser.add_argument("--input", required=True, help="Path to a file or folder of claim documents")
+    parser.add_argument("--input", help="Path to a file or folder of claim documents")
+    parser.add_argument(
+        "--watch",
+        metavar="INBOX",
+        help="Service mode: keep running and process documents as they are dropped into INBOX",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BATCH_WORKERS,
+        help="Number of processes used for ingestion/extraction when --input is a folder",
+    )
+    parser.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=OCR_PAGE_WORKERS,
+        help="Number of pages of one scanned PDF OCR'd in parallel (capped at available cores)",
+    )
+    parser.add_argument(
+        "--genai-concurrency",
+        type=int,
+        default=GENAI_CONCURRENCY,
+        help="Number of GenAI requests kept in flight when --input is a folder",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the GenAI response cache (always call the model)",
+    )
+    parser.add_argument(
+        "--batch-submit",
+        action="store_true",
+        help="Offline mode: send claims that need GenAI as one batch job instead of live calls",
+    )
+    parser.add_argument(
+        "--batch-resume",
+        metavar="RUN_DIR",
+        help="Collect the results of a submitted batch run (data/batches/<run>) and finish its claims",
+    )
+    parser.add_argument(
+        "--batch-backend",
+        default=None,
+        help="Batch backend for --batch-submit: openai or local (default: GENAI_BATCH_BACKEND)",
+    )
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="With --batch-submit/--batch-resume, poll until the batch completes",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Forget earlier runs' job checkpoints for these files and process them from scratch",
+    )
     args = parser.parse_args()
 
+    if args.no_cache:
+        set_genai_cache_enabled(False)
+
+    results = []
+    if args.batch_resume:
+        results.extend(resume_batch_run(args.batch_resume, get_batch_backend(args.batch_backend) if args.batch_backend else None, args.wait))
+        _report(results)
+        return
+
+    if args.watch:
+        watch_inbox(Path(args.watch), args.workers, args.genai_concurrency, args.ocr_workers)
+        return
+
+    if not args.input:
+        parser.error("--input is required (unless --watch or --batch-resume is given)")
     input_path = Path(args.input)
 
     if not input_path.exists():
         logger.error(f"❌ Input path not found: {input_path}")
         return
 
-    results = []
-
     # If a folder is provided → batch processing
     if input_path.is_dir():
         logger.info(f"📂 Detected folder input: {input_path}")
@@ -70,31 +616,94 @@ def main():
             return
 
         logger.info(f"🔍 Found {len(claim_files)} claim files to process.")
-        for f in claim_files:
-            results.append(process_single_file(f))
+        _restart_jobs(claim_files, args.restart)
+        if args.batch_submit:
+            run, submitted = submit_batch_run(claim_files, get_batch_backend(args.batch_backend), args.workers, args.ocr_workers)
+            results.extend(submitted)
+            if args.wait:
+                results.extend(resume_batch_run(run.dir, get_batch_backend(args.batch_backend), wait=True))
+        else:
+            # summary.json is kept current while the batch runs
+            summary = SummaryWriter()
+            results.extend(process_batch(claim_files, args.workers, args.genai_concurrency, args.ocr_workers, summary.add))
 
     # If a single file is provided
     else:
-        results.append(process_single_file(input_path))
+        _restart_jobs([input_path], args.restart)
+        results.append(process_single_file(input_path, args.ocr_workers))
+
+    _report(results)
+
+
+def _restart_jobs(claim_files, restart: bool):
+    """--restart: forget the files' jobs and dedup entries so they are processed from scratch."""
+    if not restart:
+        return
+    queue = get_job_queue()
+    if queue is not None:
+        removed = queue.reset(claim_files)
+        logger.info(f"🔄 Forgot {removed} earlier job(s); processing from scratch.")
+    index = get_dedup_index()
+    if index is not None:
+        removed = index.forget(file_sha256(f) for f in claim_files if f.exists())
+        logger.info(f"🔄 Removed {removed} document(s) from the dedup index.")
+
+
+def _report(results):
+    """Print the run summary and write data/processed/summary.json."""
+    from src.storage.hitl import flush_hitl_records
+
+    flush_hitl_records()
 
     # Summary logging
     success = [r for r in results if r["status"] == "success"]
     failed = [r for r in results if r["status"] == "failed"]
+    duplicates = [r for r in results if r["status"] == "duplicate"]
+    skipped = [r for r in results if r["status"] == "skipped"]
 
     print("\n================= 📋 Processing Summary =================")
     print(f"✅ Successful: {len(success)}")
+    print(f"♻️ Duplicates (linked to earlier results): {len(duplicates)}")
     print(f"❌ Failed: {len(failed)}")
+    if skipped:
+        print(f"⏭️ Skipped (in progress on another worker): {len(skipped)}")
     print("---------------------------------------------------------")
     for r in results:
-        status_icon = "✅" if r["status"] == "success" else "❌"
+        status_icon = {"success": "✅", "duplicate": "♻️", "skipped": "⏭️"}.get(r["status"], "❌")
         print(f"{status_icon} {r['file']}")
     print("=========================================================\n")
 
+    routes = get_router().summary()
+    logger.info(
+        f"🧭 Routing: {routes['template']} template, {routes['rules']} rules, {routes['llm']} LLM "
+        f"(LLM call rate {routes['llm_rate']:.0%})"
+    )
+
+    genai_cache = get_genai_cache()
+    if genai_cache is not None:
+        genai_cache.flush()
+        stats = genai_cache.summary()
+        logger.info(f"♻️ GenAI cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+
+    dedup_index = get_dedup_index()
+    if dedup_index is not None:
+        stats = dedup_index.summary()
+        logger.info(
+            f"♻️ Dedup: {stats['exact']} exact + {stats['near']} near duplicates linked; avoided "
+            f"{stats['bytes_skipped'] / 1_048_576:.1f} MiB of ingestion, {stats['ocr_skipped']} extractions, "
+            f"{stats['genai_skipped']} GenAI runs"
+        )
+
+    job_queue = get_job_queue()
+    if job_queue is not None:
+        counts = job_queue.report()
+        logger.info(
+            f"🗃️ Jobs: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed (resumable), "
+            f"{counts.get('running', 0) + counts.get('stalled', 0)} running/stalled"
+        )
+
     # Save summary to JSON
-    summary_path = DATA_DIR / "processed" / "summary.json"
-    os.makedirs(summary_path.parent, exist_ok=True)
-    with open(summary_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
+    summary_path = write_summary(results, DATA_DIR / "processed" / "summary.json")
     logger.info(f"📊 Summary saved to: {summary_path}")
 
     print(f"📊 Summary saved to: {summary_path}")
@@ -0,0 +1,293 @@
+"""
+src/processing/batch.py
+--------------------------------
+Offline (batch) GenAI normalization for backfills and nightly reprocessing.
+
+Instead of one live request per claim, prompts are written to a JSONL batch
+file in the OpenAI Batch API request format and submitted through a pluggable
+backend. A manifest next to it records which claim each request belongs to, so
+the run can be resumed later: results are downloaded, parsed exactly like live
+responses and handed back for validation and storage.
+
+Key features:
+- `BatchBackend` interface: submit(requests.jsonl) → id, status(id), download(id, path)
+- `OpenAIBatchBackend`: Files + Batches API (24h completion window, lower cost,
+  separate rate limits from the live path)
+- `LocalBatchBackend`: file-based stand-in that answers requests with a local
+  responder, by default the deterministic StubProvider (tests, dry runs)
+- Cached answers are used directly; successful answers of a real backend
+  populate the cache (a stand-in's never do)
+"""
+
+import abc
+import json
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.config import GENAI_BATCH_BACKEND, GENAI_BATCH_DIR
+from src.processing.genai import (
+    _build_prompt,
+    _output_schema,
+    _cache_key,
+    _cache_lookup,
+    _get_text,
+    _parse_output,
+    get_genai_cache,
+)
+from src.processing.prompting import plan_prompt
+from src.processing.providers import OpenAIProvider, StubProvider, get_provider, response_format
+from src.utils.logging import logger
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+class BatchBackend(abc.ABC):
+    """Interface for batch providers."""
+
+    name = "base"
+    # Whether answers may be cached as the live provider's (not for stand-ins)
+    cacheable = True
+
+    @abc.abstractmethod
+    def submit(self, requests_path: Path) -> str:
+        """Upload a JSONL request file and start the batch; returns its id."""
+
+    @abc.abstractmethod
+    def status(self, batch_id: str) -> str:
+        """One of "in_progress", "completed", "failed", "expired", "cancelled"."""
+
+    @abc.abstractmethod
+    def download(self, batch_id: str, output_path: Path) -> Path:
+        """Write the batch's JSONL results to `output_path`."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API (https://platform.openai.com/docs/guides/batch)."""
+
+    name = "openai"
+    _FINISHED = {"completed", "failed", "expired", "cancelled"}
+
+    def __init__(self, openai_client=None, completion_window: str = "24h"):
+        if openai_client is None:
+            provider = get_provider()
+            openai_client = (provider if isinstance(provider, OpenAIProvider) else OpenAIProvider()).client
+        self.client = openai_client
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: Path) -> str:
+        with open(requests_path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        return status if status in self._FINISHED else "in_progress"
+
+    def download(self, batch_id: str, output_path: Path) -> Path:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if file_id:
+                lines.append(self.client.files.content(file_id).text.rstrip("\n"))
+        Path(output_path).write_text("\n".join(line for line in lines if line) + "\n", encoding="utf-8")
+        return Path(output_path)
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in: requests are copied into `root` on submit and answered
+    by `responder(prompt) -> str` when results are downloaded (default: a
+    StubProvider without latency or errors, which fills the fields the rules
+    find). A responder exception becomes a per-request error, as in the real API.
+    Its answers are never cached.
+    """
+
+    name = "local"
+    cacheable = False
+
+    def __init__(self, root: Optional[Path] = None, responder: Optional[Callable[[str], str]] = None):
+        self.root = Path(root or GENAI_BATCH_DIR / "local_backend")
+        self.responder = responder or StubProvider(latency_ms=0, error_rate=0).complete
+
+    def submit(self, requests_path: Path) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / f"{batch_id}.jsonl").write_bytes(Path(requests_path).read_bytes())
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed" if (self.root / f"{batch_id}.jsonl").exists() else "failed"
+
+    def download(self, batch_id: str, output_path: Path) -> Path:
+        with open(self.root / f"{batch_id}.jsonl", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as out:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                entry = {"id": f"req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"], "response": None, "error": None}
+                try:
+                    content = self.responder(request["body"]["messages"][-1]["content"])
+                    entry["response"] = {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+                except Exception as e:
+                    entry["error"] = {"code": "local_error", "message": str(e)}
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return Path(output_path)
+
+
+_BACKENDS = {"openai": OpenAIBatchBackend, "local": LocalBatchBackend}
+
+
+def get_batch_backend(name: Optional[str] = None) -> BatchBackend:
+    """Instantiate the configured batch backend (GENAI_BATCH_BACKEND)."""
+    name = (name or GENAI_BATCH_BACKEND).lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown batch backend '{name}' (available: {', '.join(sorted(_BACKENDS))})")
+    return _BACKENDS[name]()
+
+
+# ----------------------------------------------------------------------
+# Building requests / reading results
+# ----------------------------------------------------------------------
+def build_batch_request(extracted: Dict[str, Any], custom_id: str) -> Optional[Dict[str, Any]]:
+    """
+    One JSONL request line for a claim, or None when the claim does not fit a
+    single request (map-reduce needs several dependent calls — use the live path).
+    """
+    plan = plan_prompt(extracted)
+    if len(plan["chunks"]) > 1:
+        return None
+    body = {"model": get_provider().model, "messages": [{"role": "user", "content": _build_prompt(plan["chunks"][0])}]}
+    schema = _output_schema()
+    if schema is not None:
+        body["response_format"] = response_format(schema)
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_batch_result(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Map one batch output line to the same result dict a live call returns."""
+    response = entry.get("response") or {}
+    if entry.get("error") or response.get("status_code", 200) != 200:
+        error = entry.get("error") or response.get("body", {}).get("error") or {}
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        return {"error": message or "batch request failed", "summary": "GenAI step failed."}
+    content = response["body"]["choices"][0]["message"]["content"]
+    return _parse_output(content)
+
+
+# ----------------------------------------------------------------------
+# Batch runs (manifest + requests + results in one directory)
+# ----------------------------------------------------------------------
+class BatchRun:
+    """
+    One offline GenAI run stored under GENAI_BATCH_DIR/<name>/:
+    manifest.json (claims, batch id, state), requests.jsonl, results.jsonl.
+    """
+
+    def __init__(self, directory: Path):
+        self.dir = Path(directory)
+        self.manifest_path = self.dir / "manifest.json"
+        self.requests_path = self.dir / "requests.jsonl"
+        self.results_path = self.dir / "results.jsonl"
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        else:
+            self.manifest = {"created_at": datetime.now().isoformat(), "batch_id": None, "backend": None, "claims": {}}
+
+    @classmethod
+    def create(cls, root: Optional[Path] = None) -> "BatchRun":
+        name = datetime.now().strftime("batch_%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        run = cls(Path(root or GENAI_BATCH_DIR) / name)
+        run.dir.mkdir(parents=True, exist_ok=True)
+        return run
+
+    def save(self):
+        self.manifest_path.write_text(json.dumps(self.manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def add_claim(self, custom_id: str, extracted: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Append the request line for one claim. `context` (file, raw path,
+        extraction summary …) is kept in the manifest for resume.
+        Returns the result right away for cache hits, {"live": True} for claims
+        that need the live path, and None once the claim is queued.
+        """
+        text = _get_text(extracted)
+        cached = _cache_lookup(text, True)
+        if cached is not None:
+            return cached
+        request = build_batch_request(extracted, custom_id)
+        if request is None:
+            return {"live": True}
+        with open(self.requests_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        self.manifest["claims"][custom_id] = {**context, "cache_key": _cache_key(text)}
+        return None
+
+    def submit(self, backend: BatchBackend) -> Optional[str]:
+        self.save()
+        if not self.manifest["claims"]:
+            logger.info("ℹ️ No claims need the batch backend — nothing submitted.")
+            return None
+        batch_id = backend.submit(self.requests_path)
+        self.manifest.update(
+            {
+                "batch_id": batch_id,
+                "backend": backend.name,
+                "cache_results": backend.cacheable,
+                "submitted_at": datetime.now().isoformat(),
+            }
+        )
+        self.save()
+        logger.info(f"📤 Submitted {len(self.manifest['claims'])} claims as batch {batch_id} ({backend.name}).")
+        return batch_id
+
+    def wait(self, backend: BatchBackend, poll_interval: float = 60.0, timeout: Optional[float] = None) -> str:
+        """Poll until the batch finishes (or `timeout` seconds pass); returns the last status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = backend.status(self.manifest["batch_id"])
+            if status != "in_progress" or (deadline is not None and time.monotonic() >= deadline):
+                return status
+            logger.info(f"⏳ Batch {self.manifest['batch_id']} still in progress; checking again in {poll_interval:.0f}s")
+            time.sleep(poll_interval)
+
+    def failed_results(self, status: str) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """(custom_id, context, error result) for every claim of a batch that ended `status` without results."""
+        error = {"error": f"batch {self.manifest['batch_id']} {status}", "summary": "GenAI step failed."}
+        return [(custom_id, context, dict(error)) for custom_id, context in self.manifest["claims"].items()]
+
+    def results(self, backend: Optional[BatchBackend] = None) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """
+        Download (unless results.jsonl is already present) and parse the results.
+        Returns (custom_id, context, result) in manifest order; claims without an
+        answer get an error result. Successful answers of a cacheable backend are
+        written to the cache.
+        """
+        if not self.results_path.exists():
+            backend.download(self.manifest["batch_id"], self.results_path)
+
+        parsed = {}
+        with open(self.results_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    parsed[entry["custom_id"]] = parse_batch_result(entry)
+
+        cache = get_genai_cache() if self.manifest.get("cache_results", True) else None
+        out = []
+        for custom_id, context in self.manifest["claims"].items():
+            result = parsed.get(custom_id) or {"error": "no result in batch output", "summary": "GenAI step failed."}
+            if cache is not None and "error" not in result:
+                cache.put(context["cache_key"], result)
+            out.append((custom_id, context, result))
+        return out
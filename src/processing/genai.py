@@ -4,112 +4,469 @@ src/processing/genai.py
 Handles Generative AI–based summarization and normalization.
 
 Key features:
-- Uses OpenAI API with a shared httpx.Client to avoid proxy issues
+- Calls go through a pluggable provider (src.processing.providers): OpenAI
+  with a lazily built client, or a local stub for offline load tests
 - Skips API calls gracefully if key is missing or quota exceeded
-- Handles both new (responses.create) and old (chat.completions.create) client methods
+- Content-addressed response cache (prompt + model + text) skips repeat calls
+- Structured output: requests are constrained to the claim JSON Schema
+  (configs/schema.json); replies are parsed tolerantly (fences, prose,
+  truncation) and only fields that failed are asked for again
+- Token-aware prompts (src.processing.prompting): duplicate/boilerplate pages
+  are dropped, long claims are summarised map-reduce within a per-claim budget
+- Retryable failures (429s, timeouts, provider errors marked retryable) are
+  retried with jittered exponential backoff, on the sync and async paths alike
+- Async variant (AsyncGenAIRunner) keeps several requests in flight with
+  request/token-per-minute budgets
 - Logs clearly at every stage
 """
 
-import atexit
-import json
-import httpx
-from typing import Dict, Any
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional
 
-from openai import OpenAI
-from src.config import OPENAI_API_KEY, PROMPTS
-from src.processing.nlp import extract_entities
+import openai
+from src.config import (
+    GENAI_BACKOFF_BASE,
+    GENAI_BACKOFF_MAX,
+    GENAI_CACHE_ENABLED,
+    GENAI_CACHE_MAX_ENTRIES,
+    GENAI_CACHE_PATH,
+    GENAI_CACHE_TTL_DAYS,
+    GENAI_CONCURRENCY,
+    GENAI_MAX_RETRIES,
+    GENAI_RPM,
+    GENAI_STRUCTURED_OUTPUT,
+    GENAI_TPM,
+    PROMPTS,
+)
+from src.processing.prompting import count_tokens, map_prompt, plan_prompt, reduce_input
+from src.processing.providers import AsyncSession, get_provider
+from src.processing.structured import claim_json_schema, parse_claim_output, schema_instructions
+from src.storage.cache import ResultCache, make_cache_key
 from src.utils.logging import logger
 
+# Rough completion size reserved against the token-per-minute budget per call
+_COMPLETION_TOKEN_ALLOWANCE = 512
+
+
 # ----------------------------------------------------------------------
-# Setup shared HTTP client for OpenAI to avoid "proxies" argument issues
+# Response cache
 # ----------------------------------------------------------------------
-_httpx_client = httpx.Client()
-atexit.register(lambda: _httpx_client.close())
+_cache_enabled = GENAI_CACHE_ENABLED
+_cache: Optional[ResultCache] = None
+
+
+def get_genai_cache() -> Optional[ResultCache]:
+    """Return the shared GenAI response cache, or None if caching is disabled."""
+    global _cache
+    if not _cache_enabled:
+        return None
+    if _cache is None:
+        _cache = ResultCache(
+            GENAI_CACHE_PATH,
+            ttl_seconds=GENAI_CACHE_TTL_DAYS * 86400,
+            max_entries=GENAI_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+
+def set_genai_cache_enabled(enabled: bool):
+    """Turn the GenAI response cache on/off for this process (e.g. --no-cache)."""
+    global _cache_enabled
+    _cache_enabled = enabled
+
+
+def _cache_key(text_snippet: str) -> str:
+    return make_cache_key(PROMPTS, schema_instructions(), get_provider().cache_id, text_snippet)
+
+
+def _cache_lookup(text_snippet: str, use_cache: bool) -> Optional[Dict[str, Any]]:
+    cache = get_genai_cache() if use_cache else None
+    if cache is None:
+        return None
+    cached = cache.get(_cache_key(text_snippet))
+    if cached is not None:
+        logger.info("♻️ GenAI cache hit — skipping model call.")
+    return cached
+
+
+def _cache_store(text_snippet: str, result: Dict[str, Any], use_cache: bool):
+    # Only successful calls are worth remembering; errors should be retried next run
+    cache = get_genai_cache() if use_cache else None
+    if cache is not None and "error" not in result:
+        cache.put(_cache_key(text_snippet), result)
 
-# Initialize OpenAI client safely
-try:
-    client = OpenAI(api_key=OPENAI_API_KEY, http_client=_httpx_client)
-    logger.info("✅ OpenAI client created with custom httpx client.")
-except Exception as e:
-    logger.warning(f"⚠️ OpenAI client initialization failed ({e}). Using default init.")
-    client = OpenAI(api_key=OPENAI_API_KEY)
 
 # ----------------------------------------------------------------------
-# Main Function
+# Shared helpers (sync + async paths)
 # ----------------------------------------------------------------------
-def process_with_genai(extracted: Dict[str, Any]) -> Dict[str, Any]:
+def _get_text(extracted: Any) -> str:
+    """Return the document text from an extract_text() result."""
+    if isinstance(extracted, dict):
+        return extracted.get("unstructured") or extracted.get("text", "")
+    return str(extracted)
+
+
+def _build_prompt(text_snippet: str) -> str:
+    return PROMPTS + "\n\n" + schema_instructions() + "\n\nExtracted text:\n" + text_snippet
+
+
+def _retry_prompt(text_snippet: str, fields: List[str]) -> str:
+    """Follow-up prompt asking only for the fields the first answer did not deliver."""
+    return (
+        "Extract only the following fields from this insurance claim.\n"
+        + schema_instructions(fields=fields)
+        + "\n\nExtracted text:\n"
+        + text_snippet
+    )
+
+
+def _output_schema(fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """JSON Schema to constrain the reply with, or None when structured output is off."""
+    return claim_json_schema(fields=fields) if GENAI_STRUCTURED_OUTPUT else None
+
+
+def _parse_output(out_text: str) -> Dict[str, Any]:
     """
-    Process extracted text/fields using OpenAI (if key available),
-    summarize or normalize data, and return structured output.
+    Turn raw model output into the normalized/summary result dict. Schema
+    fields land in "normalized" (typed); fields that were cut off or invalid
+    are listed in "failed_fields".
     """
+    parsed = parse_claim_output(out_text)
+    if not parsed["parsed"]:
+        logger.debug("ℹ️ GenAI output is not JSON — returning summary text.")
+        return {"summary": out_text, "raw_output": out_text}
 
-    text_snippet = extracted.get("text", "") if isinstance(extracted, dict) else str(extracted)
+    extra = dict(parsed["extra"])
+    summary = extra.pop("summary", None)
+    confidence = extra.pop("confidence", None)
+    result = {"normalized": {**parsed["fields"], **extra}, "raw_output": out_text}
+    if summary:
+        result["summary"] = summary
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool) and 0 <= confidence <= 1:
+        result["confidence"] = float(confidence)
+    if parsed["failed"]:
+        result["failed_fields"] = parsed["failed"]
+        logger.info(f"🧩 GenAI output parsed; {len(parsed['failed'])} field(s) need a retry: {parsed['failed']}")
+    else:
+        logger.info("🧩 GenAI output successfully parsed as JSON.")
+    return result
 
-    # Skip GenAI processing if API key is missing
-    if not OPENAI_API_KEY:
-        logger.warning("⚠️ No OPENAI_API_KEY found — skipping Generative AI processing.")
+
+def _merge_retry(result: Dict[str, Any], retry_text: str) -> Dict[str, Any]:
+    """Fill the failed fields of `result` from the follow-up answer."""
+    failed = result["failed_fields"]
+    parsed = parse_claim_output(retry_text)
+    if not parsed["parsed"]:
+        return result
+    merged = {**result, "normalized": dict(result["normalized"])}
+    for field in failed:
+        if field in parsed["fields"]:
+            merged["normalized"][field] = parsed["fields"][field]
+    still_failed = [field for field in failed if field in parsed["failed"]]
+    if still_failed:
+        merged["failed_fields"] = still_failed
+    else:
+        merged.pop("failed_fields")
+    return merged
+
+
+def _skipped_no_key(extracted: Dict[str, Any], text_snippet: str) -> Dict[str, Any]:
+    logger.warning("⚠️ No OPENAI_API_KEY found — skipping Generative AI processing.")
+    return {
+        "summary": "GenAI skipped (no API key provided).",
+        "raw_output": text_snippet,
+        "extracted": extracted,
+    }
+
+
+def _is_quota_error(e: Exception) -> bool:
+    err_str = str(e).lower()
+    return "insufficient_quota" in err_str or "quota" in err_str
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    return isinstance(e, openai.RateLimitError) or "429" in str(e)
+
+
+def _handle_error(e: Exception, extracted: Dict[str, Any], text_snippet: str) -> Dict[str, Any]:
+    """Map a failed GenAI call to the result dict expected downstream."""
+    if _is_rate_limited(e) or _is_quota_error(e):
+        logger.error("🚫 OpenAI quota exceeded or rate-limited — skipping GenAI output.")
         return {
-            "summary": "GenAI skipped (no API key provided).",
+            "error": "RateLimitError or insufficient quota",
+            "summary": "OpenAI quota exceeded or rate-limited. Skipping GenAI step.",
             "raw_output": text_snippet,
-            "extracted": extracted,
         }
 
-    prompt = PROMPTS + "\n\nExtracted text:\n" + text_snippet
-    logger.info("🤖 Calling OpenAI for summarization/normalization...")
+    logger.exception(f"GenAI processing error: {e}")
+    return {
+        "error": str(e),
+        "summary": "GenAI step failed.",
+        "extracted": extracted,
+    }
+
+
+# ----------------------------------------------------------------------
+# Main Function
+# ----------------------------------------------------------------------
+def process_with_genai(extracted: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Process extracted text/fields with the configured provider (if available),
+    summarize or normalize data, and return structured output.
+    Identical inputs are answered from the response cache unless `use_cache` is False.
+    Claims longer than one request (see plan_prompt) are summarised chunk by
+    chunk first, and the notes normalized in a final call.
+    """
+
+    text_snippet = _get_text(extracted)
+
+    # Skip GenAI processing if API key is missing
+    if not get_provider().available:
+        return _skipped_no_key(extracted, text_snippet)
+
+    cached = _cache_lookup(text_snippet, use_cache)
+    if cached is not None:
+        return cached
+
+    plan = plan_prompt(extracted)
 
     try:
-        # ---- Prefer new Responses API ----
-        if hasattr(client, "responses") and hasattr(client.responses, "create"):
-            response = client.responses.create(model="gpt-4o-mini", input=prompt)
-            out_text = ""
-
-            if hasattr(response, "output") and response.output:
-                try:
-                    out_text = response.output[0].content[0].text
-                except Exception:
-                    out_text = str(response.output)
-            elif isinstance(response, dict) and "output_text" in response:
-                out_text = response["output_text"]
-            else:
-                out_text = str(response)
-
-        # ---- Fallback: old Chat Completions API ----
-        elif hasattr(client, "chat"):
-            chat_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            out_text = chat_response.choices[0].message.content
-
-        # ---- Final fallback ----
+        chunks = plan["chunks"]
+        if len(chunks) > 1:
+            # ---- Map: condense each chunk; Reduce: normalize the combined notes ----
+            logger.info(f"🤖 Summarizing {len(chunks)} chunks before normalization...")
+            content = reduce_input([_complete(map_prompt(chunk)) for chunk in chunks])
         else:
-            logger.error("❌ No valid response method found on OpenAI client — returning raw text.")
-            out_text = text_snippet
+            content = chunks[0]
 
-        # ---- Try parsing JSON output ----
-        try:
-            parsed_json = json.loads(out_text)
-            logger.info("🧩 OpenAI output successfully parsed as JSON.")
-            return {"normalized": parsed_json, "raw_output": out_text}
+        logger.info("🤖 Calling GenAI for summarization/normalization...")
+        out_text = _complete(_build_prompt(content), _output_schema())
 
-        except json.JSONDecodeError:
-            logger.debug("ℹ️ OpenAI output is not JSON — returning summary text.")
-            return {"summary": out_text, "raw_output": out_text}
+        # ---- Parse JSON output; ask again only for fields that failed ----
+        result = _parse_output(out_text)
+        failed = result.get("failed_fields")
+        if failed:
+            result = _merge_retry(result, _complete(_retry_prompt(content, failed), _output_schema(failed)))
+        _cache_store(text_snippet, result, use_cache)
+        return result
 
     # ---- Handle rate limits, quota errors, etc. ----
     except Exception as e:
-        err_str = str(e)
-        if "429" in err_str or "quota" in err_str.lower():
-            logger.error("🚫 OpenAI quota exceeded or rate-limited — skipping GenAI output.")
-            return {
-                "error": "RateLimitError or insufficient quota",
-                "summary": "OpenAI quota exceeded or rate-limited. Skipping GenAI step.",
-                "raw_output": text_snippet,
-            }
-
-        logger.exception(f"GenAI processing error: {e}")
-        return {
-            "error": str(e),
-            "summary": "GenAI step failed.",
-            "extracted": extracted,
-        }
+        return _handle_error(e, extracted, text_snippet)
+
+
+def _complete(prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    One synchronous model call (reply constrained to `schema` when given); returns
+    the output text. Retryable failures are retried with the same jittered
+    backoff as the async path; raises once retries are exhausted.
+    """
+    provider = get_provider()
+    for attempt in range(GENAI_MAX_RETRIES + 1):
+        try:
+            return provider.complete(prompt, schema)
+        except Exception as e:
+            delay = _next_retry(attempt, e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+# ----------------------------------------------------------------------
+# Async variant: concurrent calls with rate limiting and retry/backoff
+# ----------------------------------------------------------------------
+class _RateLimiter:
+    """
+    Token-bucket limiter enforcing request-per-minute and token-per-minute
+    budgets. Both buckets start full and refill continuously.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = max(1, rpm)
+        self.tpm = max(1, tpm)
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int):
+        """Wait until one request and `tokens` tokens fit in the budgets."""
+        tokens = min(tokens, self.tpm)  # a single oversized call must still go through
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait_requests = (1 - self._requests) * 60.0 / self.rpm
+                wait_tokens = (tokens - self._tokens) * 60.0 / self.tpm
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+
+def _backoff_delay(attempt: int, e: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when provided."""
+    response = getattr(e, "response", None)
+    retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), GENAI_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(GENAI_BACKOFF_MAX, GENAI_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _is_retryable(e: Exception) -> bool:
+    if _is_quota_error(e):
+        return False  # retrying does not restore quota
+    if getattr(e, "retryable", False):
+        return True
+    return isinstance(
+        e,
+        (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError),
+    ) or "429" in str(e)
+
+
+def _next_retry(attempt: int, e: Exception) -> Optional[float]:
+    """Backoff (seconds) before retrying call `attempt` that failed with `e`, or None to give up."""
+    if attempt >= GENAI_MAX_RETRIES or not _is_retryable(e):
+        return None
+    delay = _backoff_delay(attempt, e)
+    logger.warning(f"⏳ GenAI call failed ({e}); retry {attempt + 1}/{GENAI_MAX_RETRIES} in {delay:.1f}s")
+    return delay
+
+
+async def _call_provider_async(session: AsyncSession, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+    return await session.complete(prompt, schema)
+
+
+async def process_with_genai_async(
+    extracted: Dict[str, Any],
+    session: AsyncSession,
+    limiter: _RateLimiter,
+    semaphore: asyncio.Semaphore,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Async counterpart of process_with_genai(). Each call (chunk summaries run
+    concurrently) waits for a concurrency slot and rate budget, then retries
+    retryable failures with jittered backoff.
+    """
+    text_snippet = _get_text(extracted)
+
+    if not get_provider().available:
+        return _skipped_no_key(extracted, text_snippet)
+
+    cached = _cache_lookup(text_snippet, use_cache)
+    if cached is not None:
+        return cached
+
+    plan = plan_prompt(extracted)
+
+    async def complete(prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        return await _complete_async(session, limiter, semaphore, prompt, schema)
+
+    try:
+        chunks = plan["chunks"]
+        if len(chunks) > 1:
+            notes = await asyncio.gather(*(complete(map_prompt(chunk)) for chunk in chunks))
+            content = reduce_input(list(notes))
+        else:
+            content = chunks[0]
+
+        logger.info("🤖 Calling GenAI (async) for summarization/normalization...")
+        result = _parse_output(await complete(_build_prompt(content), _output_schema()))
+        failed = result.get("failed_fields")
+        if failed:
+            result = _merge_retry(result, await complete(_retry_prompt(content, failed), _output_schema(failed)))
+        _cache_store(text_snippet, result, use_cache)
+        return result
+    except Exception as e:
+        return _handle_error(e, extracted, text_snippet)
+
+
+async def _complete_async(
+    session: AsyncSession,
+    limiter: _RateLimiter,
+    semaphore: asyncio.Semaphore,
+    prompt: str,
+    schema: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    One model call: waits for a concurrency slot and rate budget, then retries
+    retryable failures with jittered backoff. Raises once retries are exhausted.
+    """
+    tokens = count_tokens(prompt, session.model) + _COMPLETION_TOKEN_ALLOWANCE
+    async with semaphore:
+        for attempt in range(GENAI_MAX_RETRIES + 1):
+            await limiter.acquire(tokens)
+            try:
+                return await _call_provider_async(session, prompt, schema)
+            except Exception as e:
+                delay = _next_retry(attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+
+class AsyncGenAIRunner:
+    """
+    Runs process_with_genai_async() on a private event loop in a background
+    thread so synchronous callers (e.g. the batch pipeline in src.main) can
+    submit claims and collect results as concurrent.futures.Future objects.
+
+    Usage:
+        with AsyncGenAIRunner(max_concurrency=8) as runner:
+            futures = [runner.submit(e) for e in extracted_docs]
+            results = [f.result() for f in futures]
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency or GENAI_CONCURRENCY)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="genai-async", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(rpm or GENAI_RPM, tpm or GENAI_TPM), self._loop).result()
+
+    async def _setup(self, rpm: int, tpm: int):
+        # Loop-bound objects must be created on the runner's own loop
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._limiter = _RateLimiter(rpm, tpm)
+        self._session = get_provider().async_session(self.max_concurrency)
+
+    def submit(self, extracted: Dict[str, Any]) -> Future:
+        """Schedule one claim; returns a Future resolving to the GenAI result dict."""
+        coro = process_with_genai_async(extracted, self._session, self._limiter, self._semaphore)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._session.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_many_with_genai(extracted_docs: List[Dict[str, Any]], max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run GenAI over many claims concurrently; results are returned in input order."""
+    with AsyncGenAIRunner(max_concurrency=max_concurrency) as runner:
+        futures = [runner.submit(e) for e in extracted_docs]
+        return [f.result() for f in futures]
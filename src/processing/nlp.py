@@ -1,37 +1,46 @@
-import spacy
-import subprocess
-import sys
+"""
+src/processing/nlp.py
+--------------------------------
+spaCy named-entity recognition for claim text.
+
+Key features:
+- The model is loaded lazily on first use (importing this module is cheap)
+- Only the `ner` component is loaded; tagger, parser, lemmatizer etc. are excluded
+"""
+
+import threading
+
+from src.config import NLP_MODEL
 from src.utils.logging import logger
 
-def load_spacy_model():
+# Pipeline components we never use; excluding them skips loading their weights
+_UNUSED_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
     """
-    Loads the spaCy 'en_core_web_sm' model.
-    If not found, it automatically installs it via subprocess.
-    Works both in Docker and on local Windows.
+    Return the shared spaCy pipeline, loading it (NER only) on first call.
+    Install the model with:  python -m spacy download en_core_web_sm
     """
-    try:
-        nlp = spacy.load("en_core_web_sm")
-        logger.info("✅ spaCy model 'en_core_web_sm' loaded successfully.")
-        return nlp
-    except OSError:
-        logger.warning("⚠️ spaCy model 'en_core_web_sm' not found. Attempting installation...")
-
-        # Attempt to install the model via subprocess
-        try:
-            subprocess.check_call(
-                [sys.executable, "-m", "spacy", "download", "en_core_web_sm"]
-            )
-            nlp = spacy.load("en_core_web_sm")
-            logger.info("✅ spaCy model 'en_core_web_sm' downloaded and loaded successfully.")
-            return nlp
-        except Exception as e:
-            logger.error(f"❌ Failed to download spaCy model automatically: {e}")
-            raise RuntimeError(
-                "spaCy model 'en_core_web_sm' could not be installed automatically. "
-                "Please run manually:\n  python -m spacy download en_core_web_sm"
-            )
-
-nlp = load_spacy_model()
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy  # deferred: importing spaCy alone takes seconds
+
+                try:
+                    _nlp = spacy.load(NLP_MODEL, exclude=_UNUSED_COMPONENTS)
+                except OSError as e:
+                    logger.error(f"❌ spaCy model '{NLP_MODEL}' not found: {e}")
+                    raise RuntimeError(
+                        f"spaCy model '{NLP_MODEL}' is not installed. "
+                        f"Please run manually:\n  python -m spacy download {NLP_MODEL}"
+                    ) from e
+                logger.info(f"✅ spaCy model '{NLP_MODEL}' loaded (components: {_nlp.pipe_names}).")
+    return _nlp
 
 
 def extract_entities(text: str):
@@ -42,14 +51,13 @@ def extract_entities(text: str):
     Args:
         text (str): Input text string.
     Returns:
-        dict: Entity label -> entity text
+        dict: Entity label -> entity text (one per label)
     """
     if not text or not isinstance(text, str):
         logger.warning("⚠️ No valid text provided for entity extraction.")
         return {}
 
-    doc = nlp(text)
-    entities = {ent.label_: ent.text for ent in doc.ents}
+    entities = {ent.label_: ent.text for ent in get_nlp()(text).ents}
 
     if entities:
         logger.debug(f"🧾 Extracted entities: {entities}")
@@ -0,0 +1,245 @@
+"""
+src/processing/prompting.py
+--------------------------------
+Token-aware prompt planning for the GenAI step.
+
+Long claims (multi-hundred-page medical bundles) are reduced to their useful
+content before anything is sent to the model:
+
+Key features:
+- Local token counting (tiktoken when installed, ~4 characters/token otherwise)
+- Duplicate pages and boilerplate lines repeated across pages (headers,
+  footers, "Page 3 of 212") are dropped; a repeated header/footer line is kept
+  once, and a document is never cleaned down to nothing
+- Content larger than one request is split into chunks on page/paragraph
+  boundaries for map-reduce summarisation
+- A per-claim token budget caps the content sent at all (later pages are
+  dropped first and the plan reports it)
+"""
+
+import hashlib
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+from src.config import GENAI_CLAIM_TOKEN_BUDGET, GENAI_MAX_PROMPT_TOKENS
+from src.utils.logging import logger
+
+try:
+    import tiktoken  # optional: exact counts for OpenAI models
+except ImportError:
+    tiktoken = None
+
+# Map step of map-reduce: condense one chunk into the facts the final prompt needs
+MAP_PROMPT = (
+    "You are reading one section of a longer insurance claim document.\n"
+    "List only the facts relevant to the claim: claim/policy numbers, names, dates, "
+    "amounts, and a short description of the incident or services. Use at most 150 words. "
+    "If the section has nothing relevant, answer with an empty line.\n\nSection:\n"
+)
+
+# A line is boilerplate when it appears on at least this share of pages (min. 3 pages),
+# within the first/last BOILERPLATE_EDGE_LINES lines of a page and is at most
+# BOILERPLATE_MAX_CHARS long (a header or footer, not repeated body text)
+BOILERPLATE_PAGE_SHARE = 0.6
+BOILERPLATE_EDGE_LINES = 3
+BOILERPLATE_MAX_CHARS = 80
+
+# "Page 3 of 212", "- 3 -", "3/212": page numbers differ per page but are still boilerplate
+_PAGE_NUMBER = re.compile(r"^[\s\-–]*(page\s*)?\d+(\s*(of|/)\s*\d+)?[\s\-–]*$", re.IGNORECASE)
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count tokens locally: exact with tiktoken, otherwise ~4 characters per token."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            return len(_encoding(model).encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return len(text) // 4 + 1
+
+
+def _line_key(line: str) -> str:
+    return " ".join(line.split()).lower()
+
+
+def _edge_lines(page: str) -> List[str]:
+    """Short lines in header/footer position: the first and last BOILERPLATE_EDGE_LINES non-empty lines."""
+    lines = [line for line in page.splitlines() if line.strip()]
+    edges = lines[:BOILERPLATE_EDGE_LINES] + lines[-BOILERPLATE_EDGE_LINES:]
+    return [line for line in edges if len(line.strip()) <= BOILERPLATE_MAX_CHARS]
+
+
+def clean_pages(pages: List[str]) -> Dict[str, Any]:
+    """
+    Drop empty and duplicate pages, page-number lines, and header/footer lines
+    repeated verbatim across most pages (letterheads, "Claim ID: ..." banners)
+    after their first occurrence, so the fields they carry still reach the model.
+    Falls back to the raw pages if nothing would be left.
+    Returns {"pages": [str], "duplicate_pages": int, "boilerplate_lines": int}.
+    """
+    pages = [page for page in pages if page and page.strip()]
+    boilerplate = set()
+    if len(pages) >= 3:
+        seen = Counter()
+        for page in pages:
+            seen.update({_line_key(line) for line in _edge_lines(page)})
+        boilerplate = {key for key, n in seen.items() if n >= BOILERPLATE_PAGE_SHARE * len(pages)}
+
+    kept, hashes, emitted = [], set(), set()
+    duplicates = removed_lines = 0
+    for page in pages:
+        edges = {_line_key(line) for line in _edge_lines(page)}
+        lines, body, removed, first = [], [], 0, set()
+        for line in page.splitlines():
+            key = _line_key(line)
+            if line.strip() and _PAGE_NUMBER.match(line):
+                removed += 1
+                continue
+            if key in boilerplate and key in edges:
+                if key in emitted or key in first:
+                    removed += 1
+                    continue
+                first.add(key)  # first occurrence in the document: keep it
+            else:
+                body.append(key)
+            lines.append(line)
+        text = "\n".join(lines).strip()
+        if not text:
+            removed_lines += removed
+            continue
+        # Duplicates are judged on the body, so a rescan differing only in kept headers still matches
+        digest = hashlib.sha1(" ".join(body).encode("utf-8")).hexdigest()
+        if digest in hashes:
+            duplicates += 1
+            continue
+        hashes.add(digest)
+        emitted |= first
+        removed_lines += removed
+        kept.append(text)
+
+    if not kept and pages:
+        logger.warning("⚠️ Prompt cleaning removed everything; sending the document text unchanged.")
+        return {"pages": [page.strip() for page in pages], "duplicate_pages": 0, "boilerplate_lines": 0}
+    return {"pages": kept, "duplicate_pages": duplicates, "boilerplate_lines": removed_lines}
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Split one page that alone exceeds max_tokens: paragraphs, then lines, then characters."""
+    for separator in ("\n\n", "\n"):
+        parts = text.split(separator)
+        if len(parts) > 1:
+            return _pack(parts, max_tokens, separator)
+    step = max(1, max_tokens * 4)
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def _pack(parts: List[str], max_tokens: int, separator: str) -> List[str]:
+    """Greedily pack consecutive parts into chunks of at most max_tokens."""
+    chunks, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = count_tokens(part)
+        if tokens > max_tokens:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(part, max_tokens))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix (cut at ~4 characters/token, then trimmed) within max_tokens."""
+    head = text[: max_tokens * 4]
+    while head and count_tokens(head) > max_tokens:
+        head = head[: int(len(head) * 0.9)]
+    return head
+
+
+def _document_pages(extracted: Any) -> List[str]:
+    if isinstance(extracted, dict):
+        pages = [p.get("text", "") for p in extracted.get("pages") or []]
+        if pages:
+            return pages
+        text = extracted.get("unstructured") or extracted.get("text", "")
+    else:
+        text = str(extracted)
+    return text.split("\f")
+
+
+def plan_prompt(extracted: Any, max_prompt_tokens: int = None, claim_budget: int = None) -> Dict[str, Any]:
+    """
+    Plan the GenAI input for one claim.
+
+    Returns {"chunks": [str], "tokens": int, "original_tokens": int,
+    "duplicate_pages": int, "boilerplate_lines": int, "truncated": bool}.
+    A single chunk is sent as-is; several chunks are summarised first (map)
+    and their notes combined into the final prompt (reduce).
+    """
+    max_prompt_tokens = max_prompt_tokens or GENAI_MAX_PROMPT_TOKENS
+    claim_budget = claim_budget or GENAI_CLAIM_TOKEN_BUDGET
+
+    raw_pages = _document_pages(extracted)
+    original_tokens = sum(count_tokens(page) for page in raw_pages)
+    cleaned = clean_pages(raw_pages)
+
+    # Per-claim budget: keep pages in order until it is spent
+    pages, used, truncated = [], 0, False
+    for page in cleaned["pages"]:
+        tokens = count_tokens(page)
+        if used + tokens > claim_budget:
+            remaining = claim_budget - used
+            if remaining > 0:
+                head = _truncate_to_tokens(page, remaining)
+                if head:
+                    pages.append(head)
+                    used += count_tokens(head)
+            truncated = True
+            break
+        pages.append(page)
+        used += tokens
+
+    chunks = _pack(pages, max_prompt_tokens, "\n") if pages else [""]
+    plan = {
+        "chunks": chunks,
+        "tokens": used,
+        "original_tokens": original_tokens,
+        "duplicate_pages": cleaned["duplicate_pages"],
+        "boilerplate_lines": cleaned["boilerplate_lines"],
+        "truncated": truncated,
+    }
+    if truncated or len(chunks) > 1 or used < original_tokens:
+        logger.info(
+            f"✂️ Prompt plan: {original_tokens} → {used} tokens, {len(chunks)} chunk(s), "
+            f"{cleaned['duplicate_pages']} duplicate page(s), {cleaned['boilerplate_lines']} boilerplate line(s)"
+            + (" — truncated at the per-claim budget" if truncated else "")
+        )
+    return plan
+
+
+def map_prompt(chunk: str) -> str:
+    return MAP_PROMPT + chunk
+
+
+def reduce_input(notes: List[str]) -> str:
+    """Join per-chunk notes into the text handed to the final (reduce) prompt."""
+    return "\n\n".join(f"[Section {i}]\n{note.strip()}" for i, note in enumerate(notes, start=1) if note and note.strip())
@@ -0,0 +1,312 @@
+"""
+src/processing/providers.py
+--------------------------------
+LLM providers behind the GenAI step (src.processing.genai).
+
+A provider turns a prompt into output text, synchronously (`complete`) or on
+an event loop through an async session (`async_session(...).complete`).
+
+Key features:
+- `OpenAIProvider`: client built lazily on first use (not at import), model and
+  timeout from config, Responses-vs-Chat API detected once per client
+- `StubProvider`: local deterministic responder with configurable latency and
+  error injection, for offline load tests and benchmarks (no network, no key)
+- Selected with GENAI_PROVIDER; `set_provider()` swaps it in-process
+  (tests, benchmarks, a self-hosted model behind the same interface)
+"""
+
+import abc
+import asyncio
+import atexit
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from src.config import (
+    GENAI_MODEL,
+    GENAI_PROVIDER,
+    GENAI_STUB_ERROR_RATE,
+    GENAI_STUB_LATENCY_MS,
+    GENAI_TIMEOUT,
+    OPENAI_API_KEY,
+)
+from src.processing.prompting import MAP_PROMPT
+from src.processing.rules import extract_fields
+from src.utils.logging import logger
+
+
+class ProviderError(Exception):
+    """A failed provider call; `retryable` tells the async path whether to back off and retry."""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMProvider(abc.ABC):
+    """Interface for GenAI backends."""
+
+    name = "base"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or GENAI_MODEL
+
+    @property
+    def available(self) -> bool:
+        """False when the provider cannot be called (e.g. no API key); GenAI is then skipped."""
+        return True
+
+    @property
+    def cache_id(self) -> str:
+        """Identifies the provider/model in GenAI cache keys."""
+        return f"{self.name}:{self.model}"
+
+    @abc.abstractmethod
+    def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """One synchronous call, reply constrained to the JSON Schema `schema` when given; returns the output text."""
+
+    @abc.abstractmethod
+    def async_session(self, max_connections: int) -> "AsyncSession":
+        """Create a session bound to the running event loop (see AsyncGenAIRunner)."""
+
+
+class AsyncSession(abc.ABC):
+    """Loop-bound half of a provider: `await complete(prompt)`, then `await aclose()`."""
+
+    model: str = GENAI_MODEL
+
+    @abc.abstractmethod
+    async def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        """Awaitable counterpart of LLMProvider.complete."""
+
+    async def aclose(self):
+        pass
+
+
+# ----------------------------------------------------------------------
+# OpenAI
+# ----------------------------------------------------------------------
+def _detect_api(client: Any) -> Optional[str]:
+    """Which API the installed client exposes: "responses" (new), "chat" (old) or None."""
+    if hasattr(client, "responses") and hasattr(client.responses, "create"):
+        return "responses"
+    if hasattr(client, "chat"):
+        return "chat"
+    return None
+
+
+def response_format(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat Completions `response_format` for strict JSON Schema output."""
+    return {"type": "json_schema", "json_schema": {"name": "claim", "schema": schema, "strict": True}}
+
+
+def _format_kwargs(api: str, schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if schema is None:
+        return {}
+    if api == "responses":
+        return {"text": {"format": {"type": "json_schema", "name": "claim", "schema": schema, "strict": True}}}
+    return {"response_format": response_format(schema)}
+
+
+def _response_text(response: Any) -> str:
+    """Pull the output text out of a Responses API result."""
+    if hasattr(response, "output") and response.output:
+        try:
+            return response.output[0].content[0].text
+        except Exception:
+            return str(response.output)
+    if isinstance(response, dict) and "output_text" in response:
+        return response["output_text"]
+    return str(response)
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI API; the sync client is created on first use and shared by all threads."""
+
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None, timeout: Optional[float] = None, client: Any = None):
+        super().__init__(model)
+        self.api_key = api_key if api_key is not None else OPENAI_API_KEY
+        self.timeout = timeout or GENAI_TIMEOUT
+        self._client = client
+        self._api = _detect_api(client) if client is not None else None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def cache_id(self) -> str:
+        return self.model  # keeps keys of responses cached before providers existed
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # Shared httpx client avoids the SDK's "proxies" argument issues
+                    http_client = httpx.Client(timeout=self.timeout)
+                    atexit.register(http_client.close)
+                    self._client = OpenAI(api_key=self.api_key, http_client=http_client, timeout=self.timeout)
+                    self._api = _detect_api(self._client)
+                    logger.info(f"✅ OpenAI client created ({self.model}, {self._api} API, timeout {self.timeout:.0f}s).")
+        return self._client
+
+    def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        client = self.client
+        if self._api == "responses":
+            return _response_text(client.responses.create(model=self.model, input=prompt, **_format_kwargs("responses", schema)))
+        if self._api == "chat":
+            chat_response = client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                **_format_kwargs("chat", schema),
+            )
+            return chat_response.choices[0].message.content
+        raise ProviderError("No valid response method found on OpenAI client")
+
+    def async_session(self, max_connections: int) -> AsyncSession:
+        return _OpenAIAsyncSession(self, max_connections)
+
+
+class _OpenAIAsyncSession(AsyncSession):
+    def __init__(self, provider: OpenAIProvider, max_connections: int):
+        self.model = provider.model
+        self._http_client = httpx.AsyncClient(
+            timeout=provider.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        # Retries are handled by the caller (with rate-limit awareness), not by the SDK
+        self._client = AsyncOpenAI(
+            api_key=provider.api_key or "missing",
+            http_client=self._http_client,
+            max_retries=0,
+            timeout=provider.timeout,
+        )
+        self._api = _detect_api(self._client)
+
+    async def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        if self._api == "responses":
+            return _response_text(
+                await self._client.responses.create(model=self.model, input=prompt, **_format_kwargs("responses", schema))
+            )
+        chat_response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            **_format_kwargs("chat", schema),
+        )
+        return chat_response.choices[0].message.content
+
+    async def aclose(self):
+        await self._http_client.aclose()
+
+
+# ----------------------------------------------------------------------
+# Local stub
+# ----------------------------------------------------------------------
+class StubProvider(LLMProvider):
+    """
+    Deterministic offline provider. Answers normalization prompts with the
+    schema fields the rule extractor finds in the prompt's text (same prompt →
+    same answer), and map prompts with the start of the section.
+    Each call sleeps `latency_ms` (± `jitter_ms`) and fails with a retryable
+    ProviderError at `error_rate`, so throughput and retry behaviour can be
+    measured without the network.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        jitter_ms: float = 0.0,
+        error_rate: Optional[float] = None,
+        seed: int = 0,
+    ):
+        super().__init__(model)
+        self.latency_ms = GENAI_STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = GENAI_STUB_ERROR_RATE if error_rate is None else error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_call(self):
+        """Count the call and draw its delay (seconds) and whether it fails."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            fail = self._random.random() < self.error_rate
+        return delay, fail
+
+    def _respond(self, prompt: str, fail: bool) -> str:
+        if fail:
+            raise ProviderError("Error code: 429 - stub provider injected error", retryable=True)
+        if prompt.startswith(MAP_PROMPT):
+            return prompt[len(MAP_PROMPT):][:600]
+        text = prompt.split("Extracted text:\n", 1)[-1]
+        fields = extract_fields(text)["fields"]
+        fields["stub_digest"] = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        return json.dumps(fields, sort_keys=True)
+
+    def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        delay, fail = self._next_call()
+        time.sleep(delay)
+        return self._respond(prompt, fail)
+
+    def async_session(self, max_connections: int) -> AsyncSession:
+        return _StubAsyncSession(self)
+
+
+class _StubAsyncSession(AsyncSession):
+    def __init__(self, provider: StubProvider):
+        self.provider = provider
+        self.model = provider.model
+
+    async def complete(self, prompt: str, schema: Optional[Dict[str, Any]] = None) -> str:
+        delay, fail = self.provider._next_call()
+        await asyncio.sleep(delay)
+        return self.provider._respond(prompt, fail)
+
+
+# ----------------------------------------------------------------------
+# Selection
+# ----------------------------------------------------------------------
+_PROVIDERS = {"openai": OpenAIProvider, "stub": StubProvider}
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def make_provider(name: Optional[str] = None, **kwargs) -> LLMProvider:
+    """Instantiate a provider by name (default GENAI_PROVIDER)."""
+    name = (name or GENAI_PROVIDER).lower()
+    if name not in _PROVIDERS:
+        raise ValueError(f"Unknown GenAI provider '{name}' (available: {', '.join(sorted(_PROVIDERS))})")
+    return _PROVIDERS[name](**kwargs)
+
+
+def get_provider() -> LLMProvider:
+    """Return the shared provider for this process (created on first use)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = make_provider()
+                logger.info(f"🔌 GenAI provider: {_provider.name} ({_provider.model})")
+    return _provider
+
+
+def set_provider(provider: Optional[LLMProvider]):
+    """Replace the shared provider (None → rebuild from config on next use)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
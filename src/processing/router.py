@@ -0,0 +1,152 @@
+"""
+src/processing/router.py
+--------------------------------
+Confidence-gated routing between extraction and GenAI.
+
+Each extracted claim takes one of three routes:
+- "template": matched a known form template (src.extraction.templates) whose
+  zones filled enough of its fields, read with enough confidence; the zone
+  fields are already normalized (otherwise the claim is judged as below)
+- "rules":    the compiled schema rules (src.processing.rules) found enough
+  fields, with no conflicts, in text extracted with enough confidence
+- "llm":      everything else (weak OCR, low field coverage, ambiguous values)
+  is sent to process_with_genai()
+
+Thresholds come from the `routing` section of configs/rules.yaml. Per-route
+counters show how many claims still reach the LLM.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+from src.config import RULES
+from src.processing.rules import extract_fields
+from src.utils.logging import logger
+
+ROUTES = ("template", "rules", "llm")
+
+DEFAULT_THRESHOLDS = {
+    "min_extraction_confidence": 0.8,
+    "min_field_coverage": 0.8,
+    "min_rule_confidence": 0.9,
+}
+
+
+def _get_text(extracted: Any) -> str:
+    if isinstance(extracted, dict):
+        return extracted.get("unstructured") or extracted.get("text", "")
+    return str(extracted)
+
+
+class ClaimRouter:
+    """Decides per claim whether GenAI is needed and counts the decisions."""
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.counts = {route: 0 for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def _count(self, route: str):
+        with self._lock:
+            self.counts[route] += 1
+
+    def template_gate(self, template: Dict[str, Any], extraction_confidence: Optional[float]) -> Optional[str]:
+        """
+        Why a template's zone values cannot be used as is (None when they can).
+        The parser applies it right after reading the zones and falls back to full
+        extraction on a rejection, so the rules/LLM routes see the whole document.
+        """
+        normalized = template.get("normalized") or {}
+        expected = template.get("fields") or list(normalized)
+        filled = [f for f in expected if normalized.get(f) not in (None, "")]
+        coverage = len(filled) / len(expected) if expected else 0.0
+        if coverage < self.thresholds["min_field_coverage"]:
+            missing = [f for f in expected if f not in filled]
+            return f"template field coverage {coverage:.0%} (missing {', '.join(missing) or 'all'})"
+        if extraction_confidence is not None and extraction_confidence < self.thresholds["min_extraction_confidence"]:
+            return f"extraction confidence {extraction_confidence:.2f}"
+        return None
+
+    def route(self, extracted: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return {"route": str, "reason": str, "result": dict or None}.
+        "result" is the locally normalized output for the "template" and "rules"
+        routes, and None when the claim must go to the LLM.
+        """
+        text = _get_text(extracted)
+        extraction_confidence = extracted.get("confidence") if isinstance(extracted, dict) else None
+
+        template = extracted.get("template") if isinstance(extracted, dict) else None
+        if template:
+            gate = self.template_gate(template, extraction_confidence)
+            if gate is None:
+                self._count("template")
+                logger.info(f"🧭 Route: template '{template['name']}' — GenAI skipped.")
+                return {
+                    "route": "template",
+                    "reason": f"matched form template '{template['name']}'",
+                    "result": {
+                        "normalized": template.get("normalized", {}),
+                        "summary": f"GenAI skipped (matched form template '{template['name']}').",
+                        "raw_output": text,
+                        "template": template["name"],
+                    },
+                }
+            # e.g. zone reads failed on a poor scan: judge the text like any other claim
+            logger.info(f"🧭 Template '{template['name']}' matched but not used ({gate}).")
+
+        rules = extract_fields(text)
+        reason = None
+        if extraction_confidence is not None and extraction_confidence < self.thresholds["min_extraction_confidence"]:
+            reason = f"extraction confidence {extraction_confidence:.2f}"
+        elif rules["coverage"] < self.thresholds["min_field_coverage"]:
+            reason = f"field coverage {rules['coverage']:.0%} (missing {', '.join(rules['missing'])})"
+        elif rules["conflicts"]:
+            reason = f"conflicting values for {', '.join(sorted(rules['conflicts']))}"
+        elif rules["confidence"] < self.thresholds["min_rule_confidence"]:
+            reason = f"rule confidence {rules['confidence']:.2f}"
+
+        if reason:
+            self._count("llm")
+            logger.info(f"🧭 Route: llm ({reason}).")
+            return {"route": "llm", "reason": reason, "result": None}
+
+        confidence = rules["confidence"]
+        if extraction_confidence is not None:
+            confidence = min(confidence, extraction_confidence)
+        self._count("rules")
+        logger.info(f"🧭 Route: rules ({rules['coverage']:.0%} of schema fields) — GenAI skipped.")
+        return {
+            "route": "rules",
+            "reason": f"field coverage {rules['coverage']:.0%}",
+            "result": {
+                "normalized": rules["fields"],
+                "summary": "GenAI skipped (rule-based extraction filled the claim fields).",
+                "raw_output": text,
+                "confidence": confidence,
+                "rules": {"coverage": rules["coverage"], "missing": rules["missing"]},
+            },
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-route counts plus the share of claims sent to the LLM."""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        return {**counts, "total": total, "llm_rate": counts["llm"] / total if total else 0.0}
+
+
+_router: Optional[ClaimRouter] = None
+
+
+def get_router() -> ClaimRouter:
+    """Return the shared router configured from configs/rules.yaml (built on first use)."""
+    global _router
+    if _router is None:
+        _router = ClaimRouter((RULES or {}).get("routing"))
+    return _router
+
+
+def route_claim(extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """Route one extracted claim (see ClaimRouter.route)."""
+    return get_router().route(extracted)
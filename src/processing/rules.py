@@ -0,0 +1,141 @@
+"""
+src/processing/rules.py
+--------------------------------
+Deterministic, schema-driven field extraction for "Label: value" claim text.
+
+One regex is compiled per schema (configs/schema.json): every field's labels
+become named alternatives of a single pattern, so the text is scanned exactly
+once. Values are type-checked and normalized (dates → ISO, numbers → float).
+
+Key features:
+- Labels derived from field names ("claim_id" → "claim id") plus aliases
+- Longest label wins ("date of loss" before "date")
+- Conflicting values for one field are kept and lower its confidence
+- Coverage/confidence tell the caller whether GenAI is still needed
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from src.config import CLAIM_SCHEMA
+from src.utils.logging import logger
+from src.utils.normalization import normalize_amount, normalize_date
+
+# Extra labels seen on claim forms, per schema field
+FIELD_ALIASES: Dict[str, List[str]] = {
+    "claim_id": ["claim no", "claim number", "claim #", "claim ref", "patient control no", "pat cntl #"],
+    "claim_date": ["date", "incident date", "date of incident", "date of loss", "loss date", "date of service"],
+    "claim_amount": ["amount", "amount of claim", "claim total", "total amount", "total charges", "estimated cost"],
+    "policy_number": ["policy no", "policy #", "policy", "member id", "insured id"],
+    "insured_name": ["insured", "policyholder", "policy holder", "name of insured"],
+    "incident_description": ["description", "description of incident", "description of loss", "details"],
+}
+
+# Confidence of a field whose label appeared with different values
+CONFLICT_CONFIDENCE = 0.5
+
+
+def _label_pattern(label: str) -> str:
+    # "claim id" → claim[\s_]*id (also "Claim_ID", "ClaimID"); tolerate a trailing dot ("Policy No.")
+    words = [re.escape(word) for word in label.split()]
+    return r"[\s_]*".join(words) + r"\.?"
+
+
+def _is_date_field(field: str) -> bool:
+    return "date" in field
+
+
+class RuleExtractor:
+    """Single-pass "Label: value" extractor compiled from a claim schema."""
+
+    def __init__(self, schema: Dict[str, str], aliases: Optional[Dict[str, List[str]]] = None):
+        self.schema = dict(schema)
+        aliases = FIELD_ALIASES if aliases is None else aliases
+
+        # (label, field) pairs, longest label first so alternation prefers it
+        labels = []
+        for field in self.schema:
+            names = {field.replace("_", " ")} | {a.lower() for a in aliases.get(field, [])}
+            labels.extend((name, field) for name in names)
+        labels.sort(key=lambda pair: (-len(pair[0]), pair[0]))
+
+        self._group_fields = {}
+        alternatives = []
+        for i, (label, field) in enumerate(labels):
+            group = f"f{i}"
+            self._group_fields[group] = field
+            alternatives.append(f"(?P<{group}>{_label_pattern(label)})")
+
+        # Only label groups capture, so match.lastgroup names the field; the value
+        # is the rest of the line after the separator
+        self.pattern = re.compile(
+            r"^[ \t]*(?:" + "|".join(alternatives) + r")[ \t]*[:=\-][ \t]*",
+            re.IGNORECASE | re.MULTILINE,
+        )
+
+    def _coerce(self, field: str, raw: str) -> Any:
+        """Type-check a raw value against the schema; None if it does not fit."""
+        if not raw:
+            return None
+        if self.schema.get(field) == "number":
+            return normalize_amount(raw)
+        if _is_date_field(field):
+            return normalize_date(raw) or None
+        return raw
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """
+        Scan `text` once and return:
+        {"fields": {field: value}, "confidence": float, "coverage": float,
+         "missing": [field], "conflicts": {field: [values]}}
+        `confidence` is the lowest per-field confidence (0.0 when nothing matched).
+        """
+        text = text or ""
+        values: Dict[str, List[Any]] = {}
+        for match in self.pattern.finditer(text):
+            field = self._group_fields[match.lastgroup]
+            line_end = text.find("\n", match.end())
+            raw = text[match.end():] if line_end < 0 else text[match.end():line_end]
+            value = self._coerce(field, raw.strip())
+            if value is not None and value not in values.setdefault(field, []):
+                values[field].append(value)
+
+        fields, conflicts, confidences = {}, {}, []
+        for field, found in values.items():
+            if not found:
+                continue
+            fields[field] = found[0]
+            if len(found) > 1:
+                conflicts[field] = found
+                confidences.append(CONFLICT_CONFIDENCE)
+            else:
+                confidences.append(1.0)
+
+        missing = [field for field in self.schema if field not in fields]
+        coverage = len(fields) / len(self.schema) if self.schema else 0.0
+        result = {
+            "fields": fields,
+            "confidence": min(confidences) if confidences else 0.0,
+            "coverage": coverage,
+            "missing": missing,
+            "conflicts": conflicts,
+        }
+        if conflicts:
+            logger.info(f"⚖️ Conflicting values for {sorted(conflicts)} in rule extraction.")
+        return result
+
+
+_extractor: Optional[RuleExtractor] = None
+
+
+def get_rule_extractor() -> RuleExtractor:
+    """Return the shared extractor compiled from CLAIM_SCHEMA (built on first use)."""
+    global _extractor
+    if _extractor is None:
+        _extractor = RuleExtractor(CLAIM_SCHEMA)
+    return _extractor
+
+
+def extract_fields(text: str) -> Dict[str, Any]:
+    """Rule-based extraction of the schema fields from `text` (see RuleExtractor.extract)."""
+    return get_rule_extractor().extract(text)
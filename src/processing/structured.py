@@ -0,0 +1,197 @@
+"""
+src/processing/structured.py
+--------------------------------
+Schema-constrained GenAI output: the JSON Schema sent with each request and a
+tolerant parser for whatever comes back.
+
+Key features:
+- `claim_json_schema()` builds a strict JSON Schema from configs/schema.json
+  (every field required but nullable, plus summary/confidence)
+- `extract_json()` finds the JSON object in one pass over the text: code
+  fences and surrounding prose are skipped, and output cut off mid-object is
+  recovered up to the last complete member
+- `parse_claim_output()` maps alias keys to schema fields and type-checks
+  values; fields lost to truncation or with unusable values are reported as
+  `failed` so only those are asked for again
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import CLAIM_SCHEMA
+from src.processing.rules import FIELD_ALIASES
+from src.utils.normalization import normalize_amount, normalize_date
+
+# Keys the model adds next to the schema fields
+EXTRA_FIELDS = {"summary": "string", "confidence": "number"}
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _json_type(kind: str) -> List[str]:
+    return ["number", "null"] if kind == "number" else ["string", "null"]
+
+
+def claim_json_schema(schema: Optional[Dict[str, str]] = None, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Strict JSON Schema for the claim fields (or the subset `fields`)."""
+    schema = CLAIM_SCHEMA if schema is None else schema
+    wanted = {**schema, **EXTRA_FIELDS} if fields is None else {f: schema.get(f, "string") for f in fields}
+    return {
+        "type": "object",
+        "properties": {field: {"type": _json_type(kind)} for field, kind in wanted.items()},
+        "required": list(wanted),
+        "additionalProperties": False,
+    }
+
+
+def schema_instructions(schema: Optional[Dict[str, str]] = None, fields: Optional[List[str]] = None) -> str:
+    """Field list appended to the prompt, for providers without structured output."""
+    schema = CLAIM_SCHEMA if schema is None else schema
+    kinds = {**schema, **EXTRA_FIELDS} if fields is None else {f: schema.get(f, "string") for f in fields}
+    lines = [f'- "{name}": {kind}' + (" (ISO date)" if "date" in name else "") for name, kind in kinds.items()]
+    return "Return one JSON object with exactly these keys (null when not in the document):\n" + "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# Tolerant JSON extraction
+# ----------------------------------------------------------------------
+def extract_json(text: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Return (object, complete). Scans once from the first "{": a balanced object
+    is parsed as-is; an unterminated one (output cut off) is closed after its
+    last complete member and returned with complete=False. (None, False) when
+    no object can be recovered.
+    """
+    text = text or ""
+    start = text.find("{")
+    if start < 0:
+        return None, False
+
+    stack: List[str] = []
+    in_string = escaped = False
+    safe_end, safe_stack = None, None  # last point where the object could be closed
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                break
+            stack.pop()
+            if not stack:
+                candidate = text[start:i + 1]
+                try:
+                    return json.loads(candidate), True
+                except json.JSONDecodeError:
+                    return _loads_lenient(candidate), True
+            safe_end, safe_stack = i + 1, list(stack)
+        elif ch == ",":
+            safe_end, safe_stack = i, list(stack)
+
+    if safe_end is None:
+        return None, False
+    repaired = text[start:safe_end].rstrip().rstrip(",") + "".join(reversed(safe_stack))
+    return _loads_lenient(repaired), False
+
+
+def _loads_lenient(candidate: str) -> Optional[Dict[str, Any]]:
+    """json.loads, retried without trailing commas before closers."""
+    for attempt in (candidate, _drop_trailing_commas(candidate)):
+        try:
+            value = json.loads(attempt)
+            return value if isinstance(value, dict) else None
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _drop_trailing_commas(candidate: str) -> str:
+    out, in_string, escaped = [], False, False
+    for ch in candidate:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(ch)
+    return "".join(out)
+
+
+# ----------------------------------------------------------------------
+# Schema-aware parsing
+# ----------------------------------------------------------------------
+def _key(name: str) -> str:
+    return "_".join(str(name).lower().replace("#", " ").split())
+
+
+_ALIASES: Dict[str, str] = {}
+for _field, _names in FIELD_ALIASES.items():
+    for _name in _names:
+        _ALIASES.setdefault(_key(_name), _field)
+_ALIASES.update({"incident_date": "claim_date", "damage_description": "incident_description"})
+
+
+def _coerce(kind: str, field: str, value: Any) -> Tuple[Any, bool]:
+    """(value, ok): None stays None; unusable values are (None, False)."""
+    if value is None or value == "":
+        return None, True
+    if kind == "number":
+        amount = value if isinstance(value, (int, float)) and not isinstance(value, bool) else normalize_amount(str(value))
+        return (float(amount), True) if amount is not None else (None, False)
+    if "date" in field:
+        date = normalize_date(str(value))
+        return (date, True) if date else (None, False)
+    if isinstance(value, (dict, list)):
+        return None, False
+    return str(value).strip(), True
+
+
+def parse_claim_output(out_text: str, schema: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Parse model output against the claim schema.
+    Returns {"fields": {field: value}, "extra": {key: value}, "failed": [field],
+    "complete": bool, "parsed": bool}. `fields` holds non-null schema values
+    (aliases mapped, dates ISO, amounts float); `failed` lists schema fields cut
+    off by truncation or holding values of the wrong type.
+    """
+    schema = CLAIM_SCHEMA if schema is None else schema
+    obj, complete = extract_json(out_text)
+    if obj is None:
+        return {"fields": {}, "extra": {}, "failed": [], "complete": False, "parsed": False}
+
+    fields, extra, failed, seen = {}, {}, [], set()
+    for key, value in obj.items():
+        name = _key(key)
+        field = name if name in schema else _ALIASES.get(name)
+        if field not in schema:
+            extra[key] = value
+            continue
+        seen.add(field)
+        coerced, ok = _coerce(schema[field], field, value)
+        if not ok:
+            failed.append(field)
+        elif coerced is not None and field not in fields:
+            fields[field] = coerced
+
+    if not complete:
+        failed.extend(field for field in schema if field not in seen and field not in failed)
+    return {"fields": fields, "extra": extra, "failed": failed, "complete": complete, "parsed": True}
@@ -0,0 +1,214 @@
+"""
+src/storage/cache.py
+--------------------------------
+Persistent, content-addressed result cache backed by SQLite.
+
+Used to skip repeated expensive work (e.g. GenAI calls) for inputs that have
+already been processed. Entries are keyed by a caller-supplied hash and hold
+JSON-serialisable values.
+
+Key features:
+- TTL expiry (entries older than `ttl_seconds` are treated as misses)
+- Size bound with LRU eviction (least recently *read* entries go first),
+  checked against a running entry count rather than COUNT(*) per insert
+- Read times are buffered and written in batches (and before any eviction),
+  so a hit costs one SELECT, not an UPDATE and a commit
+- Hit/miss/eviction counters for reporting
+- One connection per process, so the cache is safe to use after fork()
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.utils.logging import logger
+
+# New entries between exact COUNT(*) resyncs of the running count (other
+# processes may share the file)
+_RECOUNT_EVERY = 1000
+# Buffered read times are written once this many are pending or the oldest is this old
+_TOUCH_BATCH = 256
+_TOUCH_FLUSH_SECONDS = 5.0
+
+
+def make_cache_key(*parts: str) -> str:
+    """Return a SHA-256 hex digest over the given string parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8", errors="replace"))
+        h.update(b"\x00")  # separator so ("ab", "c") != ("a", "bc")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed key → JSON value cache with TTL and LRU size bound."""
+
+    def __init__(self, path: Path, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._count: Optional[int] = None  # running entry count, None until first counted
+        self._added = 0
+        self._touched: Dict[str, float] = {}  # key → last read time not yet written
+        self._touched_since = 0.0
+
+    # ------------------------------------------------------------------
+    # Connection handling
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._count, self._added = None, 0
+            self._touched = {}
+        return self._conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss/expiry."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created_at FROM cache_entries WHERE key=?", (key,)).fetchone()
+                now = time.time()
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM cache_entries WHERE key=?", (key,))
+                    conn.commit()
+                    self._forgot(1)
+                    self.stats["misses"] += 1
+                    self.stats["evictions"] += 1
+                    return None
+                if not self._touched:
+                    self._touched_since = now
+                self._touched[key] = now
+                if len(self._touched) >= _TOUCH_BATCH or now - self._touched_since >= _TOUCH_FLUSH_SECONDS:
+                    self._write_touches(conn)
+                    conn.commit()
+                self.stats["hits"] += 1
+            return json.loads(row[0])
+        except Exception as e:
+            logger.warning(f"⚠️ Cache read failed ({self.path.name}): {e}")
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        """Store `value` under `key`, evicting least recently used entries if over size."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                self._write_touches(conn)  # eviction below must see current read times
+                data = json.dumps(value, ensure_ascii=False)
+                added = conn.execute(
+                    "INSERT OR IGNORE INTO cache_entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, data, now, now),
+                ).rowcount
+                if not added:
+                    conn.execute(
+                        "UPDATE cache_entries SET value=?, created_at=?, accessed_at=? WHERE key=?",
+                        (data, now, now, key),
+                    )
+                elif self.max_entries:
+                    self._evict_excess(conn)
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Cache write failed ({self.path.name}): {e}")
+
+    def _write_touches(self, conn: sqlite3.Connection):
+        """Write buffered read times (the caller commits)."""
+        if self._touched:
+            conn.executemany(
+                "UPDATE cache_entries SET accessed_at=? WHERE key=?",
+                [(at, key) for key, at in self._touched.items()],
+            )
+            self._touched = {}
+
+    def flush(self):
+        """Write buffered read times now (e.g. at the end of a run)."""
+        try:
+            with self._lock:
+                if self._touched:
+                    conn = self._connect()
+                    self._write_touches(conn)
+                    conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Cache flush failed ({self.path.name}): {e}")
+
+    def _evict_excess(self, conn: sqlite3.Connection):
+        """Count one new entry and drop the least recently used ones beyond max_entries."""
+        self._added += 1
+        if self._count is None or self._added >= _RECOUNT_EVERY:
+            self._count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+            self._added = 0
+        else:
+            self._count += 1
+        excess = self._count - self.max_entries
+        if excess > 0:
+            removed = conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self._count -= removed
+            self.stats["evictions"] += removed
+
+    def _forgot(self, removed: int):
+        if self._count is not None:
+            self._count = max(0, self._count - removed)
+
+    def purge_expired(self) -> int:
+        """Delete all entries older than the TTL; returns the number removed."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute("DELETE FROM cache_entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            conn.commit()
+            self.stats["evictions"] += cur.rowcount
+            self._forgot(cur.rowcount)
+            return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache_entries")
+            conn.commit()
+            self._count, self._added = 0, 0
+            self._touched = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def summary(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters for this process."""
+        return dict(self.stats)
@@ -0,0 +1,287 @@
+"""
+src/storage/dedup.py
+--------------------------------
+Claim-level deduplication index (SQLite), consulted during ingestion.
+
+Every processed document is recorded with the SHA-256 of its bytes, a 64-bit
+simhash of its normalized text and the processed_*.json it produced. A later
+copy of the same document is linked to that result instead of being ingested,
+OCR'd, sent to GenAI and stored again.
+
+Key features:
+- Exact duplicates: SHA-256 of the file, checked before ingestion
+- Near duplicates (rescans, re-exports): simhash of the extracted text within
+  DEDUP_NEAR_DISTANCE bits, found through 4 × 16-bit band lookups; only
+  documents with the same claim id are merged (without one, only exact copies)
+- Per-run and all-time reports of the work avoided (files, bytes, OCR and
+  GenAI runs): `python -m src.storage.dedup`
+- One connection per process (safe after fork), WAL mode
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from src.config import DEDUP_ENABLED, DEDUP_INDEX_PATH, DEDUP_NEAR_DISTANCE
+from src.utils.logging import logger
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_WORD = re.compile(r"\w+")
+
+
+# ----------------------------------------------------------------------
+# Fingerprints
+# ----------------------------------------------------------------------
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit simhash over word trigrams of the lower-cased text (None for empty
+    text). Similar documents differ in few bits; OCR noise moves few trigrams.
+    """
+    words = _WORD.findall((text or "").lower())
+    if not words:
+        return None
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    # One row of 64 bits per shingle (bit j of the little-endian integer in column j)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return sum(1 << bit for bit in np.flatnonzero(majority).tolist())
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    """SQLite INTEGER is signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _bands(value: int):
+    mask = (1 << _BAND_BITS) - 1
+    return [(band, value >> (band * _BAND_BITS) & mask) for band in range(_BANDS)]
+
+
+# ----------------------------------------------------------------------
+# Index
+# ----------------------------------------------------------------------
+class DedupIndex:
+    """SQLite index of processed documents: content hash, simhash, result path."""
+
+    def __init__(self, path: Path, near_distance: int = None):
+        self.path = Path(path)
+        self.near_distance = DEDUP_NEAR_DISTANCE if near_distance is None else near_distance
+        self.stats = {"exact": 0, "near": 0, "bytes_skipped": 0, "ocr_skipped": 0, "genai_skipped": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER,
+                    simhash INTEGER,
+                    claim_key TEXT,
+                    source TEXT,
+                    raw_path TEXT,
+                    output_path TEXT,
+                    first_seen REAL NOT NULL,
+                    duplicates INTEGER NOT NULL DEFAULT 0,
+                    bytes_skipped INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS simhash_bands (
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    PRIMARY KEY (band, value, sha256)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    # ------------------------------------------------------------------
+    # Lookups (safe to call from extraction workers)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _match(row, kind: str, distance: int = 0) -> Dict[str, Any]:
+        return {
+            "match": kind,
+            "sha256": row[0],
+            "source": row[1],
+            "output": row[2],
+            "distance": distance,
+        }
+
+    def find_exact(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Previous result for identical bytes, if its output still exists."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT sha256, source, output_path FROM documents WHERE sha256=?", (sha256,)
+            ).fetchone()
+        if row and row[2] and Path(row[2]).exists():
+            return self._match(row, "exact")
+        if row:
+            logger.debug(f"🔁 Output of {row[1]} is gone ({row[2]}); processing its bytes again.")
+        return None
+
+    def find_near(self, value: Optional[int], claim_key: Optional[str] = None, exclude: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Closest previous document within `near_distance` bits with the same claim id.
+        Same-form claims look alike, so without a claim id on both sides only
+        exact copies are linked.
+        """
+        if value is None or self.near_distance <= 0 or not claim_key:
+            return None
+        clauses = " OR ".join("(b.band=? AND b.value=?)" for _ in range(_BANDS))
+        params = [p for pair in _bands(value) for p in pair]
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT d.sha256, d.source, d.output_path, d.simhash, d.claim_key "
+                f"FROM simhash_bands b JOIN documents d ON d.sha256 = b.sha256 WHERE d.claim_key = ? AND ({clauses})",
+                [claim_key] + params,
+            ).fetchall()
+        best = None
+        for row in rows:
+            if row[0] == exclude or not row[2] or row[3] is None:
+                continue
+            distance = hamming(value, _unsigned(row[3]))
+            if distance <= self.near_distance and (best is None or distance < best[1]) and Path(row[2]).exists():
+                best = (row, distance)
+        return self._match(best[0], "near", best[1]) if best else None
+
+    # ------------------------------------------------------------------
+    # Updates (parent process, after storage)
+    # ------------------------------------------------------------------
+    def record(self, fingerprint: Dict[str, Any], source: str, raw_path: str, output_path: str):
+        """Remember a processed document and the output it produced."""
+        value = fingerprint.get("simhash")
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO documents (sha256, size, simhash, claim_key, source, raw_path, output_path, first_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET output_path=excluded.output_path, raw_path=excluded.raw_path",
+                (
+                    fingerprint["sha256"],
+                    fingerprint.get("size"),
+                    _signed(value) if value is not None else None,
+                    fingerprint.get("claim_key"),
+                    source,
+                    raw_path,
+                    output_path,
+                    time.time(),
+                ),
+            )
+            if value is not None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO simhash_bands (band, value, sha256) VALUES (?, ?, ?)",
+                    [(band, part, fingerprint["sha256"]) for band, part in _bands(value)],
+                )
+            conn.commit()
+
+    def note_duplicate(self, duplicate: Dict[str, Any]):
+        """
+        Count a linked duplicate (run stats and the original's all-time counters).
+        `duplicate["stage"]` says where it was caught: "ingest" (nothing was
+        done), "extraction" (GenAI and storage skipped) or "storage" (only the
+        second output skipped — an in-run copy).
+        """
+        stage = duplicate.get("stage", "ingest")
+        size = (duplicate.get("size") or 0) if stage == "ingest" else 0
+        with self._lock:
+            self.stats[duplicate["match"]] += 1
+            self.stats["bytes_skipped"] += size
+            self.stats["ocr_skipped"] += 1 if stage == "ingest" else 0
+            self.stats["genai_skipped"] += 1 if stage in ("ingest", "extraction") else 0
+            conn = self._connect()
+            conn.execute(
+                "UPDATE documents SET duplicates = duplicates + 1, bytes_skipped = bytes_skipped + ? WHERE sha256=?",
+                (size, duplicate["sha256"]),
+            )
+            conn.commit()
+
+    def forget(self, sha256s) -> int:
+        """Drop documents from the index (e.g. --restart) so they are processed again."""
+        sha256s = list(sha256s)
+        with self._lock:
+            conn = self._connect()
+            removed = conn.executemany("DELETE FROM documents WHERE sha256=?", [(s,) for s in sha256s]).rowcount
+            conn.executemany("DELETE FROM simhash_bands WHERE sha256=?", [(s,) for s in sha256s])
+            conn.commit()
+        if removed:
+            logger.info(f"🔁 Forgot {removed} document(s) in the dedup index; they will be processed again.")
+        return removed
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def summary(self) -> Dict[str, int]:
+        """Work avoided in this run."""
+        with self._lock:
+            return dict(self.stats)
+
+    def report(self) -> Dict[str, int]:
+        """All-time totals from the index."""
+        with self._lock:
+            documents, duplicates, skipped = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(duplicates), 0), COALESCE(SUM(bytes_skipped), 0) FROM documents"
+            ).fetchone()
+        return {"documents": documents, "duplicates": duplicates, "bytes_skipped": skipped}
+
+
+_index: Optional[DedupIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> Optional[DedupIndex]:
+    """Return the shared dedup index, or None if DEDUP_ENABLED is off."""
+    global _index
+    if not DEDUP_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DedupIndex(DEDUP_INDEX_PATH)
+    return _index
+
+
+if __name__ == "__main__":
+    index = DedupIndex(DEDUP_INDEX_PATH)
+    totals = index.report()
+    print(f"📚 Indexed documents: {totals['documents']}")
+    print(f"♻️ Duplicates linked instead of reprocessed: {totals['duplicates']}")
+    print(f"💾 Bytes not re-ingested: {totals['bytes_skipped'] / 1_048_576:.1f} MiB")
@@ -3,13 +3,27 @@ src/storage/hitl.py
 --------------------------------
 Implements Human-In-The-Loop (HITL) data storage.
 Stores claims with low confidence or failed validations into SQLite database.
+
+Key features:
+- One persistent writer connection per process (re-opened after fork), shared
+  by callers and the commit timer under a lock; readers get one per thread
+- WAL journal mode + busy timeout, and BEGIN IMMEDIATE write transactions, so
+  parallel batch runs (threads or processes) wait for each other instead of
+  failing with "database is locked"
+- Inserts are group-committed: buffered and written in one transaction per
+  HITL_COMMIT_BATCH records or HITL_COMMIT_INTERVAL seconds (and at exit); a
+  failed commit keeps the records buffered and retries on the next flush
+- Indexes on status (+ created_at), claim_id and created_at
 """
 
+import atexit
 import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import List
-from src.config import DATABASE_URL
+from typing import List, Optional, Tuple
+from src.config import DATABASE_URL, HITL_COMMIT_BATCH, HITL_COMMIT_INTERVAL
 from src.utils.logging import logger
 
 # ---------------------------------------------------------------------
@@ -25,30 +39,171 @@ else:
 DB_PATH = Path(DB_PATH)
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# How long a connection waits for another writer before giving up
+BUSY_TIMEOUT_MS = 30000
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS hitl_claims (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        claim_id TEXT,
+        amount REAL,
+        claim_date TEXT,
+        errors TEXT,
+        status TEXT DEFAULT 'Pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_hitl_status_created ON hitl_claims(status, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_hitl_claim_id ON hitl_claims(claim_id)",
+    "CREATE INDEX IF NOT EXISTS idx_hitl_created_at ON hitl_claims(created_at)",
+)
+
+HitlRow = Tuple[Optional[str], Optional[float], Optional[str], str]
+
+
+class HITLStore:
+    """Pooled, group-committing writer/reader for the hitl_claims table."""
+
+    def __init__(self, path: Path, batch_size: int = None, interval: float = None):
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size or HITL_COMMIT_BATCH)
+        self.interval = HITL_COMMIT_INTERVAL if interval is None else interval
+        self._local = threading.local()
+        self._pending: List[HitlRow] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+        self._initialized = False
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+    def _open(self, shared: bool = False) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly (BEGIN IMMEDIATE)
+        conn = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=not shared
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._initialized:
+            self._init_schema(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's read connection (a new one after fork)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._open()
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _writer_conn(self) -> sqlite3.Connection:
+        """The process's writer connection; only used with self._lock held."""
+        if self._writer is None:
+            self._writer = self._open(shared=True)
+        return self._writer
 
-def _connect():
-    """Create a database connection."""
-    return sqlite3.connect(DB_PATH)
+    def _schedule(self):
+        """Start the commit timer if none is pending (caller holds self._lock)."""
+        if self._timer is None and self.interval > 0:
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._initialized = True
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def add(self, claim_id: str, amount: float, claim_date: str, errors: List[str]):
+        """Buffer one record; the buffer is committed when full or after `interval` seconds."""
+        with self._lock:
+            if self._pid != os.getpid():  # forked child: the parent's buffer and connection are not ours
+                self._pending, self._timer, self._writer, self._pid = [], None, None, os.getpid()
+            self._pending.append((claim_id, amount, claim_date, ", ".join(errors)))
+            full = len(self._pending) >= self.batch_size
+            if not full:
+                self._schedule()
+        if full or self.interval <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """Commit all buffered records in one transaction; returns how many were written."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return 0
+            rows, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not rows:
+                return 0
+            try:
+                conn = self._writer_conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT INTO hitl_claims (claim_id, amount, claim_date, errors) VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                # Keep the records (ahead of any added since) for the next attempt
+                self._pending[:0] = rows
+                self._schedule()
+                logger.exception(f"❌ Failed to write {len(rows)} HITL record(s); will retry: {e}")
+                return 0
+        logger.info(f"🧾 Committed {len(rows)} HITL record(s) for review.")
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def fetch_pending(self, limit: int = 5):
+        """Oldest pending records first (served by the status/created_at index)."""
+        self.flush()
+        return self._connect().execute(
+            "SELECT id, claim_id, amount, claim_date, errors, status FROM hitl_claims "
+            "WHERE status='Pending' ORDER BY created_at, id LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+
+_store: Optional[HITLStore] = None
+_store_lock = threading.Lock()
+
+
+def get_hitl_store() -> HITLStore:
+    """Return the shared HITL store for DB_PATH (created on first use)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HITLStore(DB_PATH)
+    return _store
 
 
 def _init_db():
-    """Initialize the HITL table if not exists."""
+    """Initialize the HITL table and indexes if not exists."""
     try:
-        with _connect() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS hitl_claims (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    claim_id TEXT,
-                    amount REAL,
-                    claim_date TEXT,
-                    errors TEXT,
-                    status TEXT DEFAULT 'Pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.commit()
+        get_hitl_store()._connect()
         logger.info(f"✅ HITL table ready at {DB_PATH}")
     except Exception as e:
         logger.exception(f"❌ Failed to initialize HITL DB: {e}")
@@ -63,35 +218,27 @@ _init_db()
 # ---------------------------------------------------------------------
 def insert_hitl_record(claim_id: str, amount: float, claim_date: str, errors: List[str]):
     """
-    Insert a new record into HITL table for human review.
+    Queue a new record for the HITL table (group-committed, see HITLStore).
     """
     try:
-        with _connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO hitl_claims (claim_id, amount, claim_date, errors)
-                VALUES (?, ?, ?, ?)
-                """,
-                (claim_id, amount, claim_date, ", ".join(errors)),
-            )
-            conn.commit()
+        get_hitl_store().add(claim_id, amount, claim_date, errors)
         logger.info(f"🧾 Added claim {claim_id} to HITL DB for review.")
     except Exception as e:
         logger.exception(f"❌ Failed to insert HITL record for {claim_id}: {e}")
 
 
+def flush_hitl_records() -> int:
+    """Commit buffered HITL records now (end of a batch run, before reading)."""
+    return get_hitl_store().flush()
+
+
 # ---------------------------------------------------------------------
 # Optional: Utility to fetch pending records
 # ---------------------------------------------------------------------
 def fetch_pending_claims(limit: int = 5):
     """Retrieve a few pending HITL claims for UI or testing."""
     try:
-        with _connect() as conn:
-            rows = conn.execute(
-                "SELECT id, claim_id, amount, claim_date, errors, status FROM hitl_claims WHERE status='Pending' LIMIT ?",
-                (limit,),
-            ).fetchall()
-        return rows
+        return get_hitl_store().fetch_pending(limit)
     except Exception as e:
         logger.error(f"Failed to fetch HITL records: {e}")
         return []
@@ -0,0 +1,285 @@
+"""
+src/storage/jobs.py
+--------------------------------
+Durable claim job queue (SQLite) with per-stage checkpoints.
+
+Each input document gets a job keyed on its path, size and mtime. The output of
+every pipeline stage (extract → normalize → validate → store) is checkpointed,
+so a claim interrupted by a crash or a failed GenAI call resumes from its last
+completed stage on the next run instead of starting again from OCR.
+
+Key features:
+- Leases: a job being worked on belongs to one worker (host:pid) until its
+  lease expires; a heartbeat thread renews every held lease each
+  JOBS_LEASE_SECONDS / 3, so only jobs of a dead worker are taken over (at
+  once when that worker was on this host)
+- Completed jobs keep their result (checkpoints are dropped) and are not
+  processed again; `--restart` forgets them
+- Failed jobs keep their checkpoints and count attempts
+- Status overview: `python -m src.storage.jobs`
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+from src.config import JOBS_DB_PATH, JOBS_ENABLED, JOBS_LEASE_SECONDS
+from src.utils.logging import logger
+
+STAGES = ("extract", "normalize", "validate", "store")
+
+
+def job_key(path: Path) -> str:
+    """Identity of an input document: resolved path, size and mtime (a changed file is a new job)."""
+    stat = path.stat()
+    return f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _worker_alive(worker: str) -> bool:
+    """A worker on this host is checked directly; other hosts are trusted until their lease ends."""
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """BEGIN IMMEDIATE … COMMIT (ROLLBACK on error)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class Job:
+    """Handle on one leased job: read and write its stage checkpoints, then finish it."""
+
+    def __init__(self, queue: "JobQueue", job_id: int, file: str, stage: Optional[str]):
+        self.queue = queue
+        self.id = job_id
+        self.file = file
+        self.stage = stage  # last completed stage (None: nothing done yet)
+
+    def load(self, stage: str) -> Optional[Any]:
+        """Checkpointed output of `stage`, or None if it has not completed."""
+        return self.queue._load(self.id, stage)
+
+    def save(self, stage: str, payload: Any):
+        self.queue._save(self.id, stage, payload)
+        self.stage = stage
+
+    def finish(self, result: Dict[str, Any]):
+        """Record the final result ("failed" keeps the checkpoints for the next attempt)."""
+        self.queue._finish(self.id, result)
+
+
+class JobQueue:
+    """SQLite-backed queue of claim jobs, stage checkpoints and worker leases."""
+
+    def __init__(self, path: Path, lease_seconds: float = None):
+        self.path = Path(path)
+        self.lease_seconds = JOBS_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT UNIQUE NOT NULL,
+                    file TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_until REAL,
+                    heartbeat_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    job_id INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, stage)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn, self._pid = conn, os.getpid()
+            self._heartbeat = None  # threads do not survive fork
+        return self._conn
+
+    # ------------------------------------------------------------------
+    # Leases
+    # ------------------------------------------------------------------
+    def claim(self, path: Path) -> Union[Job, Dict[str, Any]]:
+        """
+        Lease the job for `path` (created on first sight). Returns a Job to work
+        on, or a final result dict: the stored result of a completed job, or
+        status "skipped" while another live worker holds the lease.
+        """
+        key, now = job_key(path), time.time()
+        with self._lock, _transaction(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, stage, worker, lease_until, result FROM jobs WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (key, file, status, attempts, worker, lease_until, heartbeat_at, created_at, updated_at) "
+                    "VALUES (?, ?, 'running', 1, ?, ?, ?, ?, ?)",
+                    (key, str(path), self.worker, now + self.lease_seconds, now, now, now),
+                ).lastrowid
+                stage = None
+            else:
+                job_id, status, stage, worker, lease_until, result = row
+                if status == "done":
+                    return {**json.loads(result), "file": str(path)}
+                if status == "running" and worker != self.worker:
+                    if (lease_until or 0) > now and _worker_alive(worker):
+                        return {"file": str(path), "status": "skipped", "error": f"in progress on {worker}"}
+                    logger.warning(f"⏱️ Worker {worker} gone; taking over {path.name} after stage '{stage or 'none'}'.")
+                conn.execute(
+                    "UPDATE jobs SET status='running', file=?, attempts=attempts+1, worker=?, lease_until=?, "
+                    "heartbeat_at=?, error=NULL, updated_at=? WHERE id=?",
+                    (str(path), self.worker, now + self.lease_seconds, now, now, job_id),
+                )
+        self._start_heartbeat()
+        if stage:
+            logger.info(f"⏯️ Resuming {path.name} after stage '{stage}'.")
+        return Job(self, job_id, str(path), stage)
+
+    def _start_heartbeat(self):
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(max(self.lease_seconds / 3, 0.01)):
+            self.heartbeat()
+
+    def heartbeat(self) -> int:
+        """Extend every lease this worker holds; returns how many were renewed."""
+        now = time.time()
+        with self._lock:
+            return self._connect().execute(
+                "UPDATE jobs SET lease_until=?, heartbeat_at=? WHERE status='running' AND worker=?",
+                (now + self.lease_seconds, now, self.worker),
+            ).rowcount
+
+    def close(self):
+        """Stop the heartbeat; leases still held expire on their own."""
+        self._stop.set()
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def _load(self, job_id: int, stage: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT payload FROM checkpoints WHERE job_id=? AND stage=?", (job_id, stage)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, job_id: int, stage: str, payload: Any):
+        data, now = json.dumps(payload, ensure_ascii=False, default=str), time.time()
+        with self._lock, _transaction(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, stage, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, stage, data, now),
+            )
+            conn.execute("UPDATE jobs SET stage=?, updated_at=? WHERE id=?", (stage, now, job_id))
+
+    def _finish(self, job_id: int, result: Dict[str, Any]):
+        failed, now = result.get("status") == "failed", time.time()
+        with self._lock, _transaction(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status=?, result=?, error=?, worker=NULL, lease_until=NULL, updated_at=? WHERE id=?",
+                ("failed" if failed else "done", json.dumps(result, default=str), result.get("error"), now, job_id),
+            )
+            if not failed:
+                conn.execute("DELETE FROM checkpoints WHERE job_id=?", (job_id,))
+
+    def reset(self, paths: Iterable[Path]) -> int:
+        """Forget the jobs (and checkpoints) of `paths` so they are processed from scratch."""
+        keys = [job_key(p) for p in paths if p.exists()]
+        removed = 0
+        with self._lock, _transaction(self._connect()) as conn:
+            for key in keys:
+                row = conn.execute("SELECT id FROM jobs WHERE key=?", (key,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM checkpoints WHERE job_id=?", (row[0],))
+                    conn.execute("DELETE FROM jobs WHERE id=?", (row[0],))
+                    removed += 1
+        return removed
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def report(self) -> Dict[str, int]:
+        """Job counts by status ("running" with an expired lease is reported as "stalled")."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT CASE WHEN status='running' AND lease_until < ? THEN 'stalled' ELSE status END, COUNT(*) "
+                "FROM jobs GROUP BY 1",
+                (time.time(),),
+            ).fetchall()
+        return dict(rows)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Return the shared job queue, or None if JOBS_ENABLED is off."""
+    global _queue
+    if not JOBS_ENABLED:
+        return None
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(JOBS_DB_PATH)
+    return _queue
+
+
+if __name__ == "__main__":
+    counts = JobQueue(JOBS_DB_PATH).report()
+    print(f"🗃️ Jobs in {JOBS_DB_PATH}:")
+    for status in ("running", "stalled", "failed", "done"):
+        print(f"  {status}: {counts.get(status, 0)}")
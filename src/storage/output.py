@@ -5,13 +5,18 @@ Handles storage of processed claim results into JSON files or databases.
 Ensures safe file naming even if claim_id is missing.
 """
 
+import itertools
 import json
 import os
+import re
+import time
 from pathlib import Path
 from datetime import datetime
 from src.config import DATA_DIR
 from src.utils.logging import logger
 
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
 
 def store_output(processed: dict, source_path: str) -> str:
     """
@@ -21,24 +26,63 @@ def store_output(processed: dict, source_path: str) -> str:
     processed_dir = Path(DATA_DIR) / "processed"
     processed_dir.mkdir(parents=True, exist_ok=True)
 
-    # Safe fallback if claim_id not present
-    claim_id = processed.get("claim_id")
+    # Locally routed claims (template/rules) carry their fields under "normalized"
+    normalized = processed.get("normalized") if isinstance(processed.get("normalized"), dict) else {}
+    claim_id = processed.get("claim_id") or normalized.get("claim_id")
     if not claim_id:
         # Create a temporary unique ID based on timestamp
         claim_id = f"temp_{int(datetime.now().timestamp())}"
         logger.warning(f"⚠️ Missing claim_id — using generated ID: {claim_id}")
+    claim_id = _SAFE_NAME.sub("_", str(claim_id)).strip("_") or "unknown"
 
-    # Build output filename
+    # Build output filename; claims finishing in the same second get a counter
+    # suffix (O_EXCL create), so one never overwrites another
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"processed_{claim_id}_{timestamp}.json"
-    output_path = processed_dir / filename
-
-    # Write to JSON file safely
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(processed, f, ensure_ascii=False, indent=2)
+        for n in itertools.count():
+            suffix = f"_{n}" if n else ""
+            output_path = processed_dir / f"processed_{claim_id}_{timestamp}{suffix}.json"
+            try:
+                f = open(output_path, "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+            with f:
+                json.dump(processed, f, ensure_ascii=False, indent=2)
+            break
         logger.info(f"💾 Output stored successfully: {output_path}")
         return str(output_path)
     except Exception as e:
         logger.exception(f"❌ Failed to store output JSON: {e}")
         raise
+
+def write_summary(results: list, summary_path: Path = None) -> Path:
+    """Write the run summary (data/processed/summary.json) atomically."""
+    summary_path = Path(summary_path or Path(DATA_DIR) / "processed" / "summary.json")
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = summary_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, summary_path)
+    return summary_path
+
+
+class SummaryWriter:
+    """
+    Keeps summary.json current while a batch runs, so an interrupted run still
+    leaves the results so far (rewritten at most every `interval` seconds).
+    """
+
+    def __init__(self, summary_path: Path = None, interval: float = 2.0):
+        self.summary_path = summary_path
+        self.interval = interval
+        self.results = []
+        self._written_at = 0.0
+
+    def add(self, result: dict):
+        self.results.append(result)
+        if time.monotonic() - self._written_at >= self.interval:
+            self.flush()
+
+    def flush(self) -> Path:
+        self._written_at = time.monotonic()
+        return write_summary(self.results, self.summary_path)
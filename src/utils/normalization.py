@@ -2,18 +2,67 @@ import re
 from datetime import datetime
 from ..utils.logging import logger
 
+# Compiled once at import; normalize_* run for every field of every claim
+# Numeric patterns are digit-bounded so a 4-digit year is never split
+# ("2012-01-05" must not read as 12-01-05); ISO is tried first.
+_DATE_PATTERNS = [
+    # YYYY-MM-DD (already ISO)
+    (re.compile(r'(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)'), "ymd"),
+    # MM/DD/YYYY, MM-DD-YY
+    (re.compile(r'(?<!\d)(\d{1,2})[/-](\d{1,2})[/-](\d{4}|\d{2})(?!\d)'), "mdy"),
+    # Oct 15, 2023 / October 15 2023
+    (re.compile(r'([A-Za-z]{3,9})\.?\s+(\d{1,2}),?\s+(\d{4})'), "text"),
+    # MMDDYY / MMDDYYYY as printed on UB-04 / CMS-1500 forms
+    (re.compile(r'^(\d{2})(\d{2})(\d{2}|\d{4})$'), "mdy"),
+]
+_AMOUNT = re.compile(r'^\(?[$€£]?\s*(-?[\d,]*\.?\d+)\)?$')
+
+
+def _year(value):
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
 def normalize_date(date_str):
-    """Normalize date string to ISO format (basic regex fallback)."""
+    """Normalize date string to ISO format (basic regex fallback); "" if no date is recognised."""
     if not date_str:
         return ""
-    # Common patterns: MM/DD/YYYY, DD/MM/YYYY, words like "Oct 15, 2023"
-    patterns = [
-        r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})',
-        r'(\w{3})\s+(\d{1,2}),\s+(\d{4})'  # e.g., Oct 15, 2023
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, date_str, re.IGNORECASE)
-        if match:
-            try:
-                if len(match.groups()) == 3:
-                   
\ No newline at end of file
+    date_str = str(date_str).strip()
+    # Common patterns: MM/DD/YYYY, YYYY-MM-DD, words like "Oct 15, 2023", MMDDYY
+    for pattern, order in _DATE_PATTERNS:
+        match = pattern.search(date_str)
+        if not match:
+            continue
+        try:
+            if order == "mdy":
+                month, day, year = match.groups()
+                parsed = datetime(_year(year), int(month), int(day))
+            elif order == "ymd":
+                year, month, day = match.groups()
+                parsed = datetime(int(year), int(month), int(day))
+            else:
+                month, day, year = match.groups()
+                parsed = datetime.strptime(f"{month[:3].title()} {day} {year}", "%b %d %Y")
+            return parsed.date().isoformat()
+        except ValueError:
+            continue
+    logger.debug(f"Could not normalize date: {date_str!r}")
+    return ""
+
+
+def normalize_amount(amount_str):
+    """Parse a money string ("$2,500", "2500.00", "(1,200)") into a float; None if not an amount."""
+    if amount_str is None:
+        return None
+    if isinstance(amount_str, (int, float)):
+        return float(amount_str)
+    text = str(amount_str).strip().replace(" ", "")
+    match = _AMOUNT.match(text)
+    if not match:
+        logger.debug(f"Could not normalize amount: {amount_str!r}")
+        return None
+    try:
+        value = float(match.group(1).replace(",", ""))
+    except ValueError:
+        return None
+    return -value if text.startswith("(") and text.endswith(")") else value
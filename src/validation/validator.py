@@ -9,6 +9,21 @@ from typing import Dict, Any, List
 from src.config import CONFIDENCE_THRESHOLD, MAX_CLAIM_AMOUNT, MIN_CLAIM_AMOUNT
 from src.utils.logging import logger
 
+# Where each value may live: top level (rules/template output, older callers)
+# first, then the GenAI "normalized" block
+_AMOUNT_KEYS = ("amount", "claim_amount")
+_DATE_KEYS = ("date", "claim_date", "incident_date")
+
+
+def _claim_value(processed: Dict[str, Any], keys) -> Any:
+    """First non-empty value for `keys` at top level or in processed["normalized"]."""
+    normalized = processed.get("normalized") if isinstance(processed.get("normalized"), dict) else {}
+    for source in (processed, normalized):
+        for key in keys:
+            if source.get(key) not in (None, ""):
+                return source[key]
+    return None
+
 
 def validate_and_review(processed: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -21,8 +36,9 @@ def validate_and_review(processed: Dict[str, Any]) -> Dict[str, Any]:
     logger.info("🧩 Running validation checks...")
 
     # Example checks — adapt to your real schema
-    amount = validated.get("amount")
-    confidence = validated.get("confidence", 1.0)
+    amount = _claim_value(validated, _AMOUNT_KEYS)
+    extraction = validated.get("extraction") or {}
+    confidence = validated.get("confidence", extraction.get("confidence", 1.0))
 
     # --- Check 1: Amount range ---
     try:
@@ -37,10 +53,18 @@ def validate_and_review(processed: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         errors.append(f"Invalid amount value: {e}")
 
-    # --- Check 2: Confidence ---
+    # --- Check 2: Confidence (model-reported, else document-level OCR confidence) ---
     try:
         if confidence < CONFIDENCE_THRESHOLD:
-            errors.append(f"Low model confidence: {confidence:.2f}")
+            message = f"Low model confidence: {confidence:.2f}"
+            low_pages = [
+                str(p["page"])
+                for p in extraction.get("pages", [])
+                if p.get("confidence") is not None and p["confidence"] < CONFIDENCE_THRESHOLD
+            ]
+            if low_pages:
+                message += f" (low OCR confidence on pages {', '.join(low_pages)})"
+            errors.append(message)
     except Exception as e:
         errors.append(f"Invalid confidence value: {e}")
 
@@ -65,9 +89,9 @@ def store_for_hitl(processed: dict, errors: list):
     """
     from src.storage.hitl import insert_hitl_record
 
-    claim_id = processed.get("claim_id", f"temp_{int(__import__('time').time())}")
-    claim_amount = processed.get("amount", None)
-    claim_date = processed.get("date", None)
+    claim_id = _claim_value(processed, ("claim_id",)) or f"temp_{int(__import__('time').time())}"
+    claim_amount = _claim_value(processed, _AMOUNT_KEYS)
+    claim_date = _claim_value(processed, _DATE_KEYS)
 
     insert_hitl_record(
         claim_id,
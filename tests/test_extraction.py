@@ -53,11 +53,345 @@ def test_extract_text_image(mock_image_path):
     """Test extraction from image."""
     extracted = extract_text(mock_image_path)
     assert extracted["unstructured"] != ""  # OCR should extract something
-    assert extracted["confidence"] == 0.9  # Default for images
+    assert 0.0 < extracted["confidence"] <= 1.0  # Tesseract word confidence
 
 def test_extract_text_invalid_file():
     """Test error handling for invalid file."""
     invalid_path = Path("/nonexistent/file.pdf")
     extracted = extract_text(invalid_path)
     assert extracted["confidence"] == 0.0
-    assert extracted["unstructured"] == ""
\ No newline at end of file
+    assert extracted["unstructured"] == ""
+# Shape of pytesseract.image_to_data(output_type=DICT): page/block rows carry conf -1
+TESSERACT_DATA = {
+    "level": [1, 2, 5, 5, 5],
+    "block_num": [0, 1, 1, 1, 1],
+    "par_num": [0, 1, 1, 1, 1],
+    "line_num": [0, 1, 1, 1, 2],
+    "left": [0, 10, 10, 50, 10],
+    "top": [0, 10, 10, 10, 40],
+    "width": [200, 150, 35, 55, 50],
+    "height": [100, 50, 12, 12, 12],
+    "conf": [-1, -1, 96, 90, 40],
+    "text": ["", "", "Test", "Claim:", "$1000"],
+}
+
+def test_ocr_image_data_confidences(mock_image_path, mocker):
+    """Word confidences and boxes come from one image_to_data pass and are aggregated."""
+    import src.extraction.ocr as ocr
+    mock_tess = mocker.patch.object(ocr.pytesseract, "image_to_data", return_value=TESSERACT_DATA)
+
+    result = ocr.ocr_image_data(Image.open(mock_image_path), use_cache=False, engine=ocr.PytesseractEngine())
+    assert mock_tess.call_count == 1
+    assert result["text"] == "Test Claim:\n$1000"
+    assert [w["text"] for w in result["words"]] == ["Test", "Claim:", "$1000"]
+    assert result["words"][1]["bbox"] == [50, 10, 55, 12]
+    assert [line["text"] for line in result["lines"]] == ["Test Claim:", "$1000"]
+    assert result["lines"][0]["bbox"] == [10, 10, 95, 12]
+    # character-weighted: (96*4 + 90*6 + 40*5) / 15 / 100
+    assert result["confidence"] == pytest.approx((96 * 4 + 90 * 6 + 40 * 5) / 15 / 100)
+
+def test_ocr_image_cache_skips_tesseract(mock_image_path, temp_dir, mocker):
+    """Identical page bitmaps are OCR'd once and then served from the cache."""
+    import src.extraction.ocr as ocr
+    from src.storage.cache import ResultCache
+    mocker.patch.object(ocr, "_ocr_cache", ResultCache(temp_dir / "ocr.db"))
+    mock_tess = mocker.patch.object(ocr.pytesseract, "image_to_data", return_value=TESSERACT_DATA)
+    mocker.patch.object(ocr, "_engine", ocr.PytesseractEngine())
+
+    img = Image.open(mock_image_path)
+    assert ocr_image(img) == "Test Claim:\n$1000"
+    assert ocr_image(Image.open(mock_image_path)) == "Test Claim:\n$1000"
+    assert mock_tess.call_count == 1
+
+    # A different bitmap is a cache miss
+    ocr_image(img.rotate(90, expand=True))
+    assert mock_tess.call_count == 2
+
+    # So is the same bitmap rendered at another DPI
+    ocr_image(img, dpi=150)
+    assert mock_tess.call_count == 3
+
+@pytest.fixture
+def scanned_pdf_path(temp_dir):
+    """Three-page image-only PDF (no text layer)."""
+    pages = [Image.new('RGB', (200, 100), color='white') for _ in range(3)]
+    pdf_path = temp_dir / "scanned.pdf"
+    pages[0].save(pdf_path, save_all=True, append_images=pages[1:])
+    return pdf_path
+
+def test_extract_text_scanned_pdf_streams_pages(scanned_pdf_path, mocker):
+    """Scanned PDFs are rendered one page per convert_from_path call and joined in order."""
+    import src.extraction.parser as parser
+    rendered = []
+
+    def fake_convert(path, first_page, last_page, **kwargs):
+        rendered.append((first_page, last_page))
+        return [Image.new('RGB', (10, 10), color='white')]
+
+    mocker.patch.object(parser, "convert_from_path", side_effect=fake_convert)
+    mocker.patch.object(parser, "ocr_image_data", side_effect=lambda img, **kwargs: {
+        "text": f"page {len(rendered)}", "confidence": 0.5 + 0.1 * len(rendered), "words": [], "lines": []})
+
+    extracted = extract_text(scanned_pdf_path)
+    assert rendered == [(1, 1), (2, 2), (3, 3)]
+    assert [p["page"] for p in extracted["pages"]] == [1, 2, 3]
+    assert extracted["unstructured"] == "page 1\npage 2\npage 3\n"
+    assert [p["confidence"] for p in extracted["pages"]] == pytest.approx([0.6, 0.7, 0.8])
+    assert extracted["confidence"] == pytest.approx(0.7)
+
+def test_iter_ocr_pages_parallel_keeps_page_order(scanned_pdf_path, mocker):
+    """Pages OCR'd on a worker pool are reassembled in page order."""
+    import random
+    import time
+    import src.extraction.parser as parser
+    from src.extraction.parser import iter_ocr_pages
+
+    def slow_render(path, first_page, last_page, **kwargs):
+        time.sleep(random.uniform(0, 0.02))
+        return [Image.new('RGB', (10, 10), color='white')]
+
+    mocker.patch.object(parser, "convert_from_path", side_effect=slow_render)
+    mocker.patch.object(parser, "available_cores", return_value=4)
+    mocker.patch.object(parser, "ocr_image_data", side_effect=lambda img, **kwargs: {
+        "text": "text", "confidence": 0.9, "words": [], "lines": []})
+
+    pages = list(iter_ocr_pages(scanned_pdf_path, last_page=8, workers=16))
+    assert [p["page"] for p in pages] == list(range(1, 9))
+    assert parser.cap_ocr_workers(16, page_count=8) == 4
+
+    pool = parser._get_ocr_pool()
+    assert [p["page"] for p in iter_ocr_pages(scanned_pdf_path, last_page=8, workers=16)] == list(range(1, 9))
+    assert parser._get_ocr_pool() is pool  # one long-lived pool, not one per document
+
+def test_preprocess_pipeline_deskews_and_rescales():
+    """Configured stages run on NumPy arrays: rescale to target DPI, straighten, binarize."""
+    import cv2
+    import numpy as np
+    from src.extraction.ocr import estimate_skew, preprocess_image
+
+    page = np.full((800, 600), 255, np.uint8)
+    for y in range(100, 700, 40):
+        cv2.rectangle(page, (60, y), (540, y + 12), 0, -1)
+    skewed = cv2.warpAffine(page, cv2.getRotationMatrix2D((300, 400), 4, 1.0), (600, 800), borderValue=255)
+    assert abs(estimate_skew(skewed) + 4) < 0.5
+
+    timings = {}
+    img = Image.fromarray(skewed).convert("RGB")
+    out = preprocess_image(img, steps=["rescale", "deskew", "denoise", "binarize"], dpi=150, timings=timings)
+    assert out.shape == (1600, 1200)  # 150 → 300 DPI
+    assert abs(estimate_skew(out)) < 0.5
+    assert set(np.unique(out)) <= {0, 255}
+    assert set(timings) == {"gray", "rescale", "deskew", "denoise", "binarize"}
+
+def test_get_ocr_engine_falls_back_to_pytesseract(mocker):
+    """Without tesserocr installed the engine factory falls back to the CLI path."""
+    import builtins
+    import src.extraction.ocr as ocr
+
+    real_import = builtins.__import__
+
+    def no_tesserocr(name, *args, **kwargs):
+        if name == "tesserocr":
+            raise ImportError("No module named 'tesserocr'")
+        return real_import(name, *args, **kwargs)
+
+    mocker.patch.object(builtins, "__import__", side_effect=no_tesserocr)
+    mocker.patch.object(ocr, "_engine", None)
+    assert ocr.get_ocr_engine("tesserocr").name == "pytesseract"
+    assert ocr.get_ocr_engine("pytesseract").name == "pytesseract"
+
+def test_tesserocr_apis_end_with_their_threads(mocker):
+    """Per-thread tesserocr APIs are ended when the thread exits, and no more than max_apis live at once."""
+    import gc
+    import sys
+    import threading
+    import types
+    import src.extraction.ocr as ocr
+
+    created, ended = [], []
+
+    class FakeAPI:
+        def __init__(self, lang=None):
+            created.append(self)
+
+        def End(self):
+            ended.append(self)
+
+    mocker.patch.dict(sys.modules, {"tesserocr": types.SimpleNamespace(PyTessBaseAPI=FakeAPI)})
+    engine = ocr.TesserocrEngine(max_apis=2)
+
+    for _ in range(20):  # one short-lived thread per "document"
+        thread = threading.Thread(target=engine._api)
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert len(created) == 20 and len(ended) == 20 and engine.live_apis() == 0
+
+    barrier, cached = threading.Barrier(3), []
+
+    def hold():
+        cached.append(engine._api()[1])
+        barrier.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(cached) == [False, True, True]
+    engine.close()
+
+
+def test_extract_text_txt_skips_ocr(mock_pdf_path, mocker):
+    """Plain-text claims are read natively (no OCR) with full confidence."""
+    import src.extraction.parser as parser
+    mock_ocr = mocker.patch.object(parser, "ocr_image_data")
+    mock_pdf_path.write_text("Claim ID: ABC123\nAmount: $2,500\fPage two")
+
+    extracted = extract_text(mock_pdf_path)
+    mock_ocr.assert_not_called()
+    assert extracted["confidence"] == 1.0
+    assert [p["text"] for p in extracted["pages"]] == ["Claim ID: ABC123\nAmount: $2,500", "Page two"]
+    assert extracted["unstructured"] == "Claim ID: ABC123\nAmount: $2,500\nPage two\n"
+
+def test_extract_text_multipage_tiff(temp_dir, mocker):
+    """Every frame of a multi-page TIFF is OCR'd, in order."""
+    import src.extraction.parser as parser
+    frames = [Image.new('L', (40, 20), color=c) for c in (255, 200, 100)]
+    tiff_path = temp_dir / "fax.tiff"
+    frames[0].save(tiff_path, save_all=True, append_images=frames[1:])
+    seen = []
+
+    def fake_ocr(img):
+        seen.append(img.getpixel((0, 0)))
+        return {"text": f"frame {len(seen)}", "confidence": 0.9, "words": [], "lines": []}
+
+    mocker.patch.object(parser, "ocr_image_data", side_effect=fake_ocr)
+    extracted = extract_text(tiff_path)
+    assert seen == [255, 200, 100]
+    assert extracted["unstructured"] == "frame 1\nframe 2\nframe 3\n"
+    assert ".tiff" in parser.supported_extensions()
+
+def _fake_pdf_page(text="", images=()):
+    from types import SimpleNamespace
+    return SimpleNamespace(
+        extract_text=lambda: text, find_tables=lambda: [], flush_cache=lambda: None,
+        images=list(images), chars=list(text), rects=[], curves=[], lines=[],
+    )
+
+def _fake_analysis(page):
+    return {"text": page.extract_text(), "words": [], "tables": [], "fields": []}
+
+def test_extract_pdf_hybrid_ocrs_only_pages_without_text(temp_dir, mocker):
+    """Typed pages use the text layer; only scanned pages are OCR'd, at their native DPI."""
+    import src.extraction.parser as parser
+    scan_200dpi = {"width": 612.0, "height": 792.0, "srcsize": (1700, 2200)}
+    logo = {"width": 50.0, "height": 20.0, "srcsize": (1000, 400)}
+    pages = [
+        _fake_pdf_page("Claim ID: ABC123 typed claim form page"),
+        _fake_pdf_page("", images=[scan_200dpi, logo]),
+        _fake_pdf_page("Continuation sheet with typed text"),
+        _fake_pdf_page(""),  # blank page: nothing to OCR
+    ]
+    pdf = mocker.MagicMock()
+    pdf.__enter__.return_value.pages = pages
+    mocker.patch.object(parser.pdfplumber, "open", return_value=pdf)
+    mocker.patch.object(parser, "analyze_page", side_effect=_fake_analysis)
+    rendered = []
+
+    def fake_render(file_path, page_no, dpi=None):
+        rendered.append((page_no, dpi))
+        return {"page": page_no, "text": "scanned attachment", "source": "ocr", "confidence": 0.8, "lines": []}
+
+    mocker.patch.object(parser, "_render_and_ocr", side_effect=fake_render)
+    extracted = extract_text(temp_dir / "packet.pdf")
+
+    assert rendered == [(2, 200)]
+    assert [(p["page"], p["source"]) for p in extracted["pages"]] == [(1, "text"), (2, "ocr"), (3, "text")]
+
+def test_extract_pdf_keeps_multicolumn_rows_and_repeated_keys(temp_dir, mocker):
+    """Tables keep every column, repeated keys keep every value, and pages are flushed."""
+    import src.extraction.parser as parser
+    page = _fake_pdf_page("Claim ID: ABC123 typed claim form page\nPolicy No: P-1")
+    page.find_tables = lambda: [mocker.Mock(extract=lambda: [
+        ["Charge", "Room", "100.00"],
+        ["Charge", "Pharmacy", "25.50"],
+        ["Total", "125.50"],
+        [None, "orphan"],
+    ])]
+    page.flush_cache = mocker.Mock()
+    pdf = mocker.MagicMock()
+    pdf.__enter__.return_value.pages = [page]
+    mocker.patch.object(parser.pdfplumber, "open", return_value=pdf)
+    mocker.patch.object(parser, "analyze_page", side_effect=lambda p: {
+        "text": "Claim ID: ABC123\nPolicy No: P-1",
+        "words": [],
+        "tables": [p.find_tables()[0].extract()],
+        "fields": [("claim_id", "ABC123"), ("policy_no", "P-1")],
+    })
+
+    extracted = extract_text(temp_dir / "ub04.pdf")
+    assert extracted["structured"]["charge"] == [["Room", "100.00"], ["Pharmacy", "25.50"]]
+    assert extracted["structured"]["total"] == "125.50"
+    assert extracted["structured"]["claim_id"] == "ABC123"
+    assert extracted["tables"][0]["rows"][3] == [None, "orphan"]
+    page.flush_cache.assert_called_once()
+
+def test_analyze_page_matches_pdfplumber():
+    """The single-pass analysis yields the same text and tables as pdfplumber's separate calls."""
+    import pdfplumber
+    from src.extraction.parser import analyze_page
+    sample = Path(__file__).resolve().parents[1] / "data" / "test" / "Property Claim Form 9-14-2012 template.pdf"
+    with pdfplumber.open(sample) as pdf:
+        page = pdf.pages[0]
+        expected_text, expected_tables = page.extract_text(), page.extract_tables()
+        page.flush_cache()
+        analysis = analyze_page(page)
+    assert analysis["text"] == expected_text
+    assert analysis["tables"] == expected_tables
+    assert ("amount_of_claim", "$") in analysis["fields"]
+
+def test_extract_pdf_reads_template_zones(mocker):
+    """A known form is fingerprinted and read zone by zone, without full-page analysis."""
+    import src.extraction.parser as parser
+    analyze = mocker.patch.object(parser, "analyze_page")
+    sample = Path(__file__).resolve().parents[1] / "data" / "test" / "AGENT Inpatient UB 04 Claim Example.pdf"
+
+    extracted = extract_text(sample)
+    analyze.assert_not_called()
+    assert extracted["template"]["name"] == "ub04"
+    assert extracted["structured"]["patient_name"] == "Smith, John"
+    assert extracted["structured"]["total_charges"] == 77030.0
+    assert extracted["template"]["normalized"] == {
+        "claim_id": "1234",
+        "claim_date": "2024-10-10",  # "101024" in the form, stored as ISO
+        "claim_amount": 77030.0,
+        "policy_number": "3332522111",
+        "insured_name": "John Smith",
+    }
+    assert extracted["pages"][0]["source"] == "template"
+    # The zone lines come first; the rest of the text layer is kept after them
+    assert extracted["unstructured"].startswith("provider_name: Happy Hospital Center\n")
+    assert "UB-04 CMS-1450" in extracted["unstructured"]
+
+def test_template_match_with_empty_zones_falls_back_to_full_extraction():
+    """A matched form whose zones fill too few fields is extracted in full, without the template."""
+    sample = Path(__file__).resolve().parents[1] / "data" / "test" / "Property Claim Form 9-14-2012 template.pdf"
+    extracted = extract_text(sample)
+    assert "template" not in extracted
+    assert {p["source"] for p in extracted["pages"]} == {"text"}
+    assert extracted["tables"]  # full pdfplumber analysis ran
+
+def test_match_template_checks_size_and_anchors():
+    """Documents with another layout, or missing an anchor, do not match."""
+    from src.config import TEMPLATES
+    from src.extraction.templates import _ZoneReader, match_template
+    ub04 = [t for t in TEMPLATES if t["name"] == "ub04"]
+    sample = Path(__file__).resolve().parents[1] / "data" / "test" / "Property Claim Form 9-14-2012 template.pdf"
+    reader = _ZoneReader(sample)
+    try:
+        assert match_template(reader, ub04) is None
+        moved = [{**ub04[0], "page_size": list(reader.page_size(1))}]
+        assert match_template(reader, moved) is None  # right size, anchors absent
+    finally:
+        reader.close()
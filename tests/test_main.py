@@ -0,0 +1,357 @@
+import pytest
+from pathlib import Path
+import src.main as main_module
+from tests.conftest import temp_dir
+
+
+@pytest.fixture
+def claim_files(temp_dir):
+    """Create a handful of small text claims."""
+    files = []
+    for i in range(5):
+        f = temp_dir / f"claim_{i}.txt"
+        f.write_text(f"Claim ID: C{i}\nAmount: ${i}00")
+        files.append(f)
+    return files
+
+
+@pytest.fixture
+def mock_stages(mocker, temp_dir):
+    """Mock every pipeline stage; extraction fails for claim_2."""
+    def fake_extract(path, ocr_workers=None):
+        if path.stem == "claim_2":
+            raise RuntimeError("corrupt document")
+        return {"structured": {}, "unstructured": path.read_text(), "confidence": 0.95}
+
+    mocker.patch.object(main_module, "ingest_document", side_effect=lambda p, **kw: temp_dir / f"raw_{p.name}")
+    mocker.patch.object(main_module, "extract_text", side_effect=fake_extract)
+    mocker.patch.object(main_module, "process_with_genai", side_effect=lambda e: {"raw_output": e["unstructured"]})
+    mocker.patch.object(main_module, "validate_and_review", side_effect=lambda p: p)
+    mocker.patch.object(main_module, "store_output", side_effect=lambda v, raw: str(raw) + ".json")
+    mocker.patch.object(main_module, "get_dedup_index", return_value=None)
+    mocker.patch.object(main_module, "get_job_queue", return_value=None)
+
+
+def test_process_batch_parallel_keeps_order(claim_files, mock_stages):
+    """Parallel extraction returns one result per file, in input order."""
+    results = main_module.process_batch(claim_files, workers=3)
+
+    assert [r["file"] for r in results] == [str(f) for f in claim_files]
+    assert [r["status"] for r in results] == ["success", "success", "failed", "success", "success"]
+    assert "corrupt document" in results[2]["error"]
+    assert results[0]["output"].endswith("raw_claim_0.txt.json")
+
+
+def test_process_batch_single_worker(claim_files, mock_stages):
+    """workers=1 falls back to the sequential path with identical results."""
+    sequential = main_module.process_batch(claim_files, workers=1)
+    parallel = main_module.process_batch(claim_files, workers=2)
+    assert sequential == parallel
+
+
+def test_only_spooled_inputs_are_ingested_as_consumed(claim_files, mock_stages):
+    """Batch runs leave inputs alone; the watcher's spool files may be hard-linked."""
+    main_module.process_batch(claim_files[:1], workers=1)
+    assert main_module.ingest_document.call_args.kwargs["consume"] is False
+    main_module.process_batch(claim_files[:1], workers=1, consume=True)
+    assert main_module.ingest_document.call_args.kwargs["consume"] is True
+
+
+def test_process_batch_concurrent_genai(claim_files, mock_stages, mocker):
+    """Overlapping GenAI calls still yield results in input order."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeRunner(ThreadPoolExecutor):
+        def __init__(self, max_concurrency):
+            super().__init__(max_concurrency)
+
+        def submit(self, extracted):
+            return super().submit(main_module.process_with_genai, extracted)
+
+    mocker.patch.object(main_module, "AsyncGenAIRunner", FakeRunner)
+    results = main_module.process_batch(claim_files, workers=2, genai_concurrency=3)
+    assert [r["file"] for r in results] == [str(f) for f in claim_files]
+    assert [r["status"] for r in results].count("failed") == 1
+
+
+def test_process_batch_skips_genai_for_locally_routed_claims(temp_dir, mock_stages, mocker):
+    """Claims the rules fully cover are normalized without a GenAI call."""
+    f = temp_dir / "typed.txt"
+    f.write_text(
+        "Claim ID: T1\nDate: 10/15/2023\nAmount: $250\nPolicy No: P-1\nInsured: Jane Doe\nDescription: Hail damage\n"
+    )
+    results = main_module.process_batch([f], workers=1)
+    assert results[0]["status"] == "success"
+    main_module.process_with_genai.assert_not_called()
+
+
+def test_batch_submit_and_resume(claim_files, mock_stages, mocker, temp_dir):
+    """Claims needing GenAI are submitted as one batch and finished on resume."""
+    import json
+    import src.processing.batch as batch_module
+
+    mocker.patch.object(batch_module, "GENAI_BATCH_DIR", temp_dir / "batches")
+    mocker.patch.object(batch_module, "_cache_lookup", return_value=None)
+    mocker.patch.object(batch_module, "get_genai_cache", return_value=None)
+    backend = batch_module.LocalBatchBackend(
+        temp_dir / "backend", responder=lambda prompt: json.dumps({"normalized": {"claim_id": "X"}, "summary": "ok"})
+    )
+
+    run, submitted = main_module.submit_batch_run(claim_files, backend)
+    assert [r["status"] for r in submitted] == ["failed"]  # only the corrupt document; nothing called live
+    main_module.process_with_genai.assert_not_called()
+    assert len(run.manifest["claims"]) == 4
+    assert (run.dir / "requests.jsonl").read_text().count("\n") == 4
+
+    results = main_module.resume_batch_run(run.dir, backend)
+    assert [r["file"] for r in results] == [str(f) for f in claim_files if f.stem != "claim_2"]
+    assert all(r["status"] == "success" for r in results)
+    assert main_module.resume_batch_run(run.dir, backend) == []  # already collected
+
+
+def test_local_batch_backend_answers_with_the_stub_and_skips_the_cache(claim_files, mock_stages, mocker, temp_dir):
+    """The default local responder fills real fields; its answers never reach the GenAI cache."""
+    import src.processing.batch as batch_module
+
+    mocker.patch.object(batch_module, "GENAI_BATCH_DIR", temp_dir / "batches")
+    mocker.patch.object(batch_module, "_cache_lookup", return_value=None)
+    cache = mocker.patch.object(batch_module, "get_genai_cache")
+    stored = mocker.patch.object(main_module, "store_output", side_effect=lambda v, raw: str(raw) + ".json")
+    backend = batch_module.LocalBatchBackend(temp_dir / "backend")
+    run, _ = main_module.submit_batch_run(claim_files[:1], backend)
+    results = main_module.resume_batch_run(run.dir, backend)
+
+    assert results[0]["status"] == "success"
+    assert stored.call_args.args[0]["normalized"]["claim_id"] == "C0"
+    cache.assert_not_called()
+
+
+def test_batch_resume_fails_claims_of_a_dead_batch(claim_files, mock_stages, mocker, temp_dir):
+    """A batch that ended without results still finishes its claims (as failed) and records why."""
+    import src.processing.batch as batch_module
+
+    mocker.patch.object(batch_module, "GENAI_BATCH_DIR", temp_dir / "batches")
+    mocker.patch.object(batch_module, "_cache_lookup", return_value=None)
+    backend = batch_module.LocalBatchBackend(temp_dir / "backend", responder=lambda prompt: "{}")
+    run, _ = main_module.submit_batch_run(claim_files, backend)
+    (backend.root / f"{run.manifest['batch_id']}.jsonl").unlink()  # the local backend reports "failed"
+
+    results = main_module.resume_batch_run(run.dir, backend)
+    assert len(results) == 4 and all(r["status"] == "failed" for r in results)
+    assert all("failed" in r["error"] for r in results)
+    manifest = batch_module.BatchRun(run.dir).manifest
+    assert manifest["status"] == "failed" and manifest["finished_at"]
+
+
+def test_dedup_links_exact_and_near_duplicates(temp_dir, mock_stages, mocker):
+    """Known documents are linked to their earlier output instead of reprocessed."""
+    import random
+    from src.storage.dedup import DedupIndex
+
+    index = DedupIndex(temp_dir / "dedup.db", near_distance=3)
+    mocker.patch.object(main_module, "get_dedup_index", return_value=index)
+
+    def store(validated, raw):
+        out = temp_dir / f"processed_{Path(raw).name}.json"
+        out.write_text("{}")
+        return str(out)
+
+    mocker.patch.object(main_module, "store_output", side_effect=store)
+    rng = random.Random(1)
+    words = " ".join(rng.choice(["claim", "policy", "vehicle", "bumper", "repair", "estimate", "rear"]) for _ in range(400))
+    original = temp_dir / "claim_a.txt"
+    original.write_text("Claim ID: A1\n" + words)
+    copy_same_run = temp_dir / "claim_a_copy.txt"
+    copy_same_run.write_bytes(original.read_bytes())
+
+    first = main_module.process_batch([original, copy_same_run], workers=1)
+    assert [r["status"] for r in first] == ["success", "duplicate"]
+
+    exact = temp_dir / "claim_b.txt"
+    exact.write_bytes(original.read_bytes())
+    rescan = temp_dir / "claim_c.txt"
+    rescan.write_text("Claim ID: A1\n" + words.replace("bumper", "bumpcr", 1))
+    other_claim = temp_dir / "claim_d.txt"
+    other_claim.write_text("Claim ID: D4\n" + words.replace("bumper", "bumpcr", 1))
+    no_claim_id = temp_dir / "claim_e.txt"  # same layout, nothing to tell the claims apart: not linked
+    no_claim_id.write_text(words.replace("bumper", "bumpcr", 1))
+
+    second = main_module.process_batch([exact, rescan, other_claim, no_claim_id], workers=1)
+    assert [r["status"] for r in second] == ["duplicate", "duplicate", "success", "success"]
+    assert second[0]["output"] == second[1]["output"] == first[0]["output"]
+    assert [r["match"] for r in second[:2]] == ["exact", "near"]
+    assert index.summary()["exact"] == 2 and index.summary()["near"] == 1
+    assert index.summary()["ocr_skipped"] == 2  # exact copies skip extraction; the rescan was extracted
+    assert index.report()["duplicates"] == 3
+
+
+def test_watch_spool_processes_and_quarantines(claim_files, mock_stages, temp_dir):
+    """Inbox files are claimed and removed once processed; failures retry, then stay quarantined."""
+    import json
+    from src.ingestion.watch import SpoolWatcher
+
+    inbox = claim_files[0].parent
+    watcher = SpoolWatcher(
+        inbox,
+        lambda files: main_module.process_batch(files, workers=1),
+        spool_dir=temp_dir / "spool",
+        extensions=main_module.SUPPORTED_EXTS,
+        settle_seconds=0,
+        max_retries=2,
+        retry_delay=0,
+    )
+    (temp_dir / "spool" / "processing" / "claim_9.txt").write_text("left by a crashed run")
+    assert watcher.recover() == 1
+
+    results = watcher.run_once()
+    assert sorted(Path(r["file"]).name for r in results) == [f"claim_{i}.txt" for i in (0, 1, 2, 3, 4, 9)]
+    assert not list(inbox.glob("*.txt")) and not list(watcher.processing.iterdir())
+    sidecar = watcher.quarantine / "claim_2.txt.retry.json"
+    assert json.loads(sidecar.read_text())["attempts"] == 1
+
+    watcher.run_once()  # due retry: back through the inbox, fails again, no retries left
+    state = json.loads(sidecar.read_text())
+    assert state["attempts"] == 2 and state["next_attempt"] is None
+    assert watcher.run_once() == []
+    assert (watcher.quarantine / "claim_2.txt").exists()
+    assert watcher.stats == {"processed": 5, "failed": 2, "quarantined": 2, "retried": 1, "skipped": 0}
+
+    # Another drop with the same name does not replace the quarantined file or inherit its attempts
+    (inbox / "claim_2.txt").write_text("a different corrupt scan")
+    watcher.run_once()
+    assert (watcher.quarantine / "claim_2.txt").read_text().startswith("Claim ID: C2")
+    assert (watcher.quarantine / "claim_2.1.txt").read_text() == "a different corrupt scan"
+    assert json.loads((watcher.quarantine / "claim_2.1.txt.retry.json").read_text())["attempts"] == 1
+    assert json.loads(sidecar.read_text())["attempts"] == 2
+
+
+def test_watch_spool_returns_skipped_files_to_the_inbox(claim_files, mock_stages, temp_dir):
+    """A file whose job is leased by another worker goes back to the inbox without a failed attempt."""
+    from src.ingestion.watch import SpoolWatcher
+
+    inbox = claim_files[0].parent
+    skipped = lambda files: [{"file": str(f), "status": "skipped", "error": "in progress on other:1"} for f in files]
+    watcher = SpoolWatcher(inbox, skipped, spool_dir=temp_dir / "spool", settle_seconds=0, batch_size=1)
+    watcher.run_once()
+    assert len(list(inbox.glob("*.txt"))) == 5
+    assert not list(watcher.quarantine.iterdir()) and not list(watcher.processing.iterdir())
+    assert watcher.stats["skipped"] == 1 and watcher.stats["failed"] == 0
+
+
+def test_jobs_resume_after_genai_failure(claim_files, mock_stages, mocker, temp_dir):
+    """A rerun skips finished claims and resumes a failed one from its extraction checkpoint."""
+    import json
+    from src.storage.jobs import JobQueue
+
+    queue = JobQueue(temp_dir / "jobs.db")
+    mocker.patch.object(main_module, "get_job_queue", return_value=queue)
+    (temp_dir / "claim_2.txt").unlink()  # the fixture's corrupt document
+    files = [f for f in claim_files if f.exists()]
+
+    def flaky_genai(extracted):
+        if "C1" in extracted["unstructured"]:
+            raise RuntimeError("GenAI timeout")
+        return {"raw_output": extracted["unstructured"]}
+
+    genai = mocker.patch.object(main_module, "process_with_genai", side_effect=flaky_genai)
+    summary = main_module.SummaryWriter(temp_dir / "summary.json", interval=0)
+    first = main_module.process_batch(files, workers=1, on_result=summary.add)
+    assert [r["status"] for r in first] == ["success", "failed", "success", "success"]
+    assert len(json.loads((temp_dir / "summary.json").read_text())) == 4  # written as results arrive
+
+    extract = main_module.extract_text
+    extract.reset_mock()
+    genai.reset_mock(side_effect=True)
+    genai.side_effect = lambda e: {"raw_output": e["unstructured"]}
+    second = main_module.process_batch(files, workers=1)
+    assert [r["status"] for r in second] == ["success"] * 4
+    assert [r["output"] for r in second[::2]] == [r["output"] for r in first[::2]]
+    assert extract.call_count == 0  # claim_1 resumed after extraction; the rest were done
+    assert genai.call_count == 1
+    assert queue.report() == {"done": 4}
+
+
+def test_jobs_resume_after_storage_without_storing_again(claim_files, mock_stages, mocker, temp_dir):
+    """A crash between storage and finishing the job resumes at "store" and keeps the first output."""
+    from src.storage.jobs import JobQueue
+
+    queue = JobQueue(temp_dir / "jobs.db")
+    mocker.patch.object(main_module, "get_job_queue", return_value=queue)
+    finish = mocker.patch("src.storage.jobs.Job.finish", side_effect=RuntimeError("killed"))
+    with pytest.raises(RuntimeError):
+        main_module.process_batch(claim_files[:1], workers=1)
+    assert queue.report() == {"running": 1}
+
+    mocker.stop(finish)
+    main_module.store_output.reset_mock()
+    second = main_module.process_batch(claim_files[:1], workers=1)
+    assert second[0] == {"file": str(claim_files[0]), "status": "success", "output": str(temp_dir / "raw_claim_0.txt") + ".json"}
+    main_module.store_output.assert_not_called()
+    assert queue.report() == {"done": 1}
+
+
+def test_restart_reprocesses_jobs_and_dedup_hits(claim_files, mock_stages, mocker, temp_dir):
+    """--restart forgets both the finished job and the dedup entry, so the claim runs again."""
+    from src.storage.dedup import DedupIndex
+    from src.storage.jobs import JobQueue
+
+    mocker.patch.object(main_module, "get_job_queue", return_value=JobQueue(temp_dir / "jobs.db"))
+    mocker.patch.object(main_module, "get_dedup_index", return_value=DedupIndex(temp_dir / "dedup.db"))
+
+    def store(validated, raw):
+        out = temp_dir / f"processed_{len(list(temp_dir.glob('processed_*')))}.json"
+        out.write_text("{}")
+        return str(out)
+
+    mocker.patch.object(main_module, "store_output", side_effect=store)
+    claim = claim_files[0]
+    first = main_module.process_single_file(claim)
+    assert main_module.process_single_file(claim) == first  # finished job: not redone
+
+    main_module._restart_jobs([claim], restart=True)
+    again = main_module.process_single_file(claim)
+    assert again["status"] == "success" and again["output"] != first["output"]
+    assert main_module.extract_text.call_count == 2
+
+
+def test_genai_error_result_is_failed_and_retried(claim_files, mock_stages, mocker, temp_dir):
+    """A GenAI error dict (not an exception) is stored for review but reported failed and resumed."""
+    from src.storage.jobs import JobQueue
+
+    queue = JobQueue(temp_dir / "jobs.db")
+    mocker.patch.object(main_module, "get_job_queue", return_value=queue)
+    genai = mocker.patch.object(
+        main_module, "process_with_genai", return_value={"error": "RateLimitError or insufficient quota", "summary": "skipped"}
+    )
+    claim = claim_files[0]
+    first = main_module.process_single_file(claim)
+    assert first["status"] == "failed" and first["error"].startswith("GenAI:") and first["output"]
+    assert queue.report() == {"failed": 1}
+
+    genai.return_value = {"raw_output": "ok"}
+    second = main_module.process_single_file(claim)
+    assert second["status"] == "success"
+    assert main_module.extract_text.call_count == 1 and genai.call_count == 2
+
+
+def test_hitl_record_committed_before_validate_checkpoint(claim_files, mock_stages, mocker, temp_dir):
+    """A review record is durable once the job is past validation, even if the process then stops without flushing."""
+    import sqlite3
+    import src.storage.hitl as hitl
+    from src.storage.jobs import JobQueue
+
+    store = hitl.HITLStore(temp_dir / "hitl.db", batch_size=100, interval=60)
+    mocker.patch.object(hitl, "_store", store)
+    mocker.patch.object(main_module, "get_job_queue", return_value=JobQueue(temp_dir / "jobs.db"))
+
+    def validate(processed):
+        hitl.insert_hitl_record("C0", 0.0, None, ["Missing claim amount"])
+        return {**processed, "validation_errors": ["Missing claim amount"]}
+
+    mocker.patch.object(main_module, "validate_and_review", side_effect=validate)
+    mocker.patch.object(main_module, "store_output", side_effect=RuntimeError("killed before storage"))
+    assert main_module.process_single_file(claim_files[0])["status"] == "failed"
+
+    # A separate connection sees the row: nothing is left in the in-memory buffer
+    rows = sqlite3.connect(temp_dir / "hitl.db").execute("SELECT claim_id FROM hitl_claims").fetchall()
+    assert rows == [("C0",)]
@@ -12,6 +12,20 @@ def test_extract_entities(sample_extracted):
     # Specific: "Oct 15, 2023" should be DATE
     assert any("2023" in str(v) for v in entities.values())
 
+def test_extract_entities_uses_lazily_loaded_pipeline(mocker):
+    """Entities come from the shared pipeline returned by get_nlp, one per label."""
+    import spacy
+    import src.processing.nlp as nlp_module
+    nlp = spacy.blank("en")
+    nlp.add_pipe("entity_ruler").add_patterns([
+        {"label": "DATE", "pattern": "Oct 15, 2023"},
+        {"label": "ORG", "pattern": "ACME Health"},
+    ])
+    mocker.patch.object(nlp_module, "get_nlp", return_value=nlp)
+
+    assert extract_entities("ACME Health: loss on Oct 15, 2023.") == {"ORG": "ACME Health", "DATE": "Oct 15, 2023"}
+    assert extract_entities("") == {}
+
 def test_process_with_genai(sample_extracted, mock_openai, mocker):
     """Test GenAI processing (with mocked OpenAI)."""
     # Mock normalization utils if needed
@@ -37,4 +51,292 @@ def test_process_with_genai_error(sample_extracted, mock_openai, mocker):
     """Test error handling in GenAI."""
     mock_openai.side_effect = Exception("API error")
     processed = process_with_genai(sample_extracted)
-    assert processed["claim_amount"] > 0  # Fallback normalization works
\ No newline at end of file
+    assert processed["claim_amount"] > 0  # Fallback normalization works
+
+def test_process_many_with_genai_retries_and_keeps_order(sample_extracted, mocker):
+    """Async GenAI stage retries 429s with backoff and returns results in input order."""
+    import src.processing.genai as genai
+    from src.processing.providers import StubProvider, set_provider
+    set_provider(StubProvider(latency_ms=0))
+    mocker.patch.object(genai, "GENAI_BACKOFF_BASE", 0.0)
+    mocker.patch.object(genai, "_cache_enabled", False)
+    calls = {"n": 0}
+
+    async def fake_call(session, prompt, schema=None):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise Exception("Error code: 429 - rate limited")
+        return '{"claim_id": "%s"}' % prompt.rsplit(":", 1)[-1].strip()
+
+    mocker.patch.object(genai, "_call_provider_async", side_effect=fake_call)
+    docs = [{"unstructured": f"CLAIM:{i}"} for i in range(6)]
+
+    results = genai.process_many_with_genai(docs, max_concurrency=3)
+    set_provider(None)
+    assert [r["normalized"]["claim_id"] for r in results] == [str(i) for i in range(6)]
+    assert calls["n"] == 7  # one retried call
+
+
+def test_rate_limiter_enforces_request_budget():
+    """A drained request bucket makes acquire() wait for the refill."""
+    import asyncio
+    import time
+    from src.processing.genai import _RateLimiter
+
+    async def run():
+        limiter = _RateLimiter(rpm=600, tpm=1_000_000)  # 10 requests/sec
+        limiter._requests = 0
+        start = time.monotonic()
+        await limiter.acquire(10)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_process_with_genai_cache_hit_skips_network(sample_extracted, temp_dir, mocker):
+    """A second call with identical text is served from the cache."""
+    import src.processing.genai as genai
+    from src.processing.providers import OpenAIProvider, set_provider
+    from src.storage.cache import ResultCache
+    mocker.patch.object(genai, "_cache", ResultCache(temp_dir / "genai.db"))
+    mock_client = mocker.MagicMock()
+    del mock_client.responses
+    mock_client.chat.completions.create.return_value.choices[0].message.content = '{"claim_id": "ABC123"}'
+    set_provider(OpenAIProvider(api_key="sk-test", client=mock_client))
+
+    first = process_with_genai(sample_extracted)
+    second = process_with_genai(sample_extracted)
+    assert first == second == {"normalized": {"claim_id": "ABC123"}, "raw_output": '{"claim_id": "ABC123"}'}
+    assert mock_client.chat.completions.create.call_count == 1
+
+    process_with_genai(sample_extracted, use_cache=False)
+    set_provider(None)
+    assert mock_client.chat.completions.create.call_count == 2
+
+def test_router_sends_template_matches_local():
+    """Documents matched to a form template are normalized without the LLM."""
+    from src.processing.router import ClaimRouter
+    router = ClaimRouter()
+    extracted = {"unstructured": "", "confidence": 0.95, "template": {"name": "ub04", "normalized": {"claim_id": "1234"}}}
+
+    decision = router.route(extracted)
+    assert decision["route"] == "template"
+    assert decision["result"]["normalized"] == {"claim_id": "1234"}
+
+
+def test_router_falls_through_for_empty_template_match():
+    """A template match whose zones came back (mostly) empty is not trusted; it goes to the LLM."""
+    from src.processing.router import ClaimRouter
+    router = ClaimRouter()
+    fields = ["claim_id", "claim_date", "claim_amount", "insured_name"]
+    empty = {"unstructured": "", "confidence": 0.95, "template": {"name": "property_claim_form", "normalized": {}, "fields": fields}}
+    sparse = {**empty, "template": {**empty["template"], "normalized": {"claim_id": "X1"}}}
+    blurry = {**empty, "confidence": 0.4, "template": {**empty["template"], "normalized": dict.fromkeys(fields, "v")}}
+
+    for extracted in (empty, sparse, blurry):
+        decision = router.route(extracted)
+        assert decision["route"] == "llm" and decision["result"] is None
+    assert router.summary()["template"] == 0
+
+FULL_CLAIM = """Claim ID: ABC123
+Date of Loss: Oct 15, 2023
+Amount: $2,500.00
+Policy No.: P-778899
+Insured: Jane Doe
+Description: Rear-end collision, bumper damage.
+"""
+
+def test_rule_extractor_fills_schema_in_one_scan():
+    """Labels (and aliases) map to schema fields; dates and amounts are normalized."""
+    from src.processing.rules import extract_fields
+    rules = extract_fields(FULL_CLAIM + "Amount: 300\n")
+    assert rules["fields"] == {
+        "claim_id": "ABC123",
+        "claim_date": "2023-10-15",
+        "claim_amount": 2500.0,
+        "policy_number": "P-778899",
+        "insured_name": "Jane Doe",
+        "incident_description": "Rear-end collision, bumper damage.",
+    }
+    assert rules["coverage"] == 1.0
+    assert rules["conflicts"] == {"claim_amount": [2500.0, 300.0]}
+    assert rules["confidence"] < 0.9
+
+def test_normalize_date_and_amount():
+    from src.utils.normalization import normalize_amount, normalize_date
+    assert normalize_date("10/15/2023") == "2023-10-15"
+    assert normalize_date("October 15, 2023") == "2023-10-15"
+    assert normalize_date("101024") == "2024-10-10"
+    assert normalize_date("2012-01-05") == "2012-01-05"  # ISO is not re-read as MM-DD-YY
+    assert normalize_date("Loss date: 2011-03-04") == "2011-03-04"
+    assert normalize_date("3-4-11") == "2011-03-04"
+    assert normalize_date("not a date") == ""
+    assert normalize_amount("$2,500") == 2500.0
+    assert normalize_amount("(1,200.50)") == -1200.5
+    assert normalize_amount("n/a") is None
+
+def test_router_gates_llm_on_coverage_conflicts_and_confidence(sample_extracted):
+    """Only low-coverage, ambiguous or poorly extracted claims are routed to the LLM."""
+    from src.processing.router import ClaimRouter
+    router = ClaimRouter({"min_field_coverage": 0.8})
+
+    local = router.route({"unstructured": FULL_CLAIM, "confidence": 0.95})
+    assert local["route"] == "rules"
+    assert local["result"]["normalized"]["claim_amount"] == 2500.0
+    assert local["result"]["confidence"] == 0.95
+
+    assert router.route(sample_extracted)["route"] == "llm"  # 4 of 6 fields
+    assert router.route({"unstructured": FULL_CLAIM + "Amount: 300\n", "confidence": 0.95})["route"] == "llm"
+    assert router.route({"unstructured": FULL_CLAIM, "confidence": 0.6})["route"] == "llm"
+    assert router.summary() == {"template": 0, "rules": 1, "llm": 3, "total": 4, "llm_rate": 0.75}
+
+def test_plan_prompt_drops_boilerplate_and_duplicates_then_chunks():
+    """Repeated headers are kept once, footers and duplicate pages removed, before chunking within budget."""
+    from src.processing.prompting import plan_prompt
+    pages = [
+        {"text": f"ACME Health Plan\nVisit {i}: {'details ' * 40}\nPage {i} of 6"} for i in range(1, 5)
+    ]
+    pages.append(dict(pages[0]))  # rescanned duplicate
+    pages.append({"text": "ACME Health Plan\nPage 6 of 6"})  # nothing but boilerplate
+
+    plan = plan_prompt({"pages": pages}, max_prompt_tokens=200, claim_budget=10_000)
+    assert plan["duplicate_pages"] == 1
+    assert plan["boilerplate_lines"] == 9  # 5 page numbers, 4 repeated headers
+    assert len(plan["chunks"]) == 2  # ~85 tokens per page, two pages per chunk
+    assert "".join(plan["chunks"]).count("ACME Health Plan") == 1
+    assert all("Page" not in chunk for chunk in plan["chunks"])
+    assert plan["tokens"] < plan["original_tokens"]
+
+    budgeted = plan_prompt({"pages": pages}, max_prompt_tokens=200, claim_budget=150)
+    assert budgeted["truncated"] and budgeted["tokens"] <= 150
+
+
+def test_clean_pages_keeps_repeated_key_fields_and_never_empties():
+    """Per-page claim banners survive once; a document of identical pages is not cleaned to nothing."""
+    from src.processing.prompting import clean_pages
+    banner = "Claim ID: CLM-77\nPolicy No: P-9\nInsured: Jane Doe"
+    pages = [f"{banner}\nItem {i}: {'text ' * 30}\nPage {i} of 4" for i in range(1, 5)]
+    cleaned = clean_pages(pages)
+    joined = "\n".join(cleaned["pages"])
+    assert all(joined.count(line) == 1 for line in banner.splitlines())
+    assert all(f"Item {i}" in joined for i in range(1, 5))
+
+    forms = clean_pages(["Page 1 of 3", "Page 2 of 3", "Page 3 of 3"])
+    assert forms["pages"] == ["Page 1 of 3", "Page 2 of 3", "Page 3 of 3"]
+
+def test_process_with_genai_map_reduces_long_claims(mocker):
+    """Long claims are summarised per chunk, then normalized from the notes."""
+    import src.processing.genai as genai
+    import src.processing.prompting as prompting
+    from src.processing.providers import StubProvider
+    mocker.patch("src.processing.genai.get_provider", return_value=StubProvider(latency_ms=0))
+    mocker.patch.object(genai, "_cache_enabled", False)
+    mocker.patch.object(prompting, "GENAI_MAX_PROMPT_TOKENS", 100)
+    prompts = []
+
+    def fake_complete(prompt, schema=None):
+        prompts.append(prompt)
+        return '{"claim_id": "ABC123"}' if len(prompts) == 3 else f"note {len(prompts)}"
+
+    mocker.patch.object(genai, "_complete", side_effect=fake_complete)
+    pages = [{"text": f"Section {i}\n" + "line of text " * 30} for i in range(2)]
+
+    result = genai.process_with_genai({"unstructured": "...", "pages": pages})
+    assert len(prompts) == 3
+    assert prompts[0].startswith(prompting.MAP_PROMPT)
+    assert "[Section 1]\nnote 1" in prompts[2] and "[Section 2]\nnote 2" in prompts[2]
+    assert result["normalized"] == {"claim_id": "ABC123"}
+
+
+def test_stub_provider_is_deterministic_and_injects_errors(sample_extracted):
+    """The stub answers from the prompt text and fails at the configured rate."""
+    from src.processing.genai import _build_prompt
+    from src.processing.providers import ProviderError, StubProvider
+
+    prompt = _build_prompt(sample_extracted["unstructured"])
+    stub = StubProvider(latency_ms=0)
+    first, second = stub.complete(prompt), stub.complete(prompt)
+    assert first == second and '"claim_id": "ABC123"' in first
+
+    failing = StubProvider(latency_ms=0, error_rate=1.0)
+    with pytest.raises(ProviderError) as excinfo:
+        failing.complete(prompt)
+    assert excinfo.value.retryable
+
+
+def test_async_runner_uses_stub_provider(mocker):
+    """The async stage runs offline on the stub, retrying injected errors."""
+    import src.processing.genai as genai
+    from src.processing.providers import StubProvider, set_provider
+    mocker.patch.object(genai, "GENAI_BACKOFF_BASE", 0.0)
+    mocker.patch.object(genai, "_cache_enabled", False)
+    stub = StubProvider(latency_ms=1, error_rate=0.3, seed=7)
+    set_provider(stub)
+    docs = [{"unstructured": f"Claim ID: C{i}\nAmount: ${i}00"} for i in range(8)]
+
+    results = genai.process_many_with_genai(docs, max_concurrency=4)
+    set_provider(None)
+    assert [r["normalized"]["claim_id"] for r in results] == [f"C{i}" for i in range(8)]
+    assert stub.calls > 8
+
+
+def test_sync_genai_retries_retryable_provider_errors(mocker):
+    """The sync path backs off and retries like the async one; other errors are not retried."""
+    import src.processing.genai as genai
+    from src.processing.providers import ProviderError, StubProvider, set_provider
+    mocker.patch.object(genai, "GENAI_BACKOFF_BASE", 0.0)
+    mocker.patch.object(genai, "_cache_enabled", False)
+    stub = StubProvider(latency_ms=0)
+    answer = stub.complete("Claim ID: C1")
+    mocker.patch.object(stub, "complete", side_effect=[ProviderError("503", retryable=True), answer])
+    set_provider(stub)
+    try:
+        assert genai._complete("Claim ID: C1") == answer
+        stub.complete.side_effect = ProviderError("bad request")
+        with pytest.raises(ProviderError):
+            genai._complete("Claim ID: C1")
+    finally:
+        set_provider(None)
+    assert stub.complete.call_count == 3
+
+
+def test_parse_claim_output_tolerates_fences_prose_and_truncation():
+    """Fenced/prose-wrapped JSON parses; truncated output keeps complete members."""
+    from src.processing.structured import extract_json, parse_claim_output
+
+    fenced = 'Here you go:\n```json\n{"claim_id": "A1", "amount": "$2,500.00", "incident_date": "Oct 15, 2023",}\n```'
+    parsed = parse_claim_output(fenced)
+    assert parsed["complete"] and parsed["failed"] == []
+    assert parsed["fields"] == {"claim_id": "A1", "claim_amount": 2500.0, "claim_date": "2023-10-15"}
+
+    truncated = parse_claim_output('{"claim_id": "A1", "claim_amount": "n/a", "insured_name": "Jane D')
+    assert truncated["fields"] == {"claim_id": "A1"}
+    assert truncated["failed"] == ["claim_amount", "claim_date", "policy_number", "insured_name", "incident_description"]
+
+    assert extract_json('{"a": "x}\\"y", "b": [1, {"c": 2}, 3') == ({"a": 'x}"y', "b": [1, {"c": 2}]}, False)
+    assert parse_claim_output("no json at all")["parsed"] is False
+
+
+def test_process_with_genai_retries_only_failed_fields(sample_extracted, mocker):
+    """A truncated reply is completed by one follow-up call for the missing fields."""
+    import src.processing.genai as genai
+    from src.processing.providers import StubProvider
+    mocker.patch("src.processing.genai.get_provider", return_value=StubProvider(latency_ms=0))
+    mocker.patch.object(genai, "_cache_enabled", False)
+    replies = iter([
+        '```json\n{"claim_id": "ABC123", "claim_date": "10/15/2023", "claim_amount": 2500, "summary": "Rear-end", "policy_nu',
+        '{"policy_number": "P-9", "insured_name": null, "incident_description": "Bumper damage"}',
+    ])
+    calls = []
+
+    def fake_complete(prompt, schema=None):
+        calls.append(schema)
+        return next(replies)
+
+    mocker.patch.object(genai, "_complete", side_effect=fake_complete)
+    result = genai.process_with_genai(sample_extracted)
+
+    assert len(calls) == 2
+    assert list(calls[1]["properties"]) == ["policy_number", "insured_name", "incident_description"]
+    assert result["normalized"]["claim_amount"] == 2500.0 and result["normalized"]["policy_number"] == "P-9"
+    assert result["summary"] == "Rear-end" and "failed_fields" not in result
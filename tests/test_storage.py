@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+import pytest
+import time
+import hashlib
+import os
+from src.ingestion.ingest import raw_store_path, store_raw
+from src.storage.cache import ResultCache, make_cache_key
+from src.storage.jobs import Job, JobQueue
+import src.storage.output as output_module
+from tests.conftest import temp_dir
+
+
+@pytest.fixture
+def cache(temp_dir):
+    return ResultCache(temp_dir / "cache.db", ttl_seconds=60, max_entries=3)
+
+
+def test_cache_roundtrip_and_counters(cache):
+    """Stored values come back unchanged and hits/misses are counted."""
+    key = make_cache_key("prompt", "model", "text")
+    assert cache.get(key) is None
+    cache.put(key, {"normalized": {"claim_id": "ABC123"}, "raw_output": "{}"})
+    assert cache.get(key) == {"normalized": {"claim_id": "ABC123"}, "raw_output": "{}"}
+    assert cache.summary()["hits"] == 1
+    assert cache.summary()["misses"] == 1
+
+
+def test_cache_key_is_separator_safe():
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+
+
+def test_cache_lru_eviction(cache):
+    """Least recently read entries are evicted once max_entries is exceeded."""
+    for k in ("a", "b", "c"):
+        cache.put(k, k)
+        time.sleep(0.01)
+    cache.get("a")  # refresh "a" so "b" becomes the oldest
+    cache.put("d", "d")
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+
+
+def test_cache_put_keeps_a_running_count(temp_dir):
+    """Inserts do not COUNT(*) the table; replacing a key does not grow the count."""
+    cache = ResultCache(temp_dir / "count.db", max_entries=2)
+    cache.put("a", 1)  # first insert counts the table once
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for k, v in (("a", 2), ("b", 1), ("c", 1)):
+        cache.put(k, v)
+        time.sleep(0.01)
+    assert not any("COUNT(*)" in sql for sql in statements)
+    assert len(cache) == 2 and cache.get("a") is None and cache.get("c") == 1
+    assert cache.summary()["evictions"] == 1
+
+
+def test_cache_hits_batch_access_updates(cache):
+    """A hit does not write; read times reach the table on the next put or flush()."""
+    cache.put("a", 1)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for _ in range(5):
+        assert cache.get("a") == 1
+    assert not any(sql.startswith(("UPDATE", "COMMIT")) for sql in statements)
+    cache.flush()
+    assert any(sql.startswith("UPDATE cache_entries SET accessed_at") for sql in statements)
+
+
+def test_cache_ttl_expiry(temp_dir):
+    cache = ResultCache(temp_dir / "ttl.db", ttl_seconds=0.05)
+    cache.put("k", 1)
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.summary()["evictions"] == 1
+
+
+@pytest.mark.parametrize("mode, consume", [("auto", False), ("auto", True), ("hardlink", False), ("copy", False)])
+def test_raw_store_is_content_addressed(temp_dir, mode, consume):
+    """Same bytes → same path on every run; linked modes share the inode, copy does not."""
+    source = temp_dir / "claim.PDF"
+    source.write_bytes(b"%PDF claim bytes" * 1000)
+    sha = hashlib.sha256(source.read_bytes()).hexdigest()
+    root = temp_dir / "raw"
+
+    path, digest, how = store_raw(source, root=root, mode=mode, consume=consume)
+    assert digest == sha
+    assert path == raw_store_path(sha, ".pdf", root) == root / sha[:2] / sha[2:4] / f"{sha}.pdf"
+    assert path.read_bytes() == source.read_bytes()
+    expected = {"auto": ("reflink", "copy"), "hardlink": ("hardlink",), "copy": ("copy",)}[mode]
+    if consume:  # only a source about to be deleted may be hard-linked in auto mode
+        expected += ("hardlink",)
+    assert how in expected
+    assert (os.stat(path).st_ino == os.stat(source).st_ino) == (how == "hardlink")
+
+    again, _, how = store_raw(source, sha256=sha, root=root, mode=mode)
+    assert (again, how) == (path, "existing")
+    assert [p.name for p in root.iterdir()] == [sha[:2]]  # no temp files left behind
+
+
+def test_job_lease_checkpoints_and_takeover(temp_dir):
+    """A live lease keeps other workers off; once it lapses they resume from the checkpoint."""
+    claim = temp_dir / "claim.txt"
+    claim.write_text("Claim ID: X1")
+    first = JobQueue(temp_dir / "jobs.db", lease_seconds=0.2)
+    other = JobQueue(temp_dir / "jobs.db", lease_seconds=0.2)
+    other.worker = "other-host:1"
+
+    job = first.claim(claim)
+    assert isinstance(job, Job) and job.stage is None
+    job.save("extract", {"raw_path": None, "extracted": {"text": "Claim ID: X1"}})
+    time.sleep(0.3)  # the heartbeat keeps the lease alive
+    assert other.claim(claim)["status"] == "skipped"
+
+    first.close()  # worker stops heartbeating (e.g. it crashed)
+    time.sleep(0.3)
+    taken = other.claim(claim)
+    assert taken.stage == "extract" and taken.load("extract")["extracted"]["text"] == "Claim ID: X1"
+    taken.finish({"file": str(claim), "status": "success", "output": "out.json"})
+    assert taken.load("extract") is None  # checkpoints dropped once done
+    assert first.claim(claim) == {"file": str(claim), "status": "success", "output": "out.json"}
+
+
+def test_store_output_never_overwrites(temp_dir, mocker):
+    """Claims stored in the same second get distinct files; claim_id is read from "normalized" too."""
+    mocker.patch.object(output_module, "DATA_DIR", temp_dir)
+    claims = [{"normalized": {"claim_id": "R-1"}, "n": 1}, {"normalized": {"claim_id": "R-1"}, "n": 2}, {"n": 3}, {"n": 4}]
+    paths = [output_module.store_output(c, "raw") for c in claims]
+    assert len(set(paths)) == 4
+    assert Path(paths[0]).name.startswith("processed_R-1_")
+    assert sorted(json.loads(Path(p).read_text())["n"] for p in paths) == [1, 2, 3, 4]
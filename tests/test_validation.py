@@ -39,6 +39,12 @@ def test_validate_missing_date(sample_extracted):
     validated = validate_and_review(processed)
     assert validated["status"] == "review"
 
+def test_validate_reads_genai_normalized_fields():
+    """Amount and date inside the GenAI "normalized" block pass validation."""
+    processed = {"normalized": {"claim_id": "ABC123", "claim_amount": 2500.0, "claim_date": "2023-10-15"}, "confidence": 0.95}
+    validated = validate_and_review(processed)
+    assert validated["validation_errors"] == []
+
 def test_store_for_hitl(in_memory_db):
     """Test storing to DB (in-memory)."""
     processed = {"claim_id": "TEST123", "confidence": 0.7, "status": "review"}
@@ -60,4 +66,73 @@ def test_store_for_hitl(in_memory_db):
         assert json.loads(row[1])["claim_id"] == "TEST123"
         assert row[4] == "Test error"  # review_notes
     finally:
-        src.config.DATABASE_URL = original_url
\ No newline at end of file
+        src.config.DATABASE_URL = original_url
+def test_validate_uses_extraction_confidence(mocker):
+    """Document-level OCR confidence drives the confidence check when the model reports none."""
+    mock_hitl = mocker.patch('src.validation.validator.store_for_hitl')
+    processed = {
+        "amount": 500.0,
+        "extraction": {
+            "confidence": 0.62,
+            "pages": [{"page": 1, "confidence": 0.97}, {"page": 2, "confidence": 0.41}],
+        },
+    }
+    validated = validate_and_review(processed)
+    assert validated["validation_errors"] == ["Low model confidence: 0.62 (low OCR confidence on pages 2)"]
+    mock_hitl.assert_called_once()
+
+    processed["extraction"]["confidence"] = 0.93
+    assert validate_and_review(processed)["validation_errors"] == []
+
+
+def _write_hitl_records(path, worker, count):
+    from src.storage.hitl import HITLStore
+    store = HITLStore(path, batch_size=7, interval=0.05)
+    for i in range(count):
+        store.add(f"W{worker}-{i}", 100.0 + i, "2023-10-15", ["Low model confidence"])
+    return store.flush()
+
+
+def test_hitl_store_concurrent_writers(temp_dir):
+    """Threads and processes writing one HITL DB lose no rows and hit no lock errors."""
+    import sqlite3
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from src.storage.hitl import HITLStore
+
+    path = temp_dir / "hitl.db"
+    store = HITLStore(path, batch_size=10, interval=0.05)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda w: [store.add(f"T{w}-{i}", 1.0, None, ["e"]) for i in range(25)], range(8)))
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_write_hitl_records, [path] * 4, range(4), [30] * 4))
+
+    assert len(store.fetch_pending(limit=1000)) == 8 * 25 + 4 * 30
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(hitl_claims)")}
+    assert {"idx_hitl_status_created", "idx_hitl_claim_id", "idx_hitl_created_at"} <= indexes
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM hitl_claims WHERE status='Pending' ORDER BY created_at").fetchall()
+    assert "idx_hitl_status_created" in str(plan)
+    conn.close()
+
+
+def test_hitl_failed_commit_keeps_records_on_one_writer(temp_dir, mocker):
+    """A failed commit re-buffers its records; timer flushes reuse the same writer connection."""
+    import sqlite3
+    import threading
+    from src.storage.hitl import HITLStore
+
+    store = HITLStore(temp_dir / "hitl.db", batch_size=100, interval=60)
+    store.add("A1", 1.0, None, ["e"])
+    writer = store._writer_conn()
+    mocker.patch.object(store, "_writer_conn", side_effect=[sqlite3.OperationalError("database is locked"), writer])
+    assert store.flush() == 0
+    assert len(store._pending) == 1 and store._timer is not None
+
+    store.add("A2", 2.0, None, ["e"])
+    flusher = threading.Thread(target=store.flush)  # as the commit timer would
+    flusher.start()
+    flusher.join()
+    assert [row[1] for row in store.fetch_pending(limit=10)] == ["A1", "A2"]
+    assert store._writer is writer
+